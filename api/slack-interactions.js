@@ -1,11 +1,16 @@
 const { WebClient } = require('@slack/web-api');
 const { GoogleGenerativeAI } = require('@google/generative-ai');
 const crypto = require('crypto');
+const fs = require('fs');
 
 // 環境変数の確認
 const SLACK_BOT_TOKEN = process.env.SLACK_BOT_TOKEN;
 const SLACK_SIGNING_SECRET = process.env.SLACK_SIGNING_SECRET;
 const GEMINI_API_KEY = process.env.GEMINI_API_KEY;
+// 日次バッチ（scripts/daily_post.py）が出力するインタラクションストアの場所（URLまたはファイルパス）
+const INTERACTION_STORE_URL = process.env.INTERACTION_STORE_URL;
+const INTERACTION_STORE_PATH = process.env.INTERACTION_STORE_PATH;
+const INTERACTION_STORE_TTL_MS = 5 * 60 * 1000;
 
 if (!SLACK_BOT_TOKEN || !SLACK_SIGNING_SECRET || !GEMINI_API_KEY) {
   console.error('必要な環境変数が設定されていません');
@@ -39,23 +44,70 @@ function verifySlackSignature(body, signature, timestamp) {
 }
 
 /**
- * ボタンvalueからアクションとURLを抽出
+ * ボタンvalueからアクションとURLを抽出（URL内の「:」で分割しないよう最初の区切りのみ使う）
  */
 function parseButtonValue(value) {
-  const [action, url] = value.split(':');
-  return { action, url };
+  const index = value.indexOf(':');
+  if (index === -1) {
+    return { action: value, url: '' };
+  }
+  return { action: value.slice(0, index), url: value.slice(index + 1) };
+}
+
+// インスタンスが生きている間はストアを使い回す
+let interactionStoreCache = null;
+let interactionStoreLoadedAt = 0;
+
+/**
+ * インタラクションストアの読み込み（一定時間キャッシュ、読めない場合は空）
+ */
+async function loadInteractionStore() {
+  if (interactionStoreCache && Date.now() - interactionStoreLoadedAt < INTERACTION_STORE_TTL_MS) {
+    return interactionStoreCache;
+  }
+  
+  try {
+    let data = null;
+    if (INTERACTION_STORE_URL) {
+      const response = await fetch(INTERACTION_STORE_URL);
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      data = await response.json();
+    } else if (INTERACTION_STORE_PATH) {
+      data = JSON.parse(await fs.promises.readFile(INTERACTION_STORE_PATH, 'utf8'));
+    }
+    
+    interactionStoreCache = (data && data.articles) || {};
+    interactionStoreLoadedAt = Date.now();
+  } catch (error) {
+    console.error('インタラクションストア読み込みエラー:', error);
+    interactionStoreCache = interactionStoreCache || {};
+  }
+  
+  return interactionStoreCache;
 }
 
 /**
- * 記事のタイトルと説明を取得（URLから推定または記録から）
+ * 記事のタイトルと説明を取得（日次バッチが保存したストアから）
  */
 async function getArticleInfo(url) {
-  // 実際の実装では、記事のメタデータを取得するか
-  // 元の投稿メッセージから情報を抽出する必要がある
-  // ここでは簡略化してURLから推定
+  const store = await loadInteractionStore();
+  const entry = store[url];
+  
+  if (entry) {
+    return {
+      title: entry.title,
+      // 公開用のストアには記事本文の抜粋（context）がないため、詳細要約・説明を使う
+      description: entry.context || entry.detail_summary || entry.description,
+      detailSummary: entry.detail_summary || null
+    };
+  }
+  
   return {
     title: "技術記事",
-    description: "記事の内容"
+    description: "記事の内容",
+    detailSummary: null
   };
 }
 
@@ -253,9 +305,9 @@ module.exports = async (req, res) => {
           text: '詳細要約を生成中です...'
         });
         
-        // バックグラウンドで詳細要約を生成・投稿
+        // 事前生成済みの詳細要約があればそのまま使い、なければ生成して投稿
         const articleInfo = await getArticleInfo(url);
-        const detailSummary = await generateDetailSummary(
+        const detailSummary = articleInfo.detailSummary || await generateDetailSummary(
           articleInfo.title,
           articleInfo.description,
           url
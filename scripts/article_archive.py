@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+記事アーカイブ
+取得した記事と投稿の履歴（投稿日時・要約）をSQLiteへ追記し、FTS5の全文検索インデックスを張る。
+同じURL（正規化後）は1回だけ登録し、直近N日に投稿済みの記事の判定やキーワード検索に使う。
+類似記事としてまとめた記事（'related'）も登録し、代表記事と一緒に投稿済みとして記録する
+"""
+
+import os
+import time
+import sqlite3
+from feed_sources import canonicalize_url
+
+DEFAULT_ARCHIVE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'archive.sqlite3')
+
+
+class ArticleArchive:
+    """記事の追記専用アーカイブ（FTS5インデックス付き）
+
+    記事（articles）は初回取得時に1回だけ登録し、投稿（posts）は投稿のたびに1行追記する。
+    検索インデックス（articles_search）には記事ごとに最後に投稿した要約を持たせる。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('ARCHIVE_PATH', DEFAULT_ARCHIVE_PATH)
+        self.short_search_rows = int(os.getenv('ARCHIVE_SHORT_SEARCH_ROWS', '5000'))
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+
+        # 投稿日時を articles の列に上書きしていた形式のアーカイブは、初回に投稿の履歴へ移す
+        legacy = self.has_table('articles') and not self.has_table('posts')
+        if legacy:
+            self.conn.executescript(
+                """
+                DROP TRIGGER IF EXISTS articles_ai;
+                DROP TRIGGER IF EXISTS articles_au;
+                DROP TABLE IF EXISTS articles_fts;
+                """
+            )
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS articles (
+                id INTEGER PRIMARY KEY,
+                canonical_url TEXT NOT NULL UNIQUE,
+                link TEXT NOT NULL,
+                title TEXT NOT NULL,
+                description TEXT NOT NULL DEFAULT '',
+                source TEXT,
+                fetched_at REAL NOT NULL
+            );
+
+            -- 投稿の履歴（追記のみ）。類似記事として代表記事と一緒に投稿した記事は summary を NULL にする
+            CREATE TABLE IF NOT EXISTS posts (
+                id INTEGER PRIMARY KEY,
+                article_id INTEGER NOT NULL REFERENCES articles (id),
+                posted_at REAL NOT NULL,
+                summary TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_posts_posted_at ON posts (posted_at);
+            CREATE INDEX IF NOT EXISTS idx_posts_article ON posts (article_id, posted_at);
+
+            -- 日本語は単語で区切れないため、trigramトークナイザーで部分一致検索する（3文字以上の語句が対象）
+            CREATE VIRTUAL TABLE IF NOT EXISTS articles_search USING fts5(
+                title, description, summary, tokenize='trigram'
+            );
+
+            CREATE TRIGGER IF NOT EXISTS articles_search_ai AFTER INSERT ON articles BEGIN
+                INSERT INTO articles_search (rowid, title, description, summary)
+                VALUES (new.id, new.title, new.description, '');
+            END;
+            CREATE TRIGGER IF NOT EXISTS posts_search_ai AFTER INSERT ON posts WHEN new.summary IS NOT NULL BEGIN
+                UPDATE articles_search SET summary = new.summary WHERE rowid = new.article_id;
+            END;
+            """
+        )
+        if legacy:
+            self.migrate_legacy()
+        self.conn.commit()
+
+    def has_table(self, name):
+        return self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+    def migrate_legacy(self):
+        """旧形式の articles.posted_at / summary を投稿の履歴に移し、検索インデックスを作り直す"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO articles_search (rowid, title, description, summary) "
+                "SELECT id, title, description, '' FROM articles"
+            )
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(articles)")}
+            if {'posted_at', 'summary'} <= columns:
+                cursor = self.conn.execute(
+                    "INSERT INTO posts (article_id, posted_at, summary) "
+                    "SELECT id, posted_at, summary FROM articles WHERE posted_at IS NOT NULL ORDER BY posted_at, id"
+                )
+                print(f"記事アーカイブを投稿履歴の形式に移行しました ({cursor.rowcount}件)")
+
+    def ingest(self, articles):
+        """記事と、まとめられた類似記事を登録し、新規に追加された件数を返す（登録済みのURLは無視する）"""
+        now = time.time()
+        with self.conn:
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO articles (canonical_url, link, title, description, source, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (canonicalize_url(item['link']), item['link'], item['title'],
+                     item.get('description', ''), item.get('source', article.get('source')), now)
+                    for article in articles
+                    for item in [article] + article.get('related', [])
+                ]
+            )
+        # rowcountはトリガー（FTSへの反映）分を含まず、実際に追加された行数だけを数える
+        return cursor.rowcount
+
+    def record_posts(self, articles_summary, posted_at=None):
+        """投稿した記事を投稿の履歴に追記（まとめられた類似記事は要約なしで記録し、再投稿を防ぐ）"""
+        posted_at = posted_at or time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO posts (article_id, posted_at, summary) SELECT id, ?, ? FROM articles WHERE canonical_url = ?",
+                [
+                    (posted_at, article['summary'], canonicalize_url(article['link']))
+                    for article in articles_summary
+                ] + [
+                    (posted_at, None, canonicalize_url(related['link']))
+                    for article in articles_summary
+                    for related in article.get('related', [])
+                ]
+            )
+
+    def recently_posted(self, links, days):
+        """指定したURLのうち、直近days日以内に投稿済みのもの（正規化URLの集合）"""
+        canonical = {canonicalize_url(link) for link in links}
+        if not canonical:
+            return set()
+
+        cutoff = time.time() - days * 24 * 60 * 60
+        placeholders = ','.join('?' * len(canonical))
+        rows = self.conn.execute(
+            f"SELECT DISTINCT a.canonical_url FROM posts p JOIN articles a ON a.id = p.article_id "
+            f"WHERE p.posted_at >= ? AND a.canonical_url IN ({placeholders})",
+            (cutoff, *canonical)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def filter_recently_posted(self, articles, days=None):
+        """直近days日以内に投稿済みの記事を除く"""
+        if days is None:
+            days = float(os.getenv('ARCHIVE_SUPPRESS_DAYS', '7'))
+        posted = self.recently_posted([article['link'] for article in articles], days)
+        return [article for article in articles if canonicalize_url(article['link']) not in posted]
+
+    def posted_since(self, since, until=None):
+        """since〜until（UNIX時刻）に投稿した記事を投稿順に返す（週間まとめ用）
+
+        類似記事として代表記事と一緒に投稿した記事（要約なし）は含めない。
+        """
+        rows = self.conn.execute(
+            """
+            SELECT a.link, a.title, a.description, p.summary, a.source, p.posted_at
+            FROM posts p JOIN articles a ON a.id = p.article_id
+            WHERE p.posted_at >= ? AND p.posted_at < ? AND p.summary IS NOT NULL
+            ORDER BY p.posted_at, p.id
+            """,
+            (since, until if until is not None else float('inf'))
+        ).fetchall()
+        return [
+            {'link': row[0], 'title': row[1], 'description': row[2], 'summary': row[3] or '',
+             'source': row[4], 'posted_at': row[5]}
+            for row in rows
+        ]
+
+    def search(self, query, limit=20):
+        """過去の記事をキーワードで検索（関連度順、3文字未満の語句は新しい順）"""
+        query = query.strip()
+        if not query:
+            return []
+        if len(query) < 3:
+            return self.search_short(query, limit)
+
+        # FTS5の構文として解釈されないよう、語句全体を引用符で囲む
+        phrase = '"' + query.replace('"', '""') + '"'
+        rows = self.conn.execute(
+            """
+            SELECT a.link, a.title, s.summary,
+                   (SELECT MAX(posted_at) FROM posts WHERE article_id = a.id)
+            FROM articles_search s JOIN articles a ON a.id = s.rowid
+            WHERE articles_search MATCH ?
+            ORDER BY bm25(articles_search)
+            LIMIT ?
+            """,
+            (phrase, limit)
+        ).fetchall()
+        return [
+            {'link': row[0], 'title': row[1], 'summary': row[2] or None, 'posted_at': row[3]}
+            for row in rows
+        ]
+
+    def search_short(self, query, limit=20):
+        """trigramでは引けない3文字未満の語句（"AI", "Go" など）をLIKEの部分一致で検索（新しい順）
+
+        インデックスを使えない全件走査になるため、新しく登録した short_search_rows 件
+        （ARCHIVE_SHORT_SEARCH_ROWS）だけを対象にする。
+        """
+        pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        rows = self.conn.execute(
+            """
+            SELECT link, title, summary, posted_at FROM (
+                SELECT a.id, a.link, a.title, a.fetched_at, s.summary,
+                       (SELECT MAX(posted_at) FROM posts WHERE article_id = a.id) AS posted_at
+                -- CROSS JOIN で articles の範囲検索を外側に固定する（JOINだと検索インデックスを全件走査する）
+                FROM articles a CROSS JOIN articles_search s ON s.rowid = a.id
+                WHERE a.id > (SELECT COALESCE(MAX(id), 0) FROM articles) - ?3
+                  AND (a.title LIKE ?1 ESCAPE '\\' OR a.description LIKE ?1 ESCAPE '\\' OR s.summary LIKE ?1 ESCAPE '\\')
+            )
+            ORDER BY COALESCE(posted_at, fetched_at) DESC, id DESC
+            LIMIT ?2
+            """,
+            (pattern, limit, self.short_search_rows)
+        ).fetchall()
+        return [
+            {'link': row[0], 'title': row[1], 'summary': row[2] or None, 'posted_at': row[3]}
+            for row in rows
+        ]
+
+    def close(self):
+        self.conn.close()
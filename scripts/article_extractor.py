@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+記事本文の抽出
+リンク先のHTMLをサイズ・時間の上限付きで取得し、readability風の簡易アルゴリズムで
+本文を抜き出してトークン予算内に切り詰める。抽出結果はURLをキーにSQLiteへ保存して再利用する
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+from html.parser import HTMLParser
+from http_client import get_http_client
+from rate_limiter import estimate_tokens
+from run_report import get_run_report
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'articles.sqlite3')
+
+# 中身ごと読み飛ばす要素
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'nav', 'header', 'footer', 'aside', 'form', 'iframe', 'button'}
+# 段落の区切りとして扱う要素
+BLOCK_TAGS = {'p', 'div', 'section', 'article', 'main', 'li', 'pre', 'blockquote', 'td', 'dd', 'dt',
+              'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'br', 'tr', 'table', 'ul', 'ol', 'figure', 'figcaption'}
+# 本文を含むことが多い要素
+CONTENT_TAGS = {'article', 'main'}
+
+META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+WHITESPACE = re.compile(r'\s+')
+
+
+class ContentParser(HTMLParser):
+    """HTMLを段落単位のテキストに分解（リンク文字数・article/main内かどうかを記録）"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_depth = 0
+        self.content_depth = 0
+        self.link_depth = 0
+        self.blocks = []
+        self.current = []
+        self.current_link_chars = 0
+        self.current_in_content = False
+
+    def flush(self):
+        text = WHITESPACE.sub(' ', ''.join(self.current)).strip()
+        if text:
+            self.blocks.append({
+                'text': text,
+                'link_chars': min(self.current_link_chars, len(text)),
+                'in_content': self.current_in_content,
+            })
+        self.current = []
+        self.current_link_chars = 0
+        self.current_in_content = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth:
+            return
+        if tag in BLOCK_TAGS:
+            self.flush()
+        if tag in CONTENT_TAGS:
+            self.content_depth += 1
+        if tag == 'a':
+            self.link_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.skip_depth:
+            return
+        if tag in BLOCK_TAGS:
+            self.flush()
+        if tag in CONTENT_TAGS:
+            self.content_depth = max(0, self.content_depth - 1)
+        if tag == 'a':
+            self.link_depth = max(0, self.link_depth - 1)
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if self.content_depth:
+            self.current_in_content = True
+        self.current.append(data)
+        if self.link_depth:
+            self.current_link_chars += len(data)
+
+
+def extract_main_text(html_text, min_block_chars=20, max_link_density=0.5):
+    """HTMLから本文らしい段落を抜き出して連結
+
+    article/main要素があればその中の段落だけを使い、短い段落とリンクばかりの段落（メニュー等）は除く。
+    """
+    parser = ContentParser()
+    try:
+        parser.feed(html_text)
+        parser.close()
+    except Exception as e:
+        print(f"HTML解析エラー: {e}")
+    parser.flush()
+
+    blocks = parser.blocks
+    if any(block['in_content'] for block in blocks):
+        blocks = [block for block in blocks if block['in_content']]
+
+    paragraphs = [
+        block['text'] for block in blocks
+        if len(block['text']) >= min_block_chars and block['link_chars'] / len(block['text']) <= max_link_density
+    ]
+
+    return "\n".join(paragraphs)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """推定トークン数がmax_tokens以内になるよう、段落・文字単位で切り詰める"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    kept = []
+    used = 0
+    for paragraph in text.split("\n"):
+        tokens = estimate_tokens(paragraph) + 1
+        if used + tokens > max_tokens:
+            # 最後の段落は残り予算に収まる長さまで文字単位で削る
+            remaining = max_tokens - used
+            while paragraph and estimate_tokens(paragraph) > remaining:
+                paragraph = paragraph[:int(len(paragraph) * 0.9)]
+            if paragraph:
+                kept.append(paragraph + "…")
+            break
+        kept.append(paragraph)
+        used += tokens
+
+    return "\n".join(kept)
+
+
+def decode_html(data, declared_encoding=None):
+    """HTTPヘッダーまたはmetaタグの文字コードでデコード（不明ならUTF-8）"""
+    encoding = declared_encoding
+    if not encoding:
+        match = META_CHARSET.search(data[:4096])
+        encoding = match.group(1).decode('ascii') if match else 'utf-8'
+
+    try:
+        return data.decode(encoding, errors='replace')
+    except LookupError:
+        return data.decode('utf-8', errors='replace')
+
+
+def fetch_article_html(url, max_bytes=None, timeout=None):
+    """記事HTMLをストリーミングで取得し、max_bytesを超えた分は読まずに打ち切る"""
+    max_bytes = max_bytes or int(os.getenv('ARTICLE_MAX_BYTES', str(2 * 1024 * 1024)))
+    timeout = timeout or float(os.getenv('ARTICLE_FETCH_TIMEOUT', '10'))
+    deadline = time.monotonic() + timeout
+
+    response = get_http_client().get(url, stream=True, timeout=timeout)
+    try:
+        response.raise_for_status()
+
+        content_type = response.headers.get('Content-Type', '')
+        if 'html' not in content_type:
+            raise ValueError(f"HTMLではありません ({content_type})")
+
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(chunk_size=16384):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes or time.monotonic() > deadline:
+                break
+
+        # Content-Typeにcharsetが明示されている場合だけ採用する（requestsの既定値ISO-8859-1は使わない）
+        declared = response.encoding if 'charset=' in content_type.lower() else None
+        return decode_html(b''.join(chunks)[:max_bytes], declared), size
+    finally:
+        response.close()
+
+
+class ContentStore:
+    """URLをキーにした抽出済み本文の保存先"""
+
+    def __init__(self, path=None, ttl_days=None):
+        self.path = path or os.getenv('ARTICLE_STORE_PATH', DEFAULT_STORE_PATH)
+        if ttl_days is None:
+            ttl_days = float(os.getenv('ARTICLE_STORE_TTL_DAYS', '30'))
+        self.ttl = ttl_days * 24 * 60 * 60
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS contents (
+                url TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get(self, url):
+        """保存済みの本文を取得（期限切れ・未登録はNone）"""
+        with self.lock:
+            row = self.conn.execute("SELECT content, fetched_at FROM contents WHERE url = ?", (url,)).fetchone()
+
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return row[0]
+
+    def set(self, url, content):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO contents (url, content, fetched_at) VALUES (?, ?, ?)",
+                (url, content, time.time())
+            )
+            self.conn.execute("DELETE FROM contents WHERE fetched_at < ?", (time.time() - self.ttl,))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def extract_article(url, store=None, max_tokens=None):
+    """記事本文を取得・抽出（保存済みなら再取得しない、失敗時は空文字）"""
+    max_tokens = max_tokens or int(os.getenv('ARTICLE_MAX_TOKENS', '2000'))
+
+    if store is not None:
+        content = store.get(url)
+        if content is not None:
+            return content
+
+    try:
+        with get_run_report().span('article_extract', url=url) as span:
+            html_text, size = fetch_article_html(url)
+            content = truncate_to_tokens(extract_main_text(html_text), max_tokens)
+            span['bytes'] = size
+            span['chars'] = len(content)
+    except Exception as e:
+        print(f"本文取得エラー ({url}): {e}")
+        return ''
+
+    if store is not None and content:
+        store.set(url, content)
+    return content
+
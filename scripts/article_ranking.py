@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+記事のスコアリングと順位付け
+候補記事からブックマーク数・増加速度・経過時間などの列をまとめて作り、
+列ごとにスコアを計算して重み付きで合算する（候補が数百件でも記事ごとの処理を繰り返さない）
+
+ARTICLE_RANKING の指定例:
+  feed                 フィードの掲載順（既定、ブックマーク数は取得しない）
+  bookmarks            ブックマーク数（対数）
+  velocity             前回取得時からの1時間あたりの増加数（初回は公開からの平均）
+  decay                ブックマーク数を経過時間で減衰（HNの重力式）
+  velocity:2,decay:1   複数のスコアを重み付きで合算（各スコアは最大値で0〜1に正規化）
+"""
+
+import os
+import math
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+# ブックマーク数が必要なスコア
+COUNT_SCORERS = {'bookmarks', 'velocity', 'decay'}
+
+
+def parse_timestamp(text):
+    """ISO 8601（Atom・dc:date）またはRFC 822（RSS 2.0のpubDate）の日時をUNIX時刻に変換（失敗時はNone）"""
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(text).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def build_columns(articles, counts, now):
+    """スコア計算に使う値を記事ごとではなく列（リスト）としてまとめる"""
+    entries = [counts.get(article['link'], {}) for article in articles]
+    bookmarks = [
+        entry.get('count', article.get('bookmarks', 0)) for article, entry in zip(articles, entries)
+    ]
+    # 公開日時がない記事は初めてブックマーク数を取得した時刻から数える
+    published = [
+        parse_timestamp(article.get('published')) or entry.get('first_seen_at') or now
+        for article, entry in zip(articles, entries)
+    ]
+    return {
+        'position': list(range(len(articles))),
+        'bookmarks': bookmarks,
+        'prev_bookmarks': [entry.get('prev_count') for entry in entries],
+        'elapsed_hours': [
+            (entry['fetched_at'] - entry['prev_at']) / 3600 if entry.get('prev_at') else None for entry in entries
+        ],
+        'age_hours': [max(0.0, (now - timestamp) / 3600) for timestamp in published],
+    }
+
+
+def score_feed(columns):
+    return [1.0 / (position + 1) for position in columns['position']]
+
+
+def score_bookmarks(columns):
+    return [math.log1p(count) for count in columns['bookmarks']]
+
+
+def score_velocity(columns):
+    # 30分未満の間隔は増加数が揺れやすいので30分として扱う
+    return [
+        max(0, count - prev) / max(elapsed, 0.5) if prev is not None else count / max(age, 1.0)
+        for count, prev, elapsed, age in zip(
+            columns['bookmarks'], columns['prev_bookmarks'], columns['elapsed_hours'], columns['age_hours']
+        )
+    ]
+
+
+def score_decay(columns):
+    gravity = float(os.getenv('RANKING_GRAVITY', '1.8'))
+    return [count / (age + 2) ** gravity for count, age in zip(columns['bookmarks'], columns['age_hours'])]
+
+
+SCORERS = {
+    'feed': score_feed,
+    'bookmarks': score_bookmarks,
+    'velocity': score_velocity,
+    'decay': score_decay,
+}
+
+
+def parse_ranking(spec):
+    """"velocity:2,decay:1" 形式の指定を [(スコア名, 重み)] に変換（不明な名前は無視）"""
+    weights = []
+    for part in (spec or '').split(','):
+        name, _, weight = part.strip().partition(':')
+        if not name:
+            continue
+        if name not in SCORERS:
+            print(f"不明なスコアを無視します: {name}")
+            continue
+        try:
+            weights.append((name, float(weight) if weight else 1.0))
+        except ValueError:
+            print(f"スコアの重みが不正です: {part.strip()}")
+    return weights or [('feed', 1.0)]
+
+
+def needs_counts(weights):
+    return any(name in COUNT_SCORERS for name, _ in weights)
+
+
+def normalize(values):
+    peak = max(values, default=0)
+    return [value / peak for value in values] if peak > 0 else [0.0] * len(values)
+
+
+def rank_articles(articles, weights, counts=None, now=None):
+    """weightsの各スコアを列ごとに計算して合算し、スコアの高い順に並べた記事のコピーを返す
+
+    各記事には 'score' と 'bookmarks'（取得できた最新の件数）を付ける。同点は元の順序を保つ。
+    """
+    if not articles:
+        return []
+
+    columns = build_columns(articles, counts or {}, now or time.time())
+    total = [0.0] * len(articles)
+    for name, weight in weights:
+        total = [current + weight * value for current, value in zip(total, normalize(SCORERS[name](columns)))]
+
+    order = sorted(range(len(articles)), key=lambda index: -total[index])
+    return [
+        dict(articles[index], score=total[index], bookmarks=columns['bookmarks'][index])
+        for index in order
+    ]
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Block Kitメッセージの構築
+ブロック数とJSONサイズを追加のたびに積算し、上限を超える場合は次のメッセージ（スレッド返信）に分ける。
+テキストは書記素（絵文字・結合文字）の途中で切らないよう切り詰め、送信前にローカルで検証する
+"""
+
+import json
+import unicodedata
+
+# Slackの上限値
+MAX_BLOCKS = 50
+MAX_SECTION_TEXT = 3000
+MAX_HEADER_TEXT = 150
+MAX_BUTTON_TEXT = 75
+MAX_BUTTON_VALUE = 2000
+MAX_CONTEXT_ELEMENTS = 10
+MAX_ACTIONS_ELEMENTS = 25
+# メッセージ1件あたりのブロックJSONサイズの目安（バイト）
+MAX_MESSAGE_BYTES = 40000
+
+BLOCK_TYPES = {'header', 'section', 'actions', 'divider', 'context', 'image'}
+
+ZERO_WIDTH_JOINER = '\u200d'
+
+
+def is_grapheme_extension(char):
+    """直前の文字と1つの書記素を構成する文字か（結合文字・異体字セレクタ・肌色修飾子など）"""
+    code = ord(char)
+    return (
+        unicodedata.combining(char) != 0
+        or unicodedata.category(char) in ('Mn', 'Me', 'Mc')
+        or 0xFE00 <= code <= 0xFE0F
+        or 0x1F3FB <= code <= 0x1F3FF
+        or 0xE0020 <= code <= 0xE007F
+        or char == ZERO_WIDTH_JOINER
+    )
+
+
+def is_regional_indicator(char):
+    return 0x1F1E6 <= ord(char) <= 0x1F1FF
+
+
+def grapheme_boundary(text, limit):
+    """limit文字以下で、書記素の途中にならない最大の切断位置"""
+    if len(text) <= limit:
+        return len(text)
+
+    cut = limit
+    while cut > 0:
+        char = text[cut]
+        previous = text[cut - 1]
+        # 結合文字・ZWJの直後・国旗（地域指示子のペア）の途中では切らない
+        if is_grapheme_extension(char) or previous == ZERO_WIDTH_JOINER:
+            cut -= 1
+            continue
+        if is_regional_indicator(char) and is_regional_indicator(previous):
+            run = 0
+            while cut - run > 0 and is_regional_indicator(text[cut - run - 1]):
+                run += 1
+            if run % 2 == 1:
+                cut -= 1
+                continue
+        break
+
+    return cut
+
+
+def truncate_text(text, limit, ellipsis='…'):
+    """書記素単位でlimit文字以内に切り詰める（切り詰めた場合は末尾に省略記号）"""
+    if len(text) <= limit:
+        return text
+    return text[:grapheme_boundary(text, limit - len(ellipsis))] + ellipsis
+
+
+def plain_text(text, limit):
+    return {"type": "plain_text", "text": truncate_text(text, limit), "emoji": True}
+
+
+def header_block(text):
+    return {"type": "header", "text": plain_text(text, MAX_HEADER_TEXT)}
+
+
+def section_block(text, accessory=None):
+    block = {"type": "section", "text": {"type": "mrkdwn", "text": truncate_text(text, MAX_SECTION_TEXT)}}
+    if accessory:
+        block["accessory"] = accessory
+    return block
+
+
+def button_element(text, action_id, value=None, style=None):
+    """ボタン要素（valueが上限を超える場合は切り詰めずに省く。途中で切ったURLは別のページを指してしまう）"""
+    button = {
+        "type": "button",
+        "text": plain_text(text, MAX_BUTTON_TEXT),
+        "action_id": action_id,
+    }
+    if value is not None and len(value) <= MAX_BUTTON_VALUE:
+        button["value"] = value
+    if style:
+        button["style"] = style
+    return button
+
+
+def actions_block(elements):
+    return {"type": "actions", "elements": elements[:MAX_ACTIONS_ELEMENTS]}
+
+
+def context_block(texts):
+    return {"type": "context", "elements": [{"type": "mrkdwn", "text": text} for text in texts[:MAX_CONTEXT_ELEMENTS]]}
+
+
+def divider_block():
+    return {"type": "divider"}
+
+
+def block_size(block):
+    """ブロックのJSONサイズ（UTF-8バイト数、配列内の区切り文字を含む）"""
+    return len(json.dumps(block, ensure_ascii=False, separators=(',', ':')).encode('utf-8')) + 1
+
+
+class BlockKitMessage:
+    """1件のメッセージ分のブロックと、その積算サイズ"""
+
+    def __init__(self):
+        self.blocks = []
+        self.size = 2  # 配列の括弧
+
+    def fits(self, blocks, size, max_blocks, max_bytes):
+        return len(self.blocks) + len(blocks) <= max_blocks and self.size + size <= max_bytes
+
+    def extend(self, blocks, size):
+        self.blocks.extend(blocks)
+        self.size += size
+
+
+class BlockKitBuilder:
+    """上限を見ながらブロックを積み上げ、溢れた分を次のメッセージに送るビルダー
+
+    記事のように分けたくないブロックのまとまりは add_group で追加する。
+    footer は最後のメッセージの末尾に付け、上限の計算にも含める。
+    """
+
+    def __init__(self, max_blocks=MAX_BLOCKS, max_bytes=MAX_MESSAGE_BYTES):
+        self.max_blocks = max_blocks
+        self.max_bytes = max_bytes
+        self.messages = [BlockKitMessage()]
+        self.footer = []
+        self.footer_size = 0
+
+    @property
+    def current(self):
+        return self.messages[-1]
+
+    def set_footer(self, blocks):
+        self.footer = list(blocks)
+        self.footer_size = sum(block_size(block) for block in blocks)
+
+    def add(self, block):
+        self.add_group([block])
+
+    def add_group(self, blocks, separator=None):
+        """ブロックのまとまりを追加（入りきらなければ新しいメッセージを始める）
+
+        separator は同じメッセージ内で直前の要素と区切る場合にだけ先頭に付ける（区切り線など）。
+        """
+        blocks = list(blocks)
+        size = sum(block_size(block) for block in blocks)
+        limit_blocks = self.max_blocks - len(self.footer)
+        limit_bytes = self.max_bytes - self.footer_size
+
+        if separator is not None and self.current.blocks:
+            with_separator = [separator] + blocks
+            separator_size = block_size(separator)
+            if self.current.fits(with_separator, size + separator_size, limit_blocks, limit_bytes):
+                self.current.extend(with_separator, size + separator_size)
+                return
+
+        if not self.current.fits(blocks, size, limit_blocks, limit_bytes) and self.current.blocks:
+            self.messages.append(BlockKitMessage())
+
+        self.current.extend(blocks, size)
+
+    def build(self):
+        """メッセージのリストを返す（フッターは最後のメッセージに付ける）"""
+        messages = [message for message in self.messages if message.blocks]
+        if not messages:
+            messages = [BlockKitMessage()]
+        if self.footer:
+            messages[-1].extend(self.footer, self.footer_size)
+        return messages
+
+
+def validate_blocks(blocks, max_blocks=MAX_BLOCKS, max_bytes=MAX_MESSAGE_BYTES):
+    """Slackに送る前にブロックを検証し、問題点のリストを返す（問題がなければ空）"""
+    errors = []
+
+    if not blocks:
+        errors.append("ブロックが空です")
+    if len(blocks) > max_blocks:
+        errors.append(f"ブロック数が上限を超えています ({len(blocks)} > {max_blocks})")
+
+    size = 2 + sum(block_size(block) for block in blocks)
+    if size > max_bytes:
+        errors.append(f"ブロックのサイズが上限を超えています ({size} > {max_bytes}バイト)")
+
+    block_ids = set()
+    for index, block in enumerate(blocks, 1):
+        block_type = block.get('type')
+        label = f"ブロック{index} ({block_type})"
+
+        if block_type not in BLOCK_TYPES:
+            errors.append(f"{label}: 未対応のブロック種別です")
+            continue
+
+        block_id = block.get('block_id')
+        if block_id:
+            if block_id in block_ids:
+                errors.append(f"{label}: block_idが重複しています ({block_id})")
+            block_ids.add(block_id)
+
+        text = block.get('text', {}).get('text', '') if isinstance(block.get('text'), dict) else ''
+        if block_type == 'header' and not 0 < len(text) <= MAX_HEADER_TEXT:
+            errors.append(f"{label}: テキストは1〜{MAX_HEADER_TEXT}文字にしてください ({len(text)})")
+        if block_type == 'section' and not 0 < len(text) <= MAX_SECTION_TEXT:
+            errors.append(f"{label}: テキストは1〜{MAX_SECTION_TEXT}文字にしてください ({len(text)})")
+
+        elements = list(block.get('elements', []))
+        if block.get('accessory'):
+            elements.append(block['accessory'])
+        if block_type == 'actions' and not 0 < len(elements) <= MAX_ACTIONS_ELEMENTS:
+            errors.append(f"{label}: 要素は1〜{MAX_ACTIONS_ELEMENTS}個にしてください")
+        if block_type == 'context' and not 0 < len(elements) <= MAX_CONTEXT_ELEMENTS:
+            errors.append(f"{label}: 要素は1〜{MAX_CONTEXT_ELEMENTS}個にしてください")
+
+        for element in elements:
+            if element.get('type') != 'button':
+                continue
+            button_text = element.get('text', {}).get('text', '')
+            if not 0 < len(button_text) <= MAX_BUTTON_TEXT:
+                errors.append(f"{label}: ボタンのテキストは1〜{MAX_BUTTON_TEXT}文字にしてください")
+            if len(element.get('value', '')) > MAX_BUTTON_VALUE:
+                errors.append(f"{label}: ボタンのvalueが{MAX_BUTTON_VALUE}文字を超えています")
+            if element.get('style') not in (None, 'primary', 'danger'):
+                errors.append(f"{label}: ボタンのstyleが不正です ({element.get('style')})")
+
+    return errors
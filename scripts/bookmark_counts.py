@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+はてなブックマーク数の一括取得
+候補記事のURLをまとめてはてブのカウントAPIに問い合わせ（1リクエスト最大50URL）、
+取得した件数を短いTTLでSQLiteにキャッシュする。前回の件数も残し、ブックマークの増加速度の計算に使う
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from http_client import get_http_client
+from run_report import get_run_report
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'bookmark_counts.sqlite3')
+
+# はてブのカウントAPI（ローカルのスタブに向ける場合に変更する）
+HATENA_COUNT_API_URL = os.getenv('HATENA_COUNT_API_URL', 'https://bookmark.hatenaapis.com/count/entries')
+
+# カウントAPIに1回で渡せるURLの上限
+MAX_URLS_PER_REQUEST = 50
+
+
+class BookmarkCountStore:
+    """URLごとの最新のブックマーク数と、その前に取得した件数・初めて見た時刻の保存先"""
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path or os.getenv('BOOKMARK_COUNT_CACHE_PATH', DEFAULT_STORE_PATH)
+        self.ttl = ttl if ttl is not None else float(os.getenv('BOOKMARK_COUNT_TTL', '600'))
+        self.retention = float(os.getenv('BOOKMARK_COUNT_RETENTION_DAYS', '7')) * 24 * 60 * 60
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS counts (
+                url TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                prev_count INTEGER,
+                prev_at REAL,
+                first_seen_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get_many(self, urls):
+        """保存済みの件数をURLごとの辞書で返す（期限切れも含み、'fresh' で判別する）"""
+        now = time.time()
+        rows = {}
+        with self.lock:
+            for start in range(0, len(urls), 500):
+                chunk = urls[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows.update({
+                    row[0]: {
+                        'count': row[1], 'fetched_at': row[2], 'prev_count': row[3], 'prev_at': row[4],
+                        'first_seen_at': row[5], 'fresh': now - row[2] <= self.ttl,
+                    }
+                    for row in self.conn.execute(
+                        "SELECT url, count, fetched_at, prev_count, prev_at, first_seen_at "
+                        f"FROM counts WHERE url IN ({placeholders})", chunk
+                    )
+                })
+        return rows
+
+    def set_many(self, counts, previous=None):
+        """取得した件数を保存（それまでの件数は prev_count / prev_at に移す）"""
+        now = time.time()
+        previous = previous or {}
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO counts (url, count, fetched_at, prev_count, prev_at, first_seen_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (url, count, now,
+                     previous[url]['count'] if url in previous else None,
+                     previous[url]['fetched_at'] if url in previous else None,
+                     previous[url]['first_seen_at'] if url in previous else now)
+                    for url, count in counts.items()
+                ]
+            )
+            self.conn.execute("DELETE FROM counts WHERE fetched_at < ?", (now - self.retention,))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def request_counts(urls, timeout=10):
+    """カウントAPIに最大50件のURLをまとめて問い合わせ、URLごとの件数を返す（未登録のURLは0件）"""
+    query = urlencode([('url', url) for url in urls])
+    with get_run_report().span('bookmark_count_request', urls=len(urls)):
+        response = get_http_client().get(f"{HATENA_COUNT_API_URL}?{query}", timeout=timeout)
+    response.raise_for_status()
+    counts = response.json()
+    return {url: int(counts.get(url) or 0) for url in urls}
+
+
+def fetch_bookmark_counts(urls, store=None, concurrency=None):
+    """URLごとのブックマーク数と前回の件数を返す
+
+    TTL内にキャッシュした件数はそのまま使い、残りだけを50件ずつまとめて並列に問い合わせる。
+    問い合わせに失敗したURLは期限切れのキャッシュがあればそれを使い、なければ結果に含めない。
+    戻り値は {url: {'count', 'fetched_at', 'prev_count', 'prev_at', 'first_seen_at'}}。
+    """
+    concurrency = concurrency or int(os.getenv('BOOKMARK_COUNT_CONCURRENCY', '4'))
+    urls = list(dict.fromkeys(urls))
+    own_store = store is None
+
+    try:
+        store = store or BookmarkCountStore()
+    except Exception as e:
+        print(f"ブックマーク数キャッシュの読み込みエラー: {e}")
+        return {}
+
+    try:
+        cached = store.get_many(urls)
+        missing = [url for url in urls if not cached.get(url, {}).get('fresh')]
+        chunks = [missing[start:start + MAX_URLS_PER_REQUEST] for start in range(0, len(missing), MAX_URLS_PER_REQUEST)]
+
+        def request(chunk):
+            try:
+                return request_counts(chunk)
+            except Exception as e:
+                print(f"ブックマーク数の取得エラー ({len(chunk)}件): {e}")
+                return {}
+
+        fetched = {}
+        if chunks:
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as executor:
+                for counts in executor.map(request, chunks):
+                    fetched.update(counts)
+            store.set_many(fetched, cached)
+
+        report = get_run_report()
+        report.count('bookmark_count_cache_hits', len(urls) - len(missing))
+        report.count('bookmark_count_requests', len(chunks))
+        print(f"ブックマーク数: {len(urls)}件 (キャッシュ {len(urls) - len(missing)}件 / {len(chunks)}リクエスト)")
+
+        results = {url: dict(entry) for url, entry in cached.items()}
+        if fetched:
+            results.update(store.get_many(list(fetched)))
+        return results
+    finally:
+        if own_store:
+            store.close()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+常駐モード
+プロセスを起動したままにして、HTTP接続プールとGeminiクライアントを使い回す。
+DAEMON_DIGEST_SCHEDULE（cron形式）の時刻に日次ダイジェストを投稿し、その合間に
+DAEMON_POLL_INTERVAL 秒ごとにフィードを確認して、ブックマーク数が閾値を超えた記事を速報として投稿する。
+状態（最後に投稿した時刻・速報済みの記事）はファイルに保存して再起動後も引き継ぎ、
+GET /health で稼働状況を返す
+
+  python scripts/daemon.py
+"""
+
+import os
+import json
+import time
+import signal
+import threading
+from datetime import datetime, timedelta
+from functools import partial
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from zoneinfo import ZoneInfo
+from article_archive import ArticleArchive
+from article_extractor import ContentStore
+from daily_post import run_daily_post
+from dry_run import dry_run_from_env
+from feed_sources import aggregate_articles, canonicalize_url, resolve_sources
+from http_client import get_http_client
+from llm_resilience import get_tiered_generator
+from pipeline import BotApiSink, enrich_stage, interaction_store_stage, run_pipeline, summarize_stage
+from prompt_budget import get_prompt_budget
+from rate_limiter import get_usage_ledger
+from run_report import reset_run_report
+from summary_cache import SummaryCache
+
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'daemon_state.json')
+
+# cron形式の各フィールドの範囲（分・時・日・月・曜日）
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def parse_cron_field(field, low, high):
+    """cronの1フィールド（* / 数値 / 範囲 / リスト / ステップ）を値の集合に変換"""
+    values = set()
+    for part in field.split(','):
+        expression, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if expression == '*':
+            start, end = low, high
+        elif '-' in expression:
+            start, end = (int(value) for value in expression.split('-', 1))
+        else:
+            start = int(expression)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f"cronの値が範囲外です: {part} ({low}-{high})")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """「分 時 日 月 曜日」形式のスケジュール（曜日は0と7が日曜）"""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron形式は「分 時 日 月 曜日」の5項目です: {expression}")
+
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELDS)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        # 日と曜日の両方が指定された場合は、cronと同じくどちらかに一致すれば実行する
+        self.days_restricted = fields[2] != '*'
+        self.weekdays_restricted = fields[4] != '*'
+
+    def matches_day(self, moment):
+        day_match = moment.day in self.days
+        weekday_match = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_match or weekday_match
+        return day_match and weekday_match
+
+    def next_after(self, moment):
+        """momentより後で最初に一致する時刻（分単位）"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 4)
+
+        while candidate < limit:
+            if candidate.month not in self.months or not self.matches_day(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+
+        raise ValueError(f"実行時刻が見つかりません: {self.expression}")
+
+
+class DaemonState:
+    """再起動をまたいで引き継ぐ状態（JSONファイル）"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('DAEMON_STATE_PATH', DEFAULT_STATE_PATH)
+        self.data = {'last_digest_at': None, 'breaking': {}}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.data.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            print(f"常駐モードの状態の読み込みエラー: {e}")
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def mark_breaking(self, links, retention_days=7):
+        """速報として投稿した記事を記録（保持期間を過ぎた記録は削除）"""
+        now = time.time()
+        cutoff = now - retention_days * 24 * 60 * 60
+        breaking = {link: posted_at for link, posted_at in self.data['breaking'].items() if posted_at >= cutoff}
+        breaking.update({canonicalize_url(link): now for link in links})
+        self.data['breaking'] = breaking
+
+    def is_breaking_posted(self, link):
+        return canonicalize_url(link) in self.data['breaking']
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    """GET /health に稼働状況をJSONで返す（最初のジョブが終わる前・フィード確認が滞っていれば503）"""
+
+    bot = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/health':
+            self.send_error(404)
+            return
+
+        status = self.bot.health()
+        body = json.dumps(status, ensure_ascii=False).encode('utf-8')
+        self.send_response(200 if status['status'] == 'ok' else 503)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BotDaemon:
+    """スケジュール実行・速報・ヘルスチェックを行う常駐プロセス"""
+
+    def __init__(self, schedule=None, poll_interval=None, breaking_threshold=None, state=None):
+        self.timezone = ZoneInfo(os.getenv('DAEMON_TIMEZONE', 'Asia/Tokyo'))
+        self.schedule = CronSchedule(schedule or os.getenv('DAEMON_DIGEST_SCHEDULE', '0 12 * * *'))
+        self.poll_interval = poll_interval or float(os.getenv('DAEMON_POLL_INTERVAL', '600'))
+        self.breaking_threshold = breaking_threshold or int(os.getenv('DAEMON_BREAKING_THRESHOLD', '300'))
+        self.breaking_max = int(os.getenv('DAEMON_BREAKING_MAX', '3'))
+        # 停止中に過ぎた投稿時刻は、この分数以内なら起動直後に投稿する
+        self.catchup = timedelta(minutes=float(os.getenv('DAEMON_CATCHUP_MINUTES', '60')))
+        self.state = state or DaemonState()
+        self.stop_event = threading.Event()
+        self.started_at = time.time()
+        self.last_poll_at = None
+        self.last_error = None
+        self.jobs = 0
+        self.next_digest = self.first_digest_time()
+
+    def now(self):
+        return datetime.now(self.timezone)
+
+    def first_digest_time(self):
+        """次の投稿時刻（前回の投稿以降に過ぎた時刻がcatchup以内なら、その時刻）"""
+        now = self.now()
+        last = self.state.get('last_digest_at')
+        if last:
+            missed = self.schedule.next_after(datetime.fromisoformat(last).astimezone(self.timezone))
+            if missed <= now and now - missed <= self.catchup:
+                return missed
+        return self.schedule.next_after(now)
+
+    def health(self):
+        """稼働状況（最初のフィード確認か日次ダイジェストが終わるまでは starting）"""
+        stale = self.last_poll_at is not None and time.time() - self.last_poll_at > self.poll_interval * 3
+        if stale or self.stop_event.is_set():
+            status = 'stale'
+        elif self.jobs == 0:
+            status = 'starting'
+        else:
+            status = 'ok'
+        return {
+            'status': status,
+            'started_at': datetime.fromtimestamp(self.started_at, self.timezone).isoformat(),
+            'last_poll_at': datetime.fromtimestamp(self.last_poll_at, self.timezone).isoformat() if self.last_poll_at else None,
+            'last_digest_at': self.state.get('last_digest_at'),
+            'next_digest_at': self.next_digest.isoformat(),
+            'jobs': self.jobs,
+            'last_error': self.last_error,
+            'http': get_http_client().latency_stats(),
+            'gemini': get_tiered_generator().snapshot(),
+        }
+
+    def run_job(self, name, fn):
+        """1回分のジョブを実行し、ジョブごとの実行レポートを出力（例外は記録して続行）"""
+        report = reset_run_report(name)
+        try:
+            success = fn()
+            self.last_error = None if success else f"{name}: 投稿に失敗しました"
+            return success
+        except Exception as e:
+            print(f"ジョブ実行エラー ({name}): {e}")
+            self.last_error = f"{name}: {e}"
+            return False
+        finally:
+            self.jobs += 1
+            get_usage_ledger().report()
+            get_prompt_budget().report()
+            get_tiered_generator().report()
+            report.set('http', get_http_client().latency_stats())
+            report.write()
+
+    def run_digest(self):
+        print(f"日次ダイジェストを投稿します ({self.next_digest.isoformat()})")
+        self.run_job('daily_post', run_daily_post)
+        # 失敗しても同じ時刻の再実行はせず、次の時刻を待つ
+        self.state.set('last_digest_at', self.next_digest.isoformat())
+        self.state.save()
+        self.next_digest = self.schedule.next_after(self.now())
+        print(f"次の日次ダイジェスト: {self.next_digest.isoformat()}")
+
+    def poll_breaking(self):
+        """フィードを確認し、閾値を超えた未投稿の記事を速報として投稿"""
+        # 304で前回の記事（古いブックマーク数）を再利用すると閾値の判定がずれるため、毎回本文を取得する
+        sources = resolve_sources(os.getenv('FEED_SOURCES', 'hatena:it'), conditional=False)
+        articles = aggregate_articles(sources, limit=int(os.getenv('DAEMON_POLL_CANDIDATES', '30')))
+        self.last_poll_at = time.time()
+
+        archive = ArticleArchive()
+        try:
+            candidates = [
+                article for article in archive.filter_recently_posted(articles)
+                if article.get('bookmarks', 0) >= self.breaking_threshold
+                and not self.state.is_breaking_posted(article['link'])
+            ][:self.breaking_max]
+            if not candidates:
+                return True
+
+            print(f"速報: {len(candidates)}件の記事がブックマーク数{self.breaking_threshold}を超えました")
+            archive.ingest(candidates)
+            success = self.post_breaking(candidates)
+            if success:
+                archive.record_posts(candidates)
+                self.state.mark_breaking([article['link'] for article in candidates])
+                self.state.save()
+            return success
+        finally:
+            archive.close()
+
+    def post_breaking(self, articles):
+        cache = SummaryCache()
+        store = ContentStore() if os.getenv('ARTICLE_CONTENT', 'true').lower() == 'true' else None
+        stages = [partial(enrich_stage, store=store)] if store is not None else []
+        stages += [partial(summarize_stage, cache=cache), interaction_store_stage]
+
+        sink = BotApiSink(heading=f"⚡ 速報: はてブ{self.breaking_threshold}users超えの技術記事")
+        try:
+            success = run_pipeline(iter(articles), sink, stages)
+        finally:
+            cache.close()
+            if store is not None:
+                store.close()
+
+        # 記事に要約を付けてアーカイブに残す
+        for article, posted in zip(articles, sink.posted):
+            article['summary'] = posted['summary']
+        return success
+
+    def start_health_server(self):
+        port = int(os.getenv('DAEMON_HEALTH_PORT', '8080'))
+        if port <= 0:
+            return None
+
+        handler = type('BoundHealthHandler', (HealthHandler,), {"bot": self})
+        server = ThreadingHTTPServer((os.getenv('DAEMON_HEALTH_HOST', '127.0.0.1'), port), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"ヘルスチェック: http://{server.server_address[0]}:{server.server_address[1]}/health")
+        return server
+
+    def stop(self, signum=None, frame=None):
+        """実行中のジョブが終わったところで停止する"""
+        if not self.stop_event.is_set():
+            print("停止要求を受け付けました。実行中のジョブの完了を待って終了します")
+        self.stop_event.set()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        server = self.start_health_server()
+        next_poll = time.monotonic()
+        print(f"常駐モードを開始しました（次の日次ダイジェスト: {self.next_digest.isoformat()}、"
+              f"フィード確認 {self.poll_interval:.0f}秒ごと、速報の閾値 {self.breaking_threshold}users）")
+
+        try:
+            while not self.stop_event.is_set():
+                if self.now() >= self.next_digest:
+                    self.run_digest()
+                    continue
+
+                if time.monotonic() >= next_poll:
+                    self.run_job('breaking', self.poll_breaking)
+                    next_poll = time.monotonic() + self.poll_interval
+                    continue
+
+                until_digest = (self.next_digest - self.now()).total_seconds()
+                self.stop_event.wait(max(0.0, min(next_poll - time.monotonic(), until_digest, 60)))
+        finally:
+            if server is not None:
+                server.shutdown()
+            self.state.save()
+            get_http_client().close()
+            print("常駐モードを終了しました")
+
+
+def main():
+    print("技術記事要約Bot（常駐モード）を開始...")
+
+    dry_run = dry_run_from_env()
+
+    try:
+        if not os.getenv('GEMINI_API_KEY'):
+            print("GEMINI_API_KEYが設定されていません")
+            return
+
+        if not os.getenv('SLACK_BOT_TOKEN'):
+            print("SLACK_BOT_TOKENが設定されていません")
+            return
+
+        BotDaemon().run()
+    finally:
+        if dry_run is not None:
+            dry_run.finish()
+
+
+if __name__ == "__main__":
+    main()
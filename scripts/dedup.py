@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+類似記事のクラスタリング
+タイトル+説明の文字n-gramからMinHash（1回のハッシュでビンごとの最小値を取る方式）を作り、
+LSHのバンドで候補ペアだけを比較して、同じ話題の記事を1件にまとめる
+"""
+
+import os
+import re
+import zlib
+import random
+import unicodedata
+from functools import lru_cache
+
+NORMALIZE_SPACES = re.compile(r'\s+')
+EMPTY_BIN = 0xFFFFFFFF
+# MinHash署名のビン数と、類似度がちょうど閾値の記事ペアを候補に拾う確率の下限
+NUM_BINS = 64
+LSH_TARGET_RECALL = 0.9
+
+
+def shingles(text, size=3):
+    """正規化したテキストの文字n-gram集合（日本語は単語分割せず文字単位で扱う）"""
+    text = NORMALIZE_SPACES.sub(' ', unicodedata.normalize('NFKC', text).lower()).strip()
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def minhash_signature(shingle_set, num_bins=64):
+    """n-gram集合のMinHash署名（各n-gramを1回だけハッシュし、ビンごとの最小値を取る）"""
+    signature = [EMPTY_BIN] * num_bins
+
+    for shingle in shingle_set:
+        value = (zlib.crc32(shingle.encode('utf-8')) * 0x9E3779B1) & 0xFFFFFFFF
+        index = value % num_bins
+        value //= num_bins
+        if value < signature[index]:
+            signature[index] = value
+
+    # 空のビンは別のビンの値で埋めて、短いテキスト同士でも比較できるようにする
+    if all(value == EMPTY_BIN for value in signature):
+        return signature
+
+    # 借りる先はビンごとに決めた固定の順序で探す（右隣から借りると、空のビンが続く箇所が
+    # 同じ値の繰り返しになり、n-gramを1つ共有するだけの記事同士がバンド単位で一致してしまう）
+    filled = list(signature)
+    for index, order in enumerate(probe_orders(num_bins)):
+        if signature[index] == EMPTY_BIN:
+            filled[index] = next(signature[source] for source in order if signature[source] != EMPTY_BIN)
+
+    return filled
+
+
+@lru_cache(maxsize=None)
+def probe_orders(num_bins):
+    """空のビンごとに値を借りるビンの順序（全記事で共通の固定の乱数列）"""
+    return [random.Random(index).sample(range(num_bins), num_bins) for index in range(num_bins)]
+
+
+def lsh_parameters(threshold, num_bins=NUM_BINS, recall=LSH_TARGET_RECALL):
+    """閾値に合わせたLSHのバンド数と行数
+
+    類似度sのペアが候補になる確率は 1 - (1 - s^rows)^bands。行数を増やすほど無関係な候補は減るが、
+    閾値付近のペアを取りこぼすので、閾値での確率がrecall以上になる最大の行数を選ぶ
+    （64ビン・閾値0.5なら21×3で約94%。16×4では約64%しか拾えない）。
+    """
+    for rows in range(num_bins, 0, -1):
+        bands = num_bins // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            return bands, rows
+    return num_bins, 1
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    # 和集合は作らず、共通部分の大きさから求める
+    common = len(a & b)
+    return common / (len(a) + len(b) - common)
+
+
+def load_local_embedder():
+    """ローカル埋め込みモデルを読み込む（sentence-transformers未導入ならNone）"""
+    model_name = os.getenv('DEDUP_EMBEDDING_MODEL', 'paraphrase-multilingual-MiniLM-L12-v2')
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        print("sentence-transformersが見つからないため、埋め込みによる判定は行いません")
+        return None
+
+    model = SentenceTransformer(model_name)
+    return lambda texts: [list(vector) for vector in model.encode(texts, normalize_embeddings=True)]
+
+
+def cluster_articles(articles, threshold=None, bands=None, rows=None, embed_fn=None, embedding_threshold=None):
+    """近似重複の記事をクラスタにまとめ、記事順を保ったまま代表記事のリストを返す
+
+    代表記事は各クラスタで最も順位の高い記事で、他の記事は 'related' に {title, link} として追加する。
+    LSHのバンド数・行数を省略すると閾値から決める（lsh_parameters）。
+    embed_fn を渡すと、n-gramの類似度が閾値に届かない候補ペアも埋め込みのコサイン類似度で判定する。
+    """
+    if threshold is None:
+        threshold = float(os.getenv('DEDUP_THRESHOLD', '0.5'))
+    if bands is None or rows is None:
+        bands, rows = lsh_parameters(threshold)
+    if embedding_threshold is None:
+        embedding_threshold = float(os.getenv('DEDUP_EMBEDDING_THRESHOLD', '0.85'))
+    if len(articles) < 2:
+        return articles
+
+    texts = [f"{article['title']} {article.get('description', '')}" for article in articles]
+    shingle_sets = [shingles(text) for text in texts]
+    signatures = [minhash_signature(shingle_set, bands * rows) for shingle_set in shingle_sets]
+
+    # 同じバンドのハッシュを持つ記事だけを候補ペアにする（全ペア比較を避ける）
+    candidates = set()
+    for band in range(bands):
+        buckets = {}
+        for index, signature in enumerate(signatures):
+            key = tuple(signature[band * rows:(band + 1) * rows])
+            buckets.setdefault(key, []).append(index)
+        for members in buckets.values():
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    candidates.add((members[i], members[j]))
+
+    embeddings = None
+    if embed_fn is not None and candidates:
+        embeddings = embed_fn(texts)
+
+    parent = list(range(len(articles)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    # まとまるのは類似と判定したペアでつながる記事で、判定の順序にはよらない
+    for i, j in candidates:
+        root_i, root_j = find(i), find(j)
+        if root_i == root_j:
+            continue
+        similar = jaccard(shingle_sets[i], shingle_sets[j]) >= threshold
+        if not similar and embeddings is not None:
+            similar = sum(a * b for a, b in zip(embeddings[i], embeddings[j])) >= embedding_threshold
+        if similar:
+            # 順位の高い（インデックスの小さい）記事を代表にする
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    clusters = {}
+    for index in range(len(articles)):
+        clusters.setdefault(find(index), []).append(index)
+
+    result = []
+    for root in sorted(clusters):
+        members = clusters[root]
+        representative = dict(articles[members[0]])
+        if len(members) > 1:
+            representative['related'] = representative.get('related', []) + [
+                {'title': articles[index]['title'], 'link': articles[index]['link']}
+                for index in members[1:]
+            ]
+        result.append(representative)
+
+    return result
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+ドライラン・リプレイ
+DRY_RUN_MODE に応じて、実際の実行のHTTP通信とGeminiの応答をフィクスチャに記録したり（record）、
+記録したフィクスチャから決定的に再生したり（replay）する。replay・stub ではSlackとGeminiを
+プロセス内のスタブに差し替え、遅延とエラーを注入できる。
+
+  record: 通常どおり実行し、HTTP通信とGeminiの応答を DRY_RUN_FIXTURES に保存する
+  replay: フィード・記事の取得をフィクスチャから再生し、Slack/Geminiはスタブを使う（ネットワーク不要）
+  stub:   フィード・記事は実際に取得し、Slack/Geminiだけスタブを使う
+"""
+
+import io
+import os
+import re
+import json
+import time
+import base64
+import random
+import hashlib
+import tempfile
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.structures import CaseInsensitiveDict
+import llm_client
+from block_kit import validate_blocks
+from feed_store import close_feed_store
+from http_client import get_http_client
+from rate_limiter import close_usage_ledger
+
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'fixtures')
+MODES = ('record', 'replay', 'stub')
+
+# 記録時に外すヘッダー（認証情報・条件付きリクエスト）
+SENSITIVE_HEADERS = {'authorization', 'cookie', 'set-cookie'}
+CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+
+# スタブ・リプレイ時に実行ごとの状態を持ち越さないよう、一時ディレクトリへ向けるストア
+STATE_PATH_VARS = {
+    'ARCHIVE_PATH': 'archive.sqlite3',
+    'ARTICLE_STORE_PATH': 'articles.sqlite3',
+    'BOOKMARK_COUNT_CACHE_PATH': 'bookmark_counts.sqlite3',
+    'DAEMON_STATE_PATH': 'daemon_state.json',
+    'FEED_STORE_PATH': 'feeds.sqlite3',
+    'INTERACTION_STORE_PATH': 'interaction_store.json',
+    'GEMINI_USAGE_PATH': 'gemini_usage.sqlite3',
+    'SUMMARY_CACHE_PATH': 'summaries.sqlite3',
+    'WEEKLY_ROLLUP_CACHE_PATH': 'rollup.sqlite3',
+}
+
+BATCH_ENTRY = re.compile(r'\[記事(\d+)\]')
+TITLE_LINE = re.compile(r'タイトル: (.*)')
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+def build_response(url, status, headers, body):
+    """記録した内容から requests.Response を組み立てる（stream=True の読み出しにも対応）"""
+    response = requests.Response()
+    response.url = url
+    response.status_code = status
+    response.reason = 'Stub'
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.raw = io.BytesIO(body)
+    response._content = body
+    response._content_consumed = True
+    return response
+
+
+class InjectedFaults:
+    """スタブ1種類分の遅延とエラー注入の設定（乱数は DRY_RUN_SEED で固定できる）
+
+    SPIKE_RATE の割合の回だけ、SPIKE_LATENCY 秒の遅延を上乗せする（遅延の裾の再現）。
+    enabled=False なら遅延もエラーも注入しない。
+    """
+
+    def __init__(self, name, rng, enabled=True):
+        prefix = f"DRY_RUN_{name.upper()}_"
+        self.latency = float(os.getenv(prefix + 'LATENCY', '0')) if enabled else 0.0
+        self.jitter = float(os.getenv(prefix + 'JITTER', '0')) if enabled else 0.0
+        self.error_rate = float(os.getenv(prefix + 'ERROR_RATE', '0')) if enabled else 0.0
+        self.spike_rate = float(os.getenv(prefix + 'SPIKE_RATE', '0')) if enabled else 0.0
+        self.spike_latency = float(os.getenv(prefix + 'SPIKE_LATENCY', '10'))
+        self.rng = rng
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """設定した遅延だけ待ち、エラーを注入する回ならTrueを返す"""
+        with self.lock:
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            if self.rng.random() < self.spike_rate:
+                delay += self.spike_latency
+            fail = self.rng.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        return fail
+
+
+class FixtureStore:
+    """HTTP通信とGeminiの応答のフィクスチャ
+
+    HTTPは (メソッド, URL) ごとに記録順で並べ、再生時も同じ順に返す。
+    再生用の本文は最初に再生する時点で1度だけデコードし、再生のたびにbase64を展開しない。
+    Geminiはプロンプトのハッシュをキーに応答テキストを保存する。
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.getenv('DRY_RUN_FIXTURES', DEFAULT_FIXTURE_DIR)
+        self.http_path = os.path.join(self.directory, 'http.json')
+        self.gemini_path = os.path.join(self.directory, 'gemini.json')
+        self.lock = threading.Lock()
+        self.exchanges = []
+        self.replays = {}
+        self.gemini = {}
+        self.cursors = {}
+
+    def load(self):
+        try:
+            with open(self.http_path, encoding='utf-8') as f:
+                self.exchanges = json.load(f)
+            with open(self.gemini_path, encoding='utf-8') as f:
+                self.gemini = json.load(f)
+        except FileNotFoundError as e:
+            print(f"フィクスチャが見つかりません: {e.filename}")
+        self.replays = {}
+        for exchange in self.exchanges:
+            self.replays.setdefault((exchange['method'], exchange['url']), []).append(dict(exchange, content=None))
+        print(f"フィクスチャを読み込みました: HTTP {len(self.exchanges)}件 / Gemini {len(self.gemini)}件")
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            with open(self.http_path, 'w', encoding='utf-8') as f:
+                json.dump(self.exchanges, f, ensure_ascii=False, indent=1)
+            with open(self.gemini_path, 'w', encoding='utf-8') as f:
+                json.dump(self.gemini, f, ensure_ascii=False, indent=1)
+        print(f"フィクスチャを保存しました: {self.directory} (HTTP {len(self.exchanges)}件 / Gemini {len(self.gemini)}件)")
+
+    def record_exchange(self, method, url, response):
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name.lower() not in SENSITIVE_HEADERS
+        }
+        # 保存時の本文は展開済みなので、圧縮を示すヘッダーは残さない
+        headers.pop('Content-Encoding', None)
+        headers.pop('Content-Length', None)
+        with self.lock:
+            self.exchanges.append({
+                'method': method,
+                'url': url,
+                'status': response.status_code,
+                'headers': headers,
+                'body': base64.b64encode(response.content).decode('ascii'),
+            })
+
+    def next_exchange(self, method, url):
+        """(メソッド, URL) に対応する次の記録を返す（なければNone）。content にデコード済みの本文を入れる"""
+        with self.lock:
+            matches = self.replays.get((method, url))
+            index = self.cursors.get((method, url), 0)
+            if not matches:
+                return None
+            self.cursors[(method, url)] = index + 1
+            # 記録より多く呼ばれた場合は最後の記録を返し続ける
+            exchange = matches[min(index, len(matches) - 1)]
+            if exchange['content'] is None:
+                exchange['content'] = base64.b64decode(exchange['body'])
+            return exchange
+
+    def record_gemini(self, prompt, text):
+        with self.lock:
+            self.gemini[prompt_key(prompt)] = text
+
+    def gemini_text(self, prompt):
+        return self.gemini.get(prompt_key(prompt))
+
+
+class SlackStub:
+    """chat.postMessage / chat.update を受け付けるSlack Web APIのスタブ（投稿内容は posts に残す）"""
+
+    def __init__(self, faults):
+        self.faults = faults
+        self.lock = threading.Lock()
+        self.posts = []
+        self.sequence = 0
+
+    def handle(self, method, url, kwargs):
+        if self.faults.wait():
+            return build_response(url, 429, {'Retry-After': '1', 'Content-Type': 'application/json'},
+                                  b'{"ok": false, "error": "ratelimited"}')
+
+        payload = kwargs.get('json') or {}
+        api_method = urlsplit(url).path.rsplit('/', 1)[-1]
+        blocks = payload.get('blocks')
+
+        if blocks is not None and validate_blocks(blocks):
+            result = {'ok': False, 'error': 'invalid_blocks'}
+        elif api_method in ('chat.postMessage', 'chat.update') or urlsplit(url).netloc == 'hooks.slack.com':
+            with self.lock:
+                self.sequence += 1
+                ts = payload.get('ts') or f"{int(time.time())}.{self.sequence:06d}"
+                self.posts.append({'method': api_method, 'channel': payload.get('channel'), 'ts': ts,
+                                   'thread_ts': payload.get('thread_ts'), 'blocks': len(blocks or [])})
+            result = {'ok': True, 'channel': payload.get('channel'), 'ts': ts}
+        else:
+            result = {'ok': False, 'error': 'unknown_method'}
+
+        return build_response(url, 200, {'Content-Type': 'application/json; charset=utf-8'},
+                              json.dumps(result).encode('utf-8'))
+
+
+class StubResponse:
+    """GenerativeModel.generate_content の戻り値の代わり"""
+
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class GeminiStub:
+    """GenerativeModelの代わりに決定的な応答を返すスタブ（記録済みの応答があればそれを返す）"""
+
+    def __init__(self, faults, fixtures=None):
+        self.faults = faults
+        self.fixtures = fixtures
+
+    def generate_content(self, prompt):
+        if self.faults.wait():
+            raise RuntimeError("429 ResourceExhausted (dry-run stub)")
+
+        if self.fixtures is not None:
+            text = self.fixtures.gemini_text(prompt)
+            if text is not None:
+                return StubResponse(text)
+
+        # まとめて要約するプロンプトには、記事番号ごとのJSON配列で応答する
+        ids = BATCH_ENTRY.findall(prompt)
+        titles = TITLE_LINE.findall(prompt)
+        if ids:
+            return StubResponse(json.dumps([
+                {'id': int(article_id), 'summary': f"（ドライラン要約）{title}"}
+                for article_id, title in zip(ids, titles)
+            ], ensure_ascii=False))
+
+        title = titles[0] if titles else prompt_key(prompt)[:12]
+        return StubResponse(f"（ドライラン要約）{title}")
+
+
+class RecordingModel:
+    """実際のGenerativeModelの応答をフィクスチャに記録するラッパー"""
+
+    def __init__(self, model, fixtures):
+        self.model = model
+        self.fixtures = fixtures
+
+    def generate_content(self, prompt):
+        response = self.model.generate_content(prompt)
+        self.fixtures.record_gemini(prompt, response.text)
+        return response
+
+
+class DryRun:
+    """HTTPクライアントとGeminiクライアントを DRY_RUN_MODE に合わせて差し替える"""
+
+    def __init__(self, mode, fixtures=None, seed=None):
+        if mode not in MODES:
+            raise ValueError(f"DRY_RUN_MODE は {', '.join(MODES)} のいずれかです: {mode}")
+        self.mode = mode
+        self.fixtures = fixtures or FixtureStore()
+        seed = seed if seed is not None else os.getenv('DRY_RUN_SEED', '0')
+        rng = random.Random(seed)
+        self.slack = SlackStub(InjectedFaults('slack', rng))
+        self.gemini_faults = InjectedFaults('gemini', rng)
+        self.gemini_quiet = InjectedFaults('gemini', rng, enabled=False)
+        # 遅延・エラーを注入するモデル（未設定なら全モデル）。フォールバック先の段だけ正常にする場合に使う
+        self.gemini_fault_models = {
+            name.strip() for name in os.getenv('DRY_RUN_GEMINI_FAULT_MODELS', '').split(',') if name.strip()
+        }
+        self.slack_prefixes = (os.getenv('SLACK_API_URL', 'https://slack.com/api'), 'https://hooks.slack.com/')
+        self.state_dir = None
+
+    def is_slack(self, url):
+        return url.startswith(self.slack_prefixes)
+
+    def intercept(self, session, method, url, kwargs):
+        """HttpClient.interceptor として呼ばれる送信処理"""
+        if self.mode != 'record' and self.is_slack(url):
+            return self.slack.handle(method, url, kwargs)
+
+        if self.mode == 'replay':
+            exchange = self.fixtures.next_exchange(method, url)
+            if exchange is None:
+                raise requests.ConnectionError(f"フィクスチャに記録がありません: {method} {url}")
+            return build_response(url, exchange['status'], exchange['headers'], exchange['content'])
+
+        if self.mode == 'record':
+            # 再生時に前回の状態（ETag等）に左右されないよう、常に本文全体を記録する
+            headers = {
+                name: value for name, value in (kwargs.get('headers') or {}).items()
+                if name not in CONDITIONAL_HEADERS
+            }
+            response = session.request(method, url, **dict(kwargs, headers=headers))
+            self.fixtures.record_exchange(method, url, response)
+            return response
+
+        return session.request(method, url, **kwargs)
+
+    def model_factory(self, model_name, generation_config):
+        if self.mode == 'record':
+            model = llm_client.get_genai().GenerativeModel(model_name, generation_config=generation_config)
+            return RecordingModel(model, self.fixtures)
+        faults = self.gemini_faults
+        if self.gemini_fault_models and model_name not in self.gemini_fault_models:
+            faults = self.gemini_quiet
+        return GeminiStub(faults, self.fixtures if self.mode == 'replay' else None)
+
+    def install(self):
+        """差し替えを有効にする（replay・stub ではキャッシュ等の保存先を一時ディレクトリにする）"""
+        if self.mode == 'replay':
+            self.fixtures.load()
+
+        if self.mode != 'record':
+            self.state_dir = tempfile.TemporaryDirectory(prefix='tech_news_dry_run_')
+            for name, filename in STATE_PATH_VARS.items():
+                os.environ[name] = os.path.join(self.state_dir.name, filename)
+            os.environ.setdefault('GEMINI_API_KEY', 'dry-run')
+            os.environ.setdefault('SLACK_BOT_TOKEN', 'xoxb-dry-run')
+
+        get_http_client().interceptor = self.intercept
+        llm_client.set_model_factory(self.model_factory)
+        print(f"ドライランモード: {self.mode}")
+
+    def finish(self):
+        """差し替えを解除し、記録したフィクスチャの保存・スタブへの投稿内容の出力・一時ディレクトリの削除を行う"""
+        get_http_client().interceptor = None
+        llm_client.set_model_factory(None)
+
+        try:
+            if self.mode == 'record':
+                self.fixtures.save()
+                return
+
+            print(f"Slackスタブへの投稿: {len(self.slack.posts)}件")
+            for post in self.slack.posts:
+                thread = f" (スレッド {post['thread_ts']})" if post['thread_ts'] else ""
+                print(f"  {post['method']} {post['channel']}: {post['blocks']}ブロック{thread}")
+        finally:
+            if self.state_dir is not None:
+                # 一時ディレクトリのファイルを開いたままの共有オブジェクトは、消す前に閉じて次回作り直させる
+                close_usage_ledger()
+                close_feed_store()
+                self.state_dir.cleanup()
+                self.state_dir = None
+
+
+def dry_run_from_env():
+    """DRY_RUN_MODE が設定されていれば差し替えを有効にしたDryRunを返す（未設定ならNone）"""
+    mode = os.getenv('DRY_RUN_MODE', '').lower()
+    if not mode:
+        return None
+
+    dry_run = DryRun(mode)
+    dry_run.install()
+    return dry_run
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+RSS/RDF/Atomフィードのストリーミングパーサー
+受信したチャンクを順次パースし、記事が揃った時点で読み込みを打ち切る
+"""
+
+from xml.etree.ElementTree import XMLPullParser, ParseError
+
+# 記事要素として扱うタグ（RSS 1.0(RDF) / RSS 2.0 / Atom）
+ITEM_TAGS = {'item', 'entry'}
+
+
+def local_name(tag):
+    """名前空間を除いたタグ名を取得"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def element_to_article(element):
+    """item/entry要素から記事情報を取り出す"""
+    article = {}
+
+    for child in element:
+        name = local_name(child.tag)
+        text = ''.join(child.itertext()).strip()
+
+        if name == 'title':
+            article['title'] = text
+        elif name == 'link' and 'link' not in article:
+            # Atomはhref属性、RSSは要素テキスト
+            href = child.get('href')
+            if href and child.get('rel', 'alternate') == 'alternate':
+                article['link'] = href
+            elif text:
+                article['link'] = text
+        elif name in ('description', 'summary') and 'description' not in article:
+            article['description'] = text
+        elif name in ('date', 'pubDate', 'published', 'updated') and text and 'published' not in article:
+            # 公開日時（RSS 1.0のdc:date / RSS 2.0のpubDate / Atomのpublished・updated）
+            article['published'] = text
+        elif name == 'bookmarkcount' and text.isdigit():
+            # はてブのRSSに含まれるブックマーク数（hatena:bookmarkcount）
+            article['bookmarks'] = int(text)
+
+    if not article.get('link'):
+        about = element.get('{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about')
+        if about:
+            article['link'] = about
+
+    return article
+
+
+def iter_feed_items(chunks, limit=None):
+    """バイト列チャンクのイテラブルから記事を逐次yield（limit件で読み込み停止）
+
+    解析エラーはそこまでに揃った記事を返したうえで表示して打ち切る
+    （XMLPullParserはエラーを feed ではなく read_events で送出する）。
+    """
+    parser = XMLPullParser(events=('start', 'end'))
+    depth = 0
+    count = 0
+
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+
+            parser.feed(chunk)
+
+            for event, element in parser.read_events():
+                if local_name(element.tag) not in ITEM_TAGS:
+                    continue
+
+                # 入れ子のitem/entryは外側の要素でまとめて扱う
+                if event == 'start':
+                    depth += 1
+                    continue
+
+                depth -= 1
+                if depth > 0:
+                    continue
+
+                article = element_to_article(element)
+                element.clear()
+
+                if article.get('title') and article.get('link'):
+                    yield article
+                    count += 1
+
+                    if limit is not None and count >= limit:
+                        return
+
+        parser.close()
+    except ParseError as e:
+        print(f"フィード解析エラー: {e}")
+
+
+def parse_feed(data, limit=None):
+    """フィード全体のバイト列から記事リストを取得"""
+    return list(iter_feed_items([data], limit=limit))
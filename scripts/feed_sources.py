@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+記事ソースの取得と集約
+はてブ各カテゴリ・Qiita・Zenn・HN・任意のRSS/Atomを並列に取得し、
+正規化したURLで重複を除いて1つのランキングにまとめる
+"""
+
+import time
+import requests
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from feed_parser import iter_feed_items
+from feed_store import get_feed_store
+from http_client import get_http_client
+from run_report import get_run_report
+
+HATENA_HOTENTRY_URL = "https://b.hatena.ne.jp/hotentry/{category}.rss"
+
+# 名前で指定できる定義済みソース
+PRESET_SOURCES = {
+    'qiita': "https://qiita.com/popular-items/feed",
+    'zenn': "https://zenn.dev/feed",
+    'hn': "https://hnrss.org/frontpage",
+}
+
+# 正規化時に取り除くトラッキング用クエリパラメータ（ref・sourceなどは記事を指し分けるサイトがあるので残す）
+TRACKING_PARAMS = {'fbclid', 'gclid'}
+TRACKING_PARAM_PREFIXES = ('utm_', 'mc_')
+
+
+def fetch_feed_articles(url, limit=5, timeout=10, store=None, conditional=True):
+    """フィードを取得して記事リストを返す（timeout秒を超えたら読み込みを打ち切る）
+
+    前回のETag/Last-Modifiedで条件付きリクエストを送り、304なら保存済みの記事リストを返す。
+    conditional=False なら常に本文を取得する（最新のブックマーク数が必要な速報の確認用）。
+    """
+    store = store or get_feed_store()
+    cached = store.get(url) if conditional else None
+
+    headers = {}
+    # 前回より多くの記事が必要な場合は保存済みのリストでは足りないので通常取得する
+    if cached and cached['limit'] >= limit:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    with get_run_report().span('feed_fetch', url=url) as span:
+        deadline = time.monotonic() + timeout
+        response = get_http_client().get(url, headers=headers, stream=True, timeout=timeout)
+        span['status'] = response.status_code
+
+        if response.status_code == 304 and headers:
+            response.close()
+            print(f"  未更新のため前回の記事を再利用: {url}")
+            span['items'] = len(cached['articles'][:limit])
+            return cached['articles'][:limit]
+
+        response.raise_for_status()
+        span['bytes'] = 0
+
+        def chunks():
+            for chunk in response.iter_content(chunk_size=8192):
+                if time.monotonic() > deadline:
+                    raise requests.Timeout(f"{timeout}秒以内に取得できませんでした: {url}")
+                span['bytes'] += len(chunk)
+                yield chunk
+
+        # 受信しながら解析し、limit件揃った時点で読み込みを打ち切る
+        try:
+            articles = list(iter_feed_items(chunks(), limit=limit))
+        finally:
+            response.close()
+        span['items'] = len(articles)
+
+    get_run_report().count('feed_bytes', span['bytes'])
+
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if etag or last_modified:
+        store.set(url, etag, last_modified, limit, articles)
+
+    return articles
+
+
+def get_hatena_tech_articles(category='it', limit=5, timeout=10, conditional=True):
+    """はてなブックマークのテクノロジーカテゴリから人気記事を取得"""
+    url = HATENA_HOTENTRY_URL.format(category=category)
+
+    try:
+        return fetch_feed_articles(url, limit=limit, timeout=timeout, conditional=conditional)
+
+    except Exception as e:
+        print(f"はてブ記事取得エラー: {e}")
+        return []
+
+
+def resolve_sources(spec, conditional=True):
+    """カンマ区切りのソース指定を(名前, 取得関数)のリストに変換
+
+    指定例: "hatena:it,qiita,zenn,hn,https://example.com/feed.xml"
+    取得関数は fetch(limit, timeout) の形で呼び出す。conditional=False なら条件付きリクエストを送らない。
+    """
+    sources = []
+
+    for entry in (spec or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+
+        if entry == 'hatena' or entry.startswith('hatena:'):
+            category = entry.partition(':')[2] or 'it'
+            sources.append((f"hatena:{category}", partial(get_hatena_tech_articles, category, conditional=conditional)))
+        elif entry in PRESET_SOURCES:
+            sources.append((entry, partial(fetch_feed_articles, PRESET_SOURCES[entry], conditional=conditional)))
+        elif entry.startswith(('http://', 'https://')):
+            sources.append((entry, partial(fetch_feed_articles, entry, conditional=conditional)))
+        else:
+            print(f"不明な記事ソースを無視します: {entry}")
+
+    return sources
+
+
+def canonicalize_url(url):
+    """重複判定用にURLを正規化（スキーム・www・末尾スラッシュ・トラッキングパラメータを無視）"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+
+    path = parts.path.rstrip('/')
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PARAM_PREFIXES)
+    ))
+
+    return urlunsplit(('', host, path, query, ''))
+
+
+def aggregate_articles(sources, limit=5, per_source_limit=30, timeout=10):
+    """複数ソースを並列取得し、URL重複を除いてランキング上位limit件を返す
+
+    各ソース内の順位から 1 / (順位 + 1) をスコアとし、複数ソースに載った記事は合算する。
+    """
+    if not sources:
+        return []
+
+    # ソースが1つならランキングの統合は不要なので必要件数だけ読む
+    if len(sources) == 1:
+        per_source_limit = limit
+
+    results = {}
+    executor = ThreadPoolExecutor(max_workers=len(sources))
+    futures = {
+        executor.submit(fetch, per_source_limit, timeout): name
+        for name, fetch in sources
+    }
+    # 個別のtimeoutに加えて、応答しない接続で全体が止まらないよう上限を設ける
+    done, not_done = wait(futures, timeout=timeout + 5)
+    executor.shutdown(wait=False)
+
+    for future in done:
+        name = futures[future]
+        try:
+            results[name] = future.result()
+            print(f"  {name}: {len(results[name])}件")
+        except Exception as e:
+            print(f"記事取得エラー ({name}): {e}")
+
+    for future in not_done:
+        print(f"記事取得タイムアウト ({futures[future]})")
+
+    get_run_report().count('feed_items', sum(len(items) for items in results.values()))
+
+    # 重複除去とスコア計算を1パスで行う（同点は設定順・ソース内順位を維持）
+    ranked = {}
+    order = 0
+    for name, _ in sources:
+        for rank, article in enumerate(results.get(name, [])):
+            key = canonicalize_url(article['link'])
+            entry = ranked.get(key)
+            if entry is None:
+                entry = ranked[key] = {'article': dict(article, source=name), 'score': 0.0, 'order': order}
+                order += 1
+            entry['score'] += 1.0 / (rank + 1)
+
+    best = sorted(ranked.values(), key=lambda entry: (-entry['score'], entry['order']))
+    return [entry['article'] for entry in best[:limit]]
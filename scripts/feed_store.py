@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+フィード取得結果のストア
+フィードURLごとにETag/Last-Modifiedと解析済みの記事リストをSQLiteに保存し、
+条件付きリクエストで304が返った場合に再利用する
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'feeds.sqlite3')
+
+
+class FeedStore:
+    """フィードURLごとの検証子（ETag/Last-Modified）と記事リストの保存先"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('FEED_STORE_PATH', DEFAULT_STORE_PATH)
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # フィードは並列に取得されるため、1接続をロックで共有する
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS feeds (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                item_limit INTEGER NOT NULL,
+                articles TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get(self, url):
+        """保存済みの検証子と記事リストを取得（未登録はNone）"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, item_limit, articles FROM feeds WHERE url = ?", (url,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return {
+            'etag': row[0],
+            'last_modified': row[1],
+            'limit': row[2],
+            'articles': json.loads(row[3]),
+        }
+
+    def set(self, url, etag, last_modified, limit, articles):
+        """検証子と記事リストを保存"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO feeds (url, etag, last_modified, item_limit, articles, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, limit, json.dumps(articles, ensure_ascii=False), time.time())
+            )
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_feed_store():
+    """プロセス共通のフィードストアを取得（初回呼び出し時に作成）"""
+    global _default_store
+
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = FeedStore()
+        return _default_store
+
+
+def close_feed_store():
+    """プロセス共通のフィードストアを閉じて破棄（次の呼び出しで FEED_STORE_PATH から作り直す）"""
+    global _default_store
+
+    with _default_store_lock:
+        if _default_store is not None:
+            _default_store.close()
+            _default_store = None
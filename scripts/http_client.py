@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+共有HTTPクライアント
+フィード取得とSlack投稿で1つのSessionを使い回し、接続プール・タイムアウト・
+指数バックオフ（ジッター付き、429のRetry-After対応）とホスト別レイテンシ集計を提供する
+"""
+
+import os
+import time
+import random
+import threading
+import requests
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from run_report import get_run_report
+
+# 再送しても副作用のないメソッド（5xx・接続エラーでも再試行する）
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+class HttpClient:
+    """接続プール付きSessionのラッパー"""
+
+    def __init__(self, connect_timeout=None, read_timeout=None, max_retries=None,
+                 backoff_base=None, backoff_max=None, pool_size=None, retry_after_max=None):
+        self.connect_timeout = connect_timeout or float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+        self.read_timeout = read_timeout or float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('HTTP_MAX_RETRIES', '3'))
+        self.backoff_base = backoff_base or float(os.getenv('HTTP_BACKOFF_BASE', '0.5'))
+        self.backoff_max = backoff_max or float(os.getenv('HTTP_BACKOFF_MAX', '30'))
+        # サーバーがこれより長いRetry-Afterを指定した場合は待たずに諦める
+        self.retry_after_max = retry_after_max or float(os.getenv('HTTP_RETRY_AFTER_MAX', '60'))
+        pool_size = pool_size or int(os.getenv('HTTP_POOL_SIZE', '10'))
+
+        self.session = requests.Session()
+        # 再試行は自前で行うため、アダプター側の再試行は無効にする
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.lock = threading.Lock()
+        self.stats = {}
+        # ドライラン時に送信を差し替える関数 (session, method, url, kwargs) -> Response
+        self.interceptor = None
+
+    def retry_after(self, response):
+        """Retry-After（秒数またはHTTP日付）を秒数で返す（ない・解釈できない場合はNone）"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def backoff_delay(self, attempt, response=None):
+        """再試行までの待ち時間（Retry-Afterがあればその値、なければ指数バックオフ+ジッター）
+
+        Retry-Afterが HTTP_RETRY_AFTER_MAX 秒を超える場合は、指定より早く送り直さないようNone（再試行しない）を返す。
+        """
+        if response is not None:
+            retry_after = self.retry_after(response)
+            if retry_after is not None:
+                return retry_after if retry_after <= self.retry_after_max else None
+
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def record(self, url, elapsed, retried):
+        """ホスト別のリクエスト数・レイテンシ・再試行回数を記録"""
+        host = urlsplit(url).netloc
+        with self.lock:
+            stat = self.stats.setdefault(host, {'count': 0, 'total': 0.0, 'min': None, 'max': 0.0, 'retries': 0})
+            stat['count'] += 1
+            stat['total'] += elapsed
+            stat['min'] = elapsed if stat['min'] is None else min(stat['min'], elapsed)
+            stat['max'] = max(stat['max'], elapsed)
+            stat['retries'] += retried
+        if retried:
+            get_run_report().count('http_retries')
+
+    def request(self, method, url, **kwargs):
+        """再試行付きでリクエストを送信（timeout未指定時は接続/読み込みの既定値を使う）"""
+        kwargs.setdefault('timeout', (self.connect_timeout, self.read_timeout))
+        method = method.upper()
+        attempt = 0
+
+        while True:
+            start = time.monotonic()
+            try:
+                response = self.send(method, url, kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.record(url, time.monotonic() - start, attempt > 0)
+                # POSTは接続確立前の失敗に限って再送する（二重投稿を防ぐ）
+                retryable = method in IDEMPOTENT_METHODS or isinstance(e, requests.ConnectTimeout)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                print(f"HTTP再試行 ({attempt + 1}/{self.max_retries}) {url}: {e} - {delay:.1f}秒後")
+            else:
+                self.record(url, time.monotonic() - start, attempt > 0)
+                retryable = response.status_code == 429 or (
+                    response.status_code >= 500 and method in IDEMPOTENT_METHODS
+                )
+                if not retryable or attempt >= self.max_retries:
+                    return response
+                delay = self.backoff_delay(attempt, response)
+                if delay is None:
+                    print(f"HTTP再試行を中止 {url}: Retry-After {response.headers.get('Retry-After')} が長すぎます")
+                    return response
+                print(f"HTTP再試行 ({attempt + 1}/{self.max_retries}) {url}: ステータス {response.status_code} - {delay:.1f}秒後")
+                response.close()
+
+            time.sleep(delay)
+            attempt += 1
+
+    def send(self, method, url, kwargs):
+        """1回分の送信（interceptorが設定されていればそちらに任せる）"""
+        if self.interceptor is not None:
+            return self.interceptor(self.session, method, url, kwargs)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def latency_stats(self):
+        """ホスト別のレイテンシ統計を取得"""
+        with self.lock:
+            return {
+                host: {
+                    'count': stat['count'],
+                    'avg': stat['total'] / stat['count'],
+                    'min': stat['min'],
+                    'max': stat['max'],
+                    'retries': stat['retries'],
+                }
+                for host, stat in self.stats.items()
+            }
+
+    def report(self):
+        """ホスト別のレイテンシ統計を出力"""
+        for host, stat in sorted(self.latency_stats().items()):
+            print(
+                f"HTTP {host}: {stat['count']}件 平均 {stat['avg'] * 1000:.0f}ms "
+                f"(最小 {stat['min'] * 1000:.0f}ms / 最大 {stat['max'] * 1000:.0f}ms) 再試行 {stat['retries']}件"
+            )
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """プロセス共通のHTTPクライアントを取得（初回呼び出し時に作成）"""
+    global _default_client
+
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+インタラクション用の記事ストア
+日次バッチで作成した詳細要約と圧縮済みの記事コンテキストを記事URLをキーに保存し、
+ボタン処理（api/slack-interactions.js）がGeminiを呼ばずに応答できるようにする
+"""
+
+import os
+import json
+import time
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'interaction_store.json')
+STORE_VERSION = 1
+
+# 公開用のストアに残す項目（ボタン処理が使うもの）。記事本文の抜粋（context）や一覧用の要約は公開しない
+PUBLIC_FIELDS = ('title', 'description', 'detail_summary')
+
+
+class JsonFileBackend:
+    """1つのJSONファイルに全エントリを保存するバックエンド
+
+    public_path（INTERACTION_STORE_PUBLIC_PATH）を指定すると、PUBLIC_FIELDS だけを残した公開用のファイルも書き出す。
+    """
+
+    def __init__(self, path=None, public_path=None):
+        self.path = path or os.getenv('INTERACTION_STORE_PATH', DEFAULT_STORE_PATH)
+        self.public_path = public_path or os.getenv('INTERACTION_STORE_PUBLIC_PATH')
+
+    def load(self):
+        """保存済みのエントリを読み込む（ファイルがない・壊れている場合は空）"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            print(f"インタラクションストアの読み込みエラー: {e}")
+            return {}
+
+        if data.get('version') != STORE_VERSION:
+            return {}
+        return data.get('articles', {})
+
+    def save(self, articles):
+        """全エントリを書き出す（公開用のファイルには PUBLIC_FIELDS だけを書き出す）"""
+        self.write(self.path, articles)
+        if self.public_path:
+            self.write(self.public_path, {
+                link: {field: entry[field] for field in PUBLIC_FIELDS if field in entry}
+                for link, entry in articles.items()
+            })
+
+    def write(self, path, articles):
+        """読み込み側が途中のファイルを見ないよう一時ファイルから置き換える"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        data = {'version': STORE_VERSION, 'generated_at': time.time(), 'articles': articles}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+
+class InteractionStore:
+    """記事URLをキーにしたKV形式のストア（保持期間を過ぎたエントリは保存時に削除）"""
+
+    def __init__(self, backend=None, retention_days=None):
+        self.backend = backend or JsonFileBackend()
+        if retention_days is None:
+            retention_days = float(os.getenv('INTERACTION_STORE_RETENTION_DAYS', '7'))
+        self.retention = retention_days * 24 * 60 * 60
+        self.articles = self.backend.load()
+
+    def get(self, link):
+        return self.articles.get(link)
+
+    def put(self, link, title, description='', summary='', detail_summary=None, context=''):
+        """記事1件分のエントリを登録（詳細要約がなければボタン押下時に生成される）"""
+        entry = {
+            'title': title,
+            'description': description,
+            'summary': summary,
+            'context': context,
+            'updated_at': time.time(),
+        }
+        if detail_summary:
+            entry['detail_summary'] = detail_summary
+        self.articles[link] = entry
+
+    def save(self):
+        cutoff = time.time() - self.retention
+        self.articles = {
+            link: entry for link, entry in self.articles.items()
+            if entry.get('updated_at', 0) >= cutoff
+        }
+        self.backend.save(self.articles)
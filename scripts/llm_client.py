@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Geminiクライアントの提供
+google.generativeaiは初めて使われる時点でimportし、APIキーの設定は1回だけ行う。
+GenerativeModelはモデル名と生成設定ごとに1つ作成して使い回す
+"""
+
+import os
+import json
+import random
+import threading
+from run_report import get_run_report
+from rate_limiter import estimate_tokens, get_rate_limiter, get_usage_ledger
+
+_lock = threading.Lock()
+_genai = None
+_models = {}
+# ドライラン時にGenerativeModelの代わりを作る関数 (model_name, generation_config) -> model
+_model_factory = None
+
+
+def get_genai():
+    """設定済みのgoogle.generativeaiモジュールを取得（初回のみimportと設定を行う）"""
+    global _genai
+
+    with _lock:
+        if _genai is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+            _genai = genai
+        return _genai
+
+
+def get_model(model_name, generation_config=None):
+    """モデル名と生成設定ごとに共有のGenerativeModelを取得"""
+    key = (model_name, json.dumps(generation_config, sort_keys=True) if generation_config else None)
+
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    # ロックの外で作成する（差し替え後の作成処理がget_genaiを呼ぶ場合があるため）
+    if _model_factory is not None:
+        model = _model_factory(model_name, generation_config)
+    else:
+        model = get_genai().GenerativeModel(model_name, generation_config=generation_config)
+
+    with _lock:
+        return _models.setdefault(key, model)
+
+
+def is_rate_limit_error(error):
+    """429/ResourceExhausted（クォータ超過）かどうかを判定"""
+    try:
+        from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+        if isinstance(error, (ResourceExhausted, TooManyRequests)):
+            return True
+    except ImportError:
+        pass
+
+    message = str(error)
+    return '429' in message or 'ResourceExhausted' in message or 'quota' in message.lower()
+
+
+def acquire_request(prompt):
+    """promptの1リクエスト分の枠が空くまで待ち、待った秒数を返す（失敗はせず、空くまで待ち続ける）"""
+    return get_rate_limiter().acquire(estimate_tokens(prompt))
+
+
+def generate_content(model_name, prompt, generation_config=None, max_retries=None, queued=None, cancel=None):
+    """RPM/TPMに合わせて待機しつつ生成し、429は待機して再試行する
+
+    queuedを渡した場合は、呼び出し元が acquire_request で最初の1回分の枠を確保済み（待った秒数がqueued）として扱う。
+    cancel（threading.Event）がセットされたら、それ以降は再試行しない（呼び出し元が結果を待たなくなった場合）。
+    利用量は日ごとの台帳に記録する。再試行しきれなかった場合は最後の例外を送出する。
+    """
+    if max_retries is None:
+        max_retries = int(os.getenv('GEMINI_MAX_RETRIES', '3'))
+    limiter = get_rate_limiter()
+    input_tokens = estimate_tokens(prompt)
+    model = get_model(model_name, generation_config)
+    waited = queued or 0.0
+    attempt = 0
+    error = None
+
+    while True:
+        if attempt or queued is None:
+            waited += limiter.acquire(input_tokens)
+        if error is not None and cancel is not None and cancel.is_set():
+            # 再試行の枠を待つ間に呼び出し元が結果を待たなくなった
+            raise error
+        try:
+            with get_run_report().span('gemini_generate', model=model_name, attempt=attempt):
+                response = model.generate_content(prompt)
+            break
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt >= max_retries or (cancel is not None and cancel.is_set()):
+                raise
+            # 他スレッドの呼び出しも含めて止めるため、待機はリミッター側で行う
+            delay = random.uniform(0.5, 1.0) * min(60, 2 ** (attempt + 2))
+            print(f"Geminiレート制限 ({attempt + 1}/{max_retries}): {delay:.1f}秒後に再試行")
+            limiter.penalize(delay)
+            attempt += 1
+            error = e
+
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None and getattr(usage, 'prompt_token_count', None):
+        input_tokens = usage.prompt_token_count
+        output_tokens = usage.candidates_token_count or 0
+    else:
+        output_tokens = estimate_tokens(getattr(response, 'text', ''))
+
+    get_usage_ledger().record(model_name, input_tokens, output_tokens, retries=attempt, wait=waited)
+    report = get_run_report()
+    report.count('gemini_requests')
+    report.count('gemini_input_tokens', input_tokens)
+    report.count('gemini_output_tokens', output_tokens)
+    report.count('gemini_retries', attempt)
+    report.count('gemini_rate_limit_wait_seconds', round(waited, 3))
+    return response
+
+
+def set_model_factory(factory):
+    """モデルの作成方法を差し替える（ドライラン用、Noneで元に戻す）"""
+    global _model_factory
+
+    with _lock:
+        _model_factory = factory
+        _models.clear()
+
+
+def reset():
+    """保持しているモジュールとモデルを破棄（APIキーを変更した場合など）"""
+    global _genai
+
+    with _lock:
+        _genai = None
+        _models.clear()
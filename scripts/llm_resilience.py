@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Gemini呼び出しの遅延・障害対策
+モデルを段（ティア）として並べ、上の段から順に呼び出す。各段では
+- 応答がその段の遅延の上位パーセンタイル（既定p95）を超えたら同じリクエストをもう1本送り、先に返った方を使う（ヘッジ）
+- GEMINI_TIER_TIMEOUT 秒以内に応答がなければ、失敗として次の段へ進む
+- 連続して失敗した段はサーキットブレーカーで一定時間呼び出さない
+レートリミッターの枠の空き待ち（429後の再試行の待ちを含む）は制限時間・遅延の記録に含めない。
+429で再試行しきれなかった呼び出しは次の段へ進むが、サーキットブレーカーの失敗には数えない。
+段ごとの遅延はヒストグラムに記録し、実行レポートに出力する
+"""
+
+import os
+import math
+import time
+import queue
+import bisect
+import threading
+from collections import deque
+from llm_client import generate_content, is_rate_limit_error
+from rate_limiter import estimate_tokens, get_rate_limiter
+from run_report import get_run_report
+
+# 遅延ヒストグラムのバケットの上限（秒）
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, math.inf)
+
+
+class LatencyHistogram:
+    """成功した呼び出しの遅延を固定バケットで数え、直近の値からパーセンタイルを求める"""
+
+    def __init__(self, window=200):
+        self.lock = threading.Lock()
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.recent = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds):
+        with self.lock:
+            self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            self.recent.append(seconds)
+            self.count += 1
+            self.total += seconds
+
+    def percentile(self, q, min_samples=1):
+        """直近の遅延のqパーセンタイル（0〜1、件数がmin_samples未満ならNone）"""
+        with self.lock:
+            samples = sorted(self.recent)
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def snapshot(self):
+        with self.lock:
+            buckets = {('+Inf' if bound == math.inf else f"{bound:g}"): count
+                       for bound, count in zip(LATENCY_BUCKETS, self.buckets)}
+            count, total = self.count, self.total
+        return {
+            'count': count,
+            'avg': total / count if count else None,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'buckets': buckets,
+        }
+
+
+class CircuitBreaker:
+    """連続 failure_threshold 回失敗したら開き、cooldown 秒後に1回だけ試しに通す（成功すれば閉じる）"""
+
+    def __init__(self, name, failure_threshold=None, cooldown=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or int(os.getenv('GEMINI_CIRCUIT_FAILURES', '5'))
+        self.cooldown = cooldown if cooldown is not None else float(os.getenv('GEMINI_CIRCUIT_COOLDOWN', '60'))
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half_open' if self.trial or time.monotonic() >= self.opened_at + self.cooldown else 'open'
+
+    def allow(self):
+        """呼び出してよいか（開いている間はFalse、冷却後は試しの1回だけTrue）"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial or time.monotonic() < self.opened_at + self.cooldown:
+                return False
+            self.trial = True
+            return True
+
+    def success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                print(f"サーキットブレーカーを閉じました: {self.name}")
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                print(f"サーキットブレーカーを開きました: {self.name} ({self.cooldown:g}秒間呼び出しません)")
+                self.opened_at = time.monotonic()
+                self.opened += 1
+            self.trial = False
+
+
+class ModelTier:
+    """1段分のモデルと、その遅延ヒストグラム・サーキットブレーカー・件数"""
+
+    def __init__(self, name):
+        self.name = name
+        self.histogram = LatencyHistogram()
+        self.breaker = CircuitBreaker(name)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.skipped = 0
+        self.rate_limited = 0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self):
+        with self.lock:
+            counts = {'calls': self.calls, 'failures': self.failures, 'hedges': self.hedges,
+                      'hedge_wins': self.hedge_wins, 'skipped': self.skipped, 'rate_limited': self.rate_limited}
+        return {**counts, 'circuit': self.breaker.state, 'circuit_opened': self.breaker.opened,
+                'latency': self.histogram.snapshot()}
+
+
+class TieredGenerator:
+    """呼び出し元のモデル → GEMINI_FALLBACK_MODELS の順に、ヘッジ付きで生成を試みる"""
+
+    def __init__(self, fallback_models=None, generate_fn=None, limiter=None):
+        if fallback_models is None:
+            fallback_models = [
+                name.strip() for name in os.getenv('GEMINI_FALLBACK_MODELS', 'gemini-2.5-flash-lite').split(',')
+                if name.strip()
+            ]
+        self.fallback_models = fallback_models
+        # generate_fn(model_name, prompt, generation_config, queued=待った秒数, cancel=Event) は枠を確保済みとして呼ばれる
+        self.generate_fn = generate_fn or generate_content
+        self.limiter = limiter or get_rate_limiter()
+        self.hedge = os.getenv('GEMINI_HEDGE', 'true').lower() == 'true'
+        self.hedge_percentile = float(os.getenv('GEMINI_HEDGE_PERCENTILE', '0.95'))
+        self.hedge_min_samples = int(os.getenv('GEMINI_HEDGE_MIN_SAMPLES', '20'))
+        self.hedge_min_delay = float(os.getenv('GEMINI_HEDGE_MIN_DELAY', '1'))
+        self.timeout = float(os.getenv('GEMINI_TIER_TIMEOUT', '20'))
+        self.lock = threading.Lock()
+        self.tiers = {}
+
+    def tier(self, name):
+        with self.lock:
+            if name not in self.tiers:
+                self.tiers[name] = ModelTier(name)
+            return self.tiers[name]
+
+    def hedge_delay(self, tier):
+        """ヘッジを送るまでの待ち時間（遅延の記録が足りない間はヘッジしない）"""
+        if not self.hedge:
+            return None
+        delay = tier.histogram.percentile(self.hedge_percentile, self.hedge_min_samples)
+        return max(delay, self.hedge_min_delay) if delay is not None else None
+
+    def generate(self, prompt, model_name, generation_config=None):
+        """生成できた段の (テキスト, モデル名) を返す（すべての段が失敗したら (None, None)）"""
+        for name in [model_name] + [name for name in self.fallback_models if name != model_name]:
+            tier = self.tier(name)
+            if not tier.breaker.allow():
+                tier.add(skipped=1)
+                continue
+
+            try:
+                text = self.call(tier, prompt, generation_config)
+            except Exception as e:
+                print(f"Gemini呼び出し失敗 ({name}): {e}")
+                if is_rate_limit_error(e):
+                    # クォータ超過はモデルの障害ではないので、遮断せずに次の段へ進む
+                    tier.add(rate_limited=1)
+                    continue
+                tier.add(failures=1)
+                tier.breaker.failure()
+                continue
+
+            tier.breaker.success()
+            if name != model_name:
+                get_run_report().count('gemini_fallback_calls')
+            return text, name
+
+        return None, None
+
+    def call(self, tier, prompt, generation_config):
+        """1段分の呼び出し（遅ければヘッジを1本追加し、先に成功した応答を返す）
+
+        レートリミッターの枠は制限時間を数え始める前に確保する（空くまで待つだけで失敗にはしない）。
+        送信スレッドが429後の再試行で枠の空きを待った時間も、このスレッドの待ちとして制限時間から除く。
+        ヘッジは枠がすぐに空いている場合だけ送る。見切った・不要になった呼び出しはそれ以上再試行しない。
+        """
+        tokens = estimate_tokens(prompt)
+        queued = self.limiter.acquire(tokens)
+        caller = threading.get_ident()
+        results = queue.Queue()
+        cancel = threading.Event()
+
+        def attempt(hedged, queued):
+            ident = threading.get_ident()
+            self.limiter.attach(caller)
+            # 遅延はモデルの往復時間だけを記録する（再試行の枠の空き待ちを含めない）
+            started = time.perf_counter()
+            try:
+                response = self.generate_fn(tier.name, prompt, generation_config, queued=queued, cancel=cancel)
+                text = (response.text or '').strip()
+                if not text:
+                    raise ValueError("空の応答")
+                tier.histogram.record(time.perf_counter() - started - self.limiter.queued_seconds(ident))
+                results.put((True, text, hedged))
+            except Exception as e:
+                results.put((False, e, hedged))
+            finally:
+                self.limiter.forget(ident)
+
+        def start(hedged, queued):
+            # 応答しない呼び出しでスレッドを塞がないよう、デーモンスレッドで送る
+            threading.Thread(target=attempt, args=(hedged, queued), daemon=True).start()
+
+        tier.add(calls=1)
+        started = time.monotonic()
+        waited = self.limiter.queued_seconds(caller)
+        delay = self.hedge_delay(tier)
+        start(False, queued)
+        outstanding = 1
+        hedged = delay is None
+        error = None
+
+        def elapsed():
+            # 送信スレッドが再試行の枠の空きを待った時間は経過時間に数えない
+            return time.monotonic() - started - (self.limiter.queued_seconds(caller) - waited)
+
+        try:
+            while outstanding:
+                remaining = self.timeout - elapsed()
+                wait = remaining if hedged else min(delay - elapsed(), remaining)
+                try:
+                    ok, value, from_hedge = results.get(timeout=max(0.0, wait))
+                except queue.Empty:
+                    if elapsed() >= self.timeout:
+                        raise TimeoutError(f"{self.timeout:.0f}秒以内に応答がありません")
+                    if hedged or elapsed() < delay:
+                        # 待っている間に再試行の枠の空き待ちがあり、制限時間・ヘッジの時刻が延びた
+                        continue
+                    # 遅延が上位パーセンタイルを超えたので同じリクエストをもう1本送る（枠が空いていなければ送らない）
+                    hedged = True
+                    if not self.limiter.try_acquire(tokens):
+                        get_run_report().count('gemini_hedges_skipped')
+                        continue
+                    outstanding += 1
+                    tier.add(hedges=1)
+                    get_run_report().count('gemini_hedged_requests')
+                    start(True, 0.0)
+                    continue
+
+                outstanding -= 1
+                if ok:
+                    if from_hedge:
+                        tier.add(hedge_wins=1)
+                    return value
+                error = value
+
+            raise error
+        finally:
+            cancel.set()
+
+    def snapshot(self):
+        """段ごとの呼び出し件数・遅延・サーキットブレーカーの状態"""
+        with self.lock:
+            tiers = list(self.tiers.values())
+        return {tier.name: tier.snapshot() for tier in tiers}
+
+    def report(self):
+        """段ごとの呼び出し件数・遅延・サーキットブレーカーの状態を出力し、実行レポートに残す"""
+        snapshots = self.snapshot()
+        if not snapshots:
+            return
+
+        for name, snapshot in snapshots.items():
+            latency = snapshot['latency']
+            percentiles = " / ".join(
+                f"{label} {latency[label]:.2f}秒" for label in ('p50', 'p95', 'p99') if latency[label] is not None
+            )
+            print(f"Gemini {name}: {snapshot['calls']}回 / 失敗 {snapshot['failures']}回 / "
+                  f"ヘッジ {snapshot['hedges']}回 (採用 {snapshot['hedge_wins']}回) / "
+                  f"遮断中スキップ {snapshot['skipped']}回 / 429 {snapshot['rate_limited']}回 / {snapshot['circuit']}"
+                  + (f" / {percentiles}" if percentiles else ""))
+        get_run_report().set('gemini_tiers', snapshots)
+
+
+_default_generator = None
+_default_generator_lock = threading.Lock()
+
+
+def get_tiered_generator():
+    """プロセス共通のTieredGeneratorを取得（初回呼び出し時に作成）"""
+    global _default_generator
+
+    with _default_generator_lock:
+        if _default_generator is None:
+            _default_generator = TieredGenerator()
+        return _default_generator
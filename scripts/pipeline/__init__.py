@@ -0,0 +1,15 @@
+"""
+記事要約パイプライン
+source → enrich → summarize → render → sink の各ステージをジェネレーターでつないだ共通処理。
+scripts/daily_post.py（Bot API）と scripts/tech_news_bot.py（Incoming Webhook）はシンクだけが異なる
+"""
+
+from .sinks import SUMMARY_PENDING, BotApiSink, ProgressiveSink, WebhookSink, digest_entry
+from .stages import (
+    enrich_stage, interaction_store_stage, ordered_map, run_pipeline, source_stage, summarize_articles,
+    summarize_stage,
+)
+from .summarize import (
+    SUMMARY_FALLBACK, SUMMARY_MODEL, extractive_summary, generate_detail_summary, is_fallback_summary,
+    summarize_with_gemini,
+)
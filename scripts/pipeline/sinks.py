@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+パイプラインのシンク（投稿先）
+render で流れてきた記事を投稿先の形式に1件ずつ描画し、publish でまとめて投稿する。
+Incoming Webhook（テキスト）と Bot API（Block Kit・Interactive Components付き）、
+Bot APIで骨組みを先に投稿して要約を差し込んでいく逐次投稿の3種類
+"""
+
+import os
+import threading
+from datetime import datetime
+from block_kit import context_block
+from run_report import get_run_report
+from .slack import (
+    build_digest_messages, is_fan_out, load_channel_configs, post_blocks, post_interactive_message,
+    render_article_blocks, render_webhook_article, send_webhook_message, update_blocks, validate_digest_messages,
+)
+
+# 逐次投稿で要約ができるまで表示する文言
+SUMMARY_PENDING = "⏳ 要約を生成中..."
+
+
+def digest_entry(article):
+    """投稿・アーカイブ用に記事から必要な項目だけを取り出す"""
+    return {
+        'title': article['title'],
+        'summary': article['summary'],
+        'link': article['link'],
+        'description': article.get('description', ''),
+        'related': article.get('related', []),
+    }
+
+
+class WebhookSink:
+    """Incoming Webhookにテキストで投稿するシンク"""
+
+    name = 'webhook'
+
+    def __init__(self, webhook_url=None):
+        self.webhook_url = webhook_url or os.getenv('SLACK_WEBHOOK_URL')
+        self.posted = []
+
+    def render(self, items):
+        for number, article in enumerate(items, 1):
+            entry = digest_entry(article)
+            yield entry, render_webhook_article(number, entry)
+
+    def publish(self, rendered):
+        if not self.webhook_url:
+            print("SLACK_WEBHOOK_URLが設定されていません")
+            return False
+
+        rendered = list(rendered)
+        if not rendered:
+            print("記事の取得に失敗しました")
+            return False
+
+        print("Slackに投稿中...")
+        today = datetime.now().strftime("%Y年%m月%d日")
+        success = send_webhook_message([text for _, text in rendered], self.webhook_url, today)
+        if success:
+            self.posted = [entry for entry, _ in rendered]
+        return success
+
+
+class BotApiSink:
+    """Slack Bot APIでInteractive Components付きのメッセージを投稿するシンク（複数チャンネル対応）"""
+
+    name = 'bot_api'
+
+    def __init__(self, heading=None):
+        self.heading = heading
+        self.posted = []
+
+    def render(self, items):
+        for number, article in enumerate(items, 1):
+            entry = digest_entry(article)
+            yield entry, render_article_blocks(number, entry)
+
+    def publish(self, rendered):
+        rendered = list(rendered)
+        if not rendered:
+            print("記事の取得に失敗しました")
+            return False
+
+        print("Slackに投稿中...")
+        articles_summary = [entry for entry, _ in rendered]
+        success = post_interactive_message(articles_summary, [blocks for _, blocks in rendered], self.heading)
+        if success:
+            self.posted = articles_summary
+        return success
+
+
+class ProgressiveSink:
+    """見出しと記事タイトル・リンクだけの骨組みを先に投稿し、要約ができた記事から chat.update で差し替えるシンク
+
+    skeleton_stage をソースの直後に、update を summarize_stage の on_summary に渡して使う。
+    更新は SLACK_UPDATE_INTERVAL 秒に1回までにまとめ、前回から変わったメッセージだけを送る。
+    複数チャンネルへの投稿・DEBUG_BLOCKS・骨組みの投稿に失敗した場合は、最後にまとめて通常どおり投稿する。
+    """
+
+    name = 'progressive'
+
+    def __init__(self, heading=None, interval=None):
+        self.heading = heading
+        self.interval = interval if interval is not None else float(os.getenv('SLACK_UPDATE_INTERVAL', '1'))
+        self.bot_token = os.getenv('SLACK_BOT_TOKEN')
+        self.today = datetime.now().strftime("%Y年%m月%d日")
+        self.condition = threading.Condition()
+        self.entries = []
+        self.positions = {}
+        self.messages = []
+        self.dirty = False
+        self.closed = False
+        self.updater = None
+        self.updates = 0
+        self.posted = []
+
+    def skeleton_stage(self, items):
+        """記事がそろった時点で骨組みを投稿し、記事はそのまま流す"""
+        items = list(items)
+        self.entries = [digest_entry({**article, 'summary': SUMMARY_PENDING}) for article in items]
+        self.positions = {entry['link']: position for position, entry in enumerate(self.entries)}
+
+        channels = load_channel_configs()
+        debug_mode = os.getenv('DEBUG_BLOCKS', 'false').lower() == 'true'
+        if items and self.bot_token and channels and not is_fan_out(channels) and not debug_mode:
+            print("骨組みを投稿中...")
+            if self.post_skeleton(channels[0]['channel']):
+                self.updater = threading.Thread(target=self.run_updater, daemon=True)
+                self.updater.start()
+
+        yield from items
+
+    def post_skeleton(self, channel):
+        messages = self.build(self.entries)
+        if not validate_digest_messages(messages):
+            return False
+
+        text = self.fallback_text(len(self.entries))
+        for number, message in enumerate(messages, 1):
+            thread_ts = self.messages[0]['ts'] if self.messages else None
+            result = post_blocks(message.blocks, self.bot_token, channel,
+                                 text if number == 1 else f"{text} ({number}/{len(messages)})",
+                                 thread_ts=thread_ts, size=message.size)
+            if not result.get('ok'):
+                break
+            self.messages.append({'channel': result.get('channel') or channel, 'ts': result.get('ts'),
+                                  'blocks': message.blocks})
+
+        if not self.messages:
+            return False
+        get_run_report().mark('time_to_first_post')
+        return True
+
+    def update(self, article, summary):
+        """要約ができた記事を骨組みに反映する（ワーカースレッドから呼ばれ、送信は更新スレッドに任せる）"""
+        with self.condition:
+            position = self.positions.get(article['link'])
+            if position is None:
+                return
+            self.entries[position]['summary'] = summary
+            self.dirty = True
+            self.condition.notify()
+
+    def run_updater(self):
+        """変更があればまとめて送り、次の送信まで interval 秒空ける"""
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.dirty or self.closed)
+                if self.closed:
+                    return
+                self.dirty = False
+                entries = [dict(entry) for entry in self.entries]
+
+            self.flush(entries)
+
+            with self.condition:
+                self.condition.wait_for(lambda: self.closed, timeout=self.interval)
+
+    def build(self, entries):
+        groups = [render_article_blocks(number, entry, verbose=False) for number, entry in enumerate(entries, 1)]
+        return build_digest_messages(entries, self.today, groups, self.heading)
+
+    def fallback_text(self, count):
+        return self.heading or f"{self.today} 技術記事TOP{count}"
+
+    def flush(self, entries):
+        """entriesで組み直したメッセージのうち、投稿済みの内容から変わったものだけを送る"""
+        messages = self.build(entries)
+        if not validate_digest_messages(messages):
+            return False
+
+        text = self.fallback_text(len(entries))
+        first = self.messages[0]
+        success = True
+        for number, message in enumerate(messages, 1):
+            if number <= len(self.messages):
+                posted = self.messages[number - 1]
+                if posted['blocks'] == message.blocks:
+                    continue
+                result = update_blocks(message.blocks, self.bot_token, posted['channel'], posted['ts'],
+                                       text if number == 1 else f"{text} ({number}/{len(messages)})", message.size)
+                if result.get('ok'):
+                    posted['blocks'] = message.blocks
+                    self.updates += 1
+            else:
+                # 要約が入ってメッセージに収まらなくなった分はスレッドに続ける
+                result = post_blocks(message.blocks, self.bot_token, first['channel'],
+                                     f"{text} ({number}/{len(messages)})", thread_ts=first['ts'], size=message.size)
+                if result.get('ok'):
+                    self.messages.append({'channel': result.get('channel') or first['channel'],
+                                          'ts': result.get('ts'), 'blocks': message.blocks})
+            success = success and bool(result.get('ok'))
+
+        # 前のメッセージに収まるようになった返信は中身を差し替える
+        for posted in self.messages[len(messages):]:
+            blocks = [context_block(["（このメッセージの内容は前のメッセージに移動しました）"])]
+            if posted['blocks'] != blocks:
+                result = update_blocks(blocks, self.bot_token, posted['channel'], posted['ts'], text)
+                if result.get('ok'):
+                    posted['blocks'] = blocks
+                    self.updates += 1
+
+        return success
+
+    def close(self):
+        """更新スレッドを止める（送信中の更新は完了を待つ）"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.updater is not None:
+            self.updater.join()
+
+    def render(self, items):
+        for article in items:
+            yield digest_entry(article)
+
+    def publish(self, rendered):
+        rendered = list(rendered)
+        self.close()
+        if not rendered:
+            print("記事の取得に失敗しました")
+            return False
+
+        if self.messages:
+            print("要約を反映中...")
+            success = self.flush(rendered)
+            print(f"逐次投稿: 更新 {self.updates}回")
+        else:
+            print("Slackに投稿中...")
+            success = post_interactive_message(rendered, heading=self.heading)
+
+        get_run_report().set('slack_updates', self.updates)
+        if success:
+            self.posted = rendered
+        return success
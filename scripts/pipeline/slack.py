@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Slackへの投稿
+Bot API向けのBlock Kitメッセージの構築・検証・投稿（複数チャンネルへの並列投稿を含む）と、
+Incoming Webhook向けのテキストメッセージの構築・投稿を提供する
+"""
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from block_kit import (
+    MAX_SECTION_TEXT, BlockKitBuilder, actions_block, button_element, context_block, divider_block,
+    header_block, section_block, truncate_text, validate_blocks,
+)
+from http_client import get_http_client
+from rate_limiter import RateLimiter
+from run_report import get_run_report
+
+# Slack Web APIのベースURL（ローカルのスタブに向ける場合に変更する）
+SLACK_API_URL = os.getenv('SLACK_API_URL', 'https://slack.com/api')
+
+
+def post_interactive_message(articles_summary, groups=None, heading=None):
+    """Slack Bot APIを使ってInteractive Componentsつきメッセージを投稿（デバッグ強化版）"""
+    bot_token = os.getenv('SLACK_BOT_TOKEN')
+
+    if not bot_token:
+        print("SLACK_BOT_TOKENが設定されていません")
+        return False
+
+    # 今日の日付
+    today = datetime.now().strftime("%Y年%m月%d日")
+
+    # 複数チャンネルが設定されていれば、同じ要約を各チャンネルに並列投稿
+    channels = load_channel_configs()
+    if is_fan_out(channels):
+        results = fan_out_digest(articles_summary, channels, today, heading=heading)
+        return all(result['ok'] for result in results)
+
+    # チャンネル指定（環境変数から取得、デフォルトは#general）
+    channel = channels[0]['channel'] if channels else os.getenv('SLACK_CHANNEL', '#general')
+
+    print(f"デバッグ情報:")
+    print(f"  チャンネル: {channel}")
+    print(f"  記事数: {len(articles_summary)}")
+
+    # デバッグモード環境変数チェック
+    debug_mode = os.getenv('DEBUG_BLOCKS', 'false').lower() == 'true'
+
+    if debug_mode:
+        # Slackには投稿せず、構築したブロックをローカルで検証して内容を表示する
+        print("🔍 デバッグモード: ブロックのローカル検証のみ実行")
+        messages = build_digest_messages(articles_summary, today, groups, heading)
+        for number, message in enumerate(messages, 1):
+            print(f"メッセージ{number}: {len(message.blocks)}ブロック / {message.size} バイト")
+            print(json.dumps(message.blocks, ensure_ascii=False, indent=2))
+        return validate_digest_messages(messages)
+    else:
+        print("⚠️  通常モード: 全ブロック一括投稿（エラー詳細出力強化）")
+        return post_full_message_with_debug(articles_summary, bot_token, channel, today, groups, heading)
+
+
+def post_full_message_with_debug(articles_summary, bot_token, channel, today, groups=None, heading=None):
+    """全ブロック一括投稿（エラー詳細出力強化版）"""
+    result = post_digest(articles_summary, bot_token, channel, today, groups, heading)
+    return bool(result.get('ok'))
+
+
+def render_article_blocks(number, article, verbose=True):
+    """記事1件分のブロック（本文セクションとボタン）を構築（verbose=False で処理内容を表示しない）"""
+    if verbose:
+        print(f"記事{number}処理中:")
+        print(f"  タイトル: {article['title'][:50]}...")
+        print(f"  要約長: {len(article['summary'])} 文字")
+        print(f"  URL: {article['link']}")
+
+    # 同じ話題の記事（類似記事としてまとめたもの）
+    related_text = ""
+    related = article.get('related', [])
+    if related:
+        related_text = "\n📎 関連: " + " / ".join(
+            f"<{item['link']}|{truncate_text(item['title'], 40)}>" for item in related
+        )
+
+    # 文字数が上限を超える場合は要約部分だけを削り、タイトルとリンクは残す
+    summary = article['summary']
+    article_text = f"*{number}. {article['title']}*\n📝 {summary}\n🔗 <{article['link']}|記事を読む>{related_text}"
+    if len(article_text) > MAX_SECTION_TEXT:
+        if verbose:
+            print(f"  ⚠️  記事{number}: テキスト長すぎ ({len(article_text)} > {MAX_SECTION_TEXT})")
+        summary = truncate_text(summary, max(1, MAX_SECTION_TEXT - (len(article_text) - len(summary))))
+        article_text = f"*{number}. {article['title']}*\n📝 {summary}\n🔗 <{article['link']}|記事を読む>{related_text}"
+
+    detail_button = button_element("📚 詳細要約", "detail_summary", f"detail:{article['link']}", style="primary")
+    question_button = button_element("❓ 質問する", "ask_question", f"question:{article['link']}")
+
+    # URLが長すぎてvalueに入らないボタンは、ボタン処理が記事を特定できないので付けない
+    blocks = [section_block(article_text, accessory=detail_button if 'value' in detail_button else None)]
+    if 'value' in question_button:
+        blocks.append(actions_block([question_button]))
+    return blocks
+
+
+def build_digest_messages(articles_summary, today, groups=None, heading=None):
+    """記事要約リストからBlock Kit形式のメッセージを構築
+
+    ブロック数・サイズの上限を超える場合は記事の途中で切らずに次のメッセージへ送り、
+    BlockKitMessage（blocks と size）のリストを返す。2件目以降はスレッドへの返信として投稿する。
+    groups には描画ステージで構築済みの記事ごとのブロックを渡せる（省略時はここで構築）。
+    heading を省略した場合の見出しは「{today} 技術記事TOP{件数}」。
+    """
+
+    build_started = time.perf_counter()
+    if groups is None:
+        groups = [render_article_blocks(i, article) for i, article in enumerate(articles_summary, 1)]
+
+    builder = BlockKitBuilder()
+    builder.add(header_block(heading or f"🔥 {today} 技術記事TOP{len(articles_summary)} 🔥"))
+    builder.set_footer([context_block(["💪 良い一日を！ | Tech News Bot v2.0"])])
+
+    # 記事の本文とボタンは同じメッセージに収め、同じメッセージ内の記事の間だけ区切り線を入れる
+    for group in groups:
+        builder.add_group(group, separator=divider_block())
+
+    messages = builder.build()
+    total_blocks = sum(len(message.blocks) for message in messages)
+    total_bytes = sum(message.size for message in messages)
+    print(f"構築完了: {len(messages)}メッセージ / 総ブロック数 {total_blocks} / 総JSONサイズ {total_bytes} バイト")
+    get_run_report().record('build_blocks', time.perf_counter() - build_started,
+                            blocks=total_blocks, bytes=total_bytes, messages=len(messages))
+
+    return messages
+
+
+def validate_digest_messages(messages):
+    """送信前に全メッセージをローカルで検証し、問題がなければTrue"""
+    valid = True
+    for number, message in enumerate(messages, 1):
+        for error in validate_blocks(message.blocks):
+            print(f"❌ メッセージ{number}: {error}")
+            valid = False
+    return valid
+
+
+def post_digest(articles_summary, bot_token, channel, today, groups=None, heading=None, limiter=None):
+    """ダイジェストを投稿し、最初のメッセージのレスポンスを返す
+
+    1メッセージに収まらない分は最初のメッセージへのスレッド返信として続けて投稿する。
+    limiter を渡すと、スレッド返信も含めて1通ごとに投稿枠を待つ。
+    """
+    messages = build_digest_messages(articles_summary, today, groups, heading)
+    if not validate_digest_messages(messages):
+        return {'ok': False, 'error': 'invalid_blocks'}
+
+    text = heading or f"{today} 技術記事TOP{len(articles_summary)}"
+    if limiter:
+        limiter.acquire(0)
+    first = post_blocks(messages[0].blocks, bot_token, channel, text, size=messages[0].size)
+    if not first.get('ok'):
+        return first
+    get_run_report().mark('time_to_first_post')
+
+    for number, message in enumerate(messages[1:], 2):
+        if limiter:
+            limiter.acquire(0)
+        reply = post_blocks(message.blocks, bot_token, channel, f"{text} ({number}/{len(messages)})",
+                            thread_ts=first.get('ts'), size=message.size)
+        if not reply.get('ok'):
+            return reply
+
+    return first
+
+
+def post_blocks(blocks, bot_token, channel, text, thread_ts=None, size=None):
+    """ブロックをchat.postMessageで投稿し、Slack APIのレスポンスを返す（例外時は ok=False）"""
+
+    # Slack Bot APIに投稿
+    url = f"{SLACK_API_URL}/chat.postMessage"
+    headers = {
+        "Authorization": f"Bearer {bot_token}",
+        "Content-Type": "application/json"
+    }
+
+    payload = {
+        "channel": channel,
+        "blocks": blocks,
+        "text": text  # fallback text
+    }
+    if thread_ts:
+        payload["thread_ts"] = thread_ts
+
+    try:
+        with get_run_report().span('slack_post', channel=channel, bytes=size, thread=bool(thread_ts)):
+            response = get_http_client().post(url, headers=headers, json=payload)
+        response.raise_for_status()
+
+        result = response.json()
+        print(f"Slack APIレスポンス: {json.dumps(result, ensure_ascii=False, indent=2)}")
+
+        if result.get('ok'):
+            print(f"✅ Slack投稿成功 ({channel})")
+        else:
+            print(f"❌ Slack API エラー ({channel}): {result.get('error')}")
+
+            # 詳細エラー情報
+            if 'response_metadata' in result:
+                print(f"レスポンスメタデータ: {result['response_metadata']}")
+
+        return result
+
+    except Exception as e:
+        print(f"❌ Slack投稿エラー ({channel}): {e}")
+        import traceback
+        traceback.print_exc()
+        return {'ok': False, 'error': str(e)}
+
+
+def update_blocks(blocks, bot_token, channel, ts, text, size=None):
+    """投稿済みメッセージのブロックをchat.updateで置き換え、Slack APIのレスポンスを返す（例外時は ok=False）
+
+    channel には chat.postMessage のレスポンスに含まれるチャンネルIDを渡す。
+    """
+    url = f"{SLACK_API_URL}/chat.update"
+    headers = {
+        "Authorization": f"Bearer {bot_token}",
+        "Content-Type": "application/json"
+    }
+    payload = {"channel": channel, "ts": ts, "blocks": blocks, "text": text}
+
+    try:
+        with get_run_report().span('slack_update', channel=channel, bytes=size):
+            response = get_http_client().post(url, headers=headers, json=payload)
+        response.raise_for_status()
+
+        result = response.json()
+        if not result.get('ok'):
+            print(f"❌ Slack更新エラー ({channel}): {result.get('error')}")
+        return result
+
+    except Exception as e:
+        print(f"❌ Slack更新エラー ({channel}): {e}")
+        return {'ok': False, 'error': str(e)}
+
+
+def load_channel_configs():
+    """投稿先チャンネルの設定を読み込む
+
+    SLACK_CHANNELS_FILE（JSON）があれば優先し、なければ SLACK_CHANNELS（カンマ区切り）、
+    SLACK_CHANNEL の順に使う。JSONの各要素は次の形式:
+    {"channel": "#dev", "topics": ["Rust", "Go"], "count": 3, "token_env": "SLACK_BOT_TOKEN_OTHER"}
+    topicsはタイトル・要約・説明のいずれかに含まれる語句、token_envは別ワークスペース用トークンの環境変数名。
+    """
+    path = os.getenv('SLACK_CHANNELS_FILE')
+    if path:
+        try:
+            with open(path, encoding='utf-8') as f:
+                return [config for config in json.load(f) if config.get('channel')]
+        except Exception as e:
+            print(f"チャンネル設定の読み込みエラー: {e}")
+            return []
+
+    channels = [channel.strip() for channel in os.getenv('SLACK_CHANNELS', '').split(',') if channel.strip()]
+    if channels:
+        return [{'channel': channel} for channel in channels]
+
+    return [{'channel': os.getenv('SLACK_CHANNEL', '#general')}]
+
+
+def is_fan_out(channels):
+    """複数チャンネルへの投稿（チャンネル別の絞り込み・別ワークスペースを含む）が必要か"""
+    return len(channels) > 1 or any(
+        config.get('topics') or config.get('count') or config.get('token_env') for config in channels
+    )
+
+
+def filter_articles_for_channel(articles_summary, config):
+    """チャンネルのトピック条件と記事数に合わせて記事を絞り込む"""
+    topics = [topic.lower() for topic in config.get('topics', [])]
+    articles = articles_summary
+
+    if topics:
+        articles = [
+            article for article in articles
+            if any(
+                topic in f"{article['title']} {article['summary']} {article.get('description', '')}".lower()
+                for topic in topics
+            )
+        ]
+
+    count = config.get('count')
+    return articles[:count] if count else articles
+
+
+def fan_out_digest(articles_summary, channels, today, concurrency=None, heading=None):
+    """1回分の要約を複数チャンネルへ並列投稿し、チャンネルごとの結果を返す
+
+    同じワークスペース（トークン）への投稿は SLACK_POSTS_PER_MINUTE 件/分に抑え、
+    429はHTTPクライアントがRetry-Afterに従って再試行する。
+    """
+    concurrency = concurrency or int(os.getenv('SLACK_FANOUT_CONCURRENCY', '4'))
+    posts_per_minute = float(os.getenv('SLACK_POSTS_PER_MINUTE', '50'))
+    limiters = {}
+
+    def post_channel(config):
+        channel = config['channel']
+        token = os.getenv(config.get('token_env') or 'SLACK_BOT_TOKEN')
+        if not token:
+            return {'channel': channel, 'ok': False, 'error': 'token_not_set', 'articles': 0}
+
+        articles = filter_articles_for_channel(articles_summary, config)
+        if not articles:
+            print(f"投稿対象の記事がないためスキップ: {channel}")
+            return {'channel': channel, 'ok': True, 'skipped': True, 'articles': 0}
+
+        # chat.postMessageのワークスペース単位の上限に合わせて、スレッド返信も含めて1通ごとに間隔を空ける
+        result = post_digest(articles, token, channel, today, heading=heading, limiter=limiters[token])
+        return {'channel': channel, 'ok': bool(result.get('ok')), 'error': result.get('error'),
+                'ts': result.get('ts'), 'articles': len(articles)}
+
+    for config in channels:
+        token = os.getenv(config.get('token_env') or 'SLACK_BOT_TOKEN')
+        if token and token not in limiters:
+            # 投稿数だけを制限する（トークン数の枠は使わない）
+            limiters[token] = RateLimiter(rpm=posts_per_minute, tpm=1)
+
+    print(f"{len(channels)}チャンネルに投稿中...")
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(channels)))) as executor:
+        results = list(executor.map(post_channel, channels))
+
+    print("チャンネル別の投稿結果:")
+    for result in results:
+        if result.get('skipped'):
+            status = "⏭️  対象記事なし"
+        elif result['ok']:
+            status = f"✅ 成功 ({result['articles']}件)"
+        else:
+            status = f"❌ 失敗 ({result.get('error')})"
+        print(f"  {result['channel']}: {status}")
+    get_run_report().set('channels', results)
+
+    return results
+
+
+def render_webhook_article(number, article):
+    """Incoming Webhook向けに記事1件分のテキストを構築"""
+    return (
+        f"*{number}. {article['title']}*\n"
+        f"📝 {article['summary']}\n"
+        f"🔗 {article['link']}\n\n"
+    )
+
+
+def send_webhook_message(texts, webhook_url, today=None):
+    """記事ごとのテキストを1つのメッセージにまとめてIncoming Webhookに投稿"""
+    today = today or datetime.now().strftime("%Y年%m月%d日")
+
+    message = f"🔥 *{today} 技術記事要約* 🔥\n\n" + "".join(texts) + "良い一日を！ 💪"
+
+    payload = {
+        "text": message,
+        "username": "Tech News Bot",
+        "icon_emoji": ":robot_face:"
+    }
+
+    try:
+        with get_run_report().span('slack_post', channel='webhook', bytes=len(message.encode('utf-8'))):
+            response = get_http_client().post(webhook_url, json=payload)
+        response.raise_for_status()
+        print("Slack投稿成功")
+        return True
+
+    except Exception as e:
+        print(f"Slack投稿エラー: {e}")
+        return False
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+パイプラインのステージ
+source → enrich → summarize → render → sink の各ステージをジェネレーターでつなぎ、
+記事を1件ずつ流す（ステージの間でリスト全体を作らない）。並列処理するステージも入力順を保って流す
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from article_extractor import extract_article, truncate_to_tokens
+from article_ranking import needs_counts, parse_ranking, rank_articles
+from bookmark_counts import fetch_bookmark_counts
+from dedup import cluster_articles, load_local_embedder
+from feed_sources import aggregate_articles
+from interaction_store import InteractionStore
+from run_report import get_run_report
+from summary_cache import make_cache_key, prompt_version
+from .summarize import (
+    SUMMARY_MODEL, SUMMARY_PROMPT_TEMPLATE, build_summary_prompt, call_with_timeout, extractive_summary,
+    generate_detail_summary, is_fallback_summary, summarize_batch_with_gemini, summarize_with_gemini,
+)
+
+
+def ordered_map(fn, items, concurrency):
+    """itemsを読みながらfnを並列に適用し、結果を入力順にyield（同時実行はconcurrency件まで）"""
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= concurrency:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def chunked(items, size):
+    """itemsをsize件ずつのリストにまとめてyield"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def source_stage(sources, limit=5, dedup=None, archive=None):
+    """ソースステージ: 記事を取得・集約し、投稿対象の記事を順位順に流す
+
+    順位付けと類似記事のまとめには候補全体が必要なため、ここまでは一括で処理する。
+    ARTICLE_RANKING がフィードの掲載順（feed）以外なら、候補全体のブックマーク数を取得して並べ替える。
+    archive を渡すと取得した記事を登録し、直近に投稿済みの記事を除く。
+    """
+    report = get_run_report()
+    if dedup is None:
+        dedup = os.getenv('DEDUP_ARTICLES', 'true').lower() == 'true'
+    ranking = parse_ranking(os.getenv('ARTICLE_RANKING', 'feed'))
+
+    print(f"{len(sources)}件のソースから記事を取得中...")
+    # 類似記事をまとめる場合は、まとめた後もlimit件残るよう多めに候補を取得する
+    candidates = max(limit, int(os.getenv('DEDUP_CANDIDATES', '15'))) if dedup else limit
+    # 掲載順以外で並べ替える場合は、フィードの上位に限らず候補を広く取る
+    if ranking != [('feed', 1.0)]:
+        candidates = max(candidates, int(os.getenv('RANKING_CANDIDATES', '100')))
+    with report.span('fetch_articles', sources=len(sources)) as span:
+        articles = aggregate_articles(sources, limit=candidates)
+        span['items'] = len(articles)
+
+    if ranking != [('feed', 1.0)] and articles:
+        counts = fetch_bookmark_counts([article['link'] for article in articles]) if needs_counts(ranking) else {}
+        with report.span('rank_articles', items=len(articles)):
+            articles = rank_articles(articles, ranking, counts)
+        print("順位付け: " + ", ".join(f"{name}×{weight:g}" for name, weight in ranking))
+
+    if dedup and articles:
+        embed_fn = load_local_embedder() if os.getenv('DEDUP_EMBEDDINGS', 'false').lower() == 'true' else None
+        with report.span('cluster_articles', items=len(articles)) as span:
+            clustered = cluster_articles(articles, embed_fn=embed_fn)
+            span['clusters'] = len(clustered)
+        if len(clustered) < len(articles):
+            print(f"類似記事をまとめました: {len(articles)}件 → {len(clustered)}件")
+        articles = clustered
+
+    # アーカイブに記録し、直近に投稿済みの記事は除く
+    if archive is not None:
+        with report.span('archive_ingest', items=len(articles)) as span:
+            span['new'] = archive.ingest(articles)
+            articles = archive.filter_recently_posted(articles)
+        print(f"アーカイブ: 新規 {span['new']}件 / 投稿対象 {len(articles[:limit])}件")
+
+    articles = articles[:limit]
+    if articles:
+        print(f"{len(articles)}件の記事を取得しました")
+
+    yield from articles
+
+
+def enrich_stage(items, store=None, concurrency=None):
+    """本文抽出ステージ: 記事を読みながら並列に本文を取得し、'content' を付けて流す"""
+    concurrency = concurrency or int(os.getenv('ARTICLE_FETCH_CONCURRENCY', '5'))
+
+    def enrich(article):
+        article['content'] = extract_article(article['link'], store)
+        return article
+
+    yield from ordered_map(enrich, items, concurrency)
+
+
+def summarize_stage(items, concurrency=None, timeout=None, summarize_fn=None, cache=None,
+                    batch_size=None, summarize_batch_fn=None, field='summary', on_summary=None):
+    """要約ステージ: 記事を読みながら並列に要約し、field（既定は 'summary'）を付けて入力順に流す
+
+    batch_sizeが2以上なら複数記事を1リクエストにまとめ、要約が欠けた記事だけ1件ずつ要約し直す。
+    キャッシュ（SQLite）の読み書きはこのジェネレーターを回すスレッドだけで行う。
+    on_summary(article, summary) は要約ができた時点で入力順を待たずにワーカースレッドから呼ばれる。
+    """
+    if concurrency is None:
+        concurrency = int(os.getenv('SUMMARY_CONCURRENCY', '5'))
+    if timeout is None:
+        timeout = float(os.getenv('SUMMARY_TIMEOUT', '60'))
+    if batch_size is None:
+        batch_size = int(os.getenv('SUMMARY_BATCH_SIZE', '1'))
+    summarize_fn = summarize_fn or summarize_with_gemini
+    summarize_batch_fn = summarize_batch_fn or summarize_batch_with_gemini
+    version = prompt_version(SUMMARY_MODEL, SUMMARY_PROMPT_TEMPLATE) if cache is not None else None
+
+    def lookup(articles):
+        # キャッシュヒットした記事はAPIを呼ばない（キーは本文を含めて実際に送るプロンプトから作る）
+        for article in articles:
+            key = cached = None
+            if cache is not None:
+                prompt = build_summary_prompt(
+                    article['title'], article.get('description', ''), article.get('content'), record=False
+                )
+                key = make_cache_key(article['link'], prompt, version)
+                cached = cache.get(key)
+            yield article, key, cached
+
+    def summarize_one(article):
+        summary = call_with_timeout(
+            lambda: summarize_fn(article['title'], article.get('description', ''), article.get('content')),
+            timeout, article['title']
+        )
+        return summary or extractive_summary(article['title'], article.get('description', ''), article.get('content'))
+
+    def summarize_chunk(chunk):
+        missing = [article for article, _, cached in chunk if cached is None]
+        results = {}
+
+        if len(missing) > 1:
+            summaries = call_with_timeout(
+                lambda: summarize_batch_fn(missing), timeout, f"バッチ要約 {len(missing)}件"
+            )
+            if isinstance(summaries, list) and len(summaries) == len(missing):
+                results = {id(article): summary for article, summary in zip(missing, summaries) if summary}
+            if len(results) < len(missing):
+                print(f"バッチ要約で欠けた{len(missing) - len(results)}件を個別に要約します")
+
+        for article in missing:
+            if id(article) not in results:
+                results[id(article)] = summarize_one(article)
+
+        if on_summary is not None:
+            for article, _, cached in chunk:
+                on_summary(article, cached if cached is not None else results[id(article)])
+
+        return [
+            (article, key, cached if cached is not None else results[id(article)], cached is None)
+            for article, key, cached in chunk
+        ]
+
+    for chunk in ordered_map(summarize_chunk, chunked(lookup(items), max(1, batch_size)), concurrency):
+        for article, key, summary, fresh in chunk:
+            if fresh and cache is not None and not is_fallback_summary(summary):
+                cache.set(key, article['link'], summary)
+            article[field] = summary
+            yield article
+
+
+def summarize_articles(articles, concurrency=None, timeout=None, summarize_fn=None, cache=None,
+                       batch_size=None, summarize_batch_fn=None):
+    """記事リストを並列で要約し、入力順の要約リストを返す（記事自体は変更しない）"""
+    items = summarize_stage(
+        (dict(article) for article in articles), concurrency=concurrency, timeout=timeout,
+        summarize_fn=summarize_fn, cache=cache, batch_size=batch_size, summarize_batch_fn=summarize_batch_fn,
+        field='_summary'
+    )
+    return [item['_summary'] for item in items]
+
+
+def interaction_store_stage(items, store=None, concurrency=None, precompute=None):
+    """インタラクションストアのステージ: 詳細要約を並列に事前生成しながら記事を流し、
+    最後の記事を流し終えた時点でストアを保存する
+    """
+    context_tokens = int(os.getenv('INTERACTION_CONTEXT_TOKENS', '1500'))
+    concurrency = concurrency or int(os.getenv('SUMMARY_CONCURRENCY', '5'))
+    timeout = float(os.getenv('SUMMARY_TIMEOUT', '60'))
+    if precompute is None:
+        precompute = os.getenv('PRECOMPUTE_DETAILS', 'true').lower() == 'true'
+
+    try:
+        store = store or InteractionStore()
+    except Exception as e:
+        print(f"インタラクションストア読み込みエラー: {e}")
+        yield from items
+        return
+
+    # PRECOMPUTE_DETAILS=false ならコンテキストだけ保存し、詳細要約はボタン押下時に生成する
+    def detail(article):
+        if not precompute:
+            return article, None
+        summary = call_with_timeout(
+            lambda: generate_detail_summary(article['title'], article.get('description', ''), article.get('content')),
+            timeout, article['title']
+        )
+        return article, summary
+
+    count = 0
+    for article, detail_summary in ordered_map(detail, items, concurrency):
+        store.put(
+            article['link'],
+            title=article['title'],
+            description=article.get('description', ''),
+            summary=article.get('summary', ''),
+            detail_summary=detail_summary,
+            context=truncate_to_tokens(article.get('content') or '', context_tokens),
+        )
+        count += 1
+        yield article
+
+    try:
+        with get_run_report().span('publish_interaction_store', items=count):
+            store.save()
+        print(f"インタラクションストアを保存しました: {store.backend.path} ({count}件)")
+    except Exception as e:
+        print(f"インタラクションストア保存エラー: {e}")
+
+
+def run_pipeline(source, sink, stages=()):
+    """sourceから流れる記事をstagesの順に通し、sinkで描画・投稿する（投稿できたらTrue）"""
+    items = source
+    for stage in stages:
+        items = stage(items)
+
+    report = get_run_report()
+    with report.span('pipeline', sink=sink.name):
+        success = sink.publish(sink.render(items))
+    if success:
+        report.mark('time_to_complete')
+    return success
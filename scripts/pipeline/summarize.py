@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+要約のプロンプトとGemini呼び出し
+1記事・複数記事（バッチ）・詳細要約それぞれのプロンプトと、1回分の呼び出しを提供する。
+並列化やキャッシュは stages の要約ステージが受け持つ。
+プロンプトに入れるタイトル・説明・本文は呼び出しごとの入力予算（推定トークン数）に収めてから渡す。
+Gemini呼び出しはモデルの段ごとのヘッジ・フォールバック付きで行い、すべての段が失敗した要約は
+説明文から重要な文を抜き出した抽出要約で代用する
+"""
+
+import os
+import json
+import threading
+import time
+from llm_resilience import get_tiered_generator
+from prompt_budget import get_prompt_budget, normalize_text, select_sentences, strip_boilerplate
+from rate_limiter import get_rate_limiter
+
+# 要約に使うモデルとプロンプト（変更するとキャッシュは自動的に無効化される）
+SUMMARY_MODEL = 'gemini-2.5-flash'
+SUMMARY_PROMPT_TEMPLATE = """
+以下の技術記事について、簡潔で分かりやすい要約を日本語で作成してください。
+要約は2-3文程度で、技術者にとって有益な情報を含めてください。
+
+タイトル: {title}
+説明: {description}
+{content}
+要約:
+"""
+
+# 本文を抽出できた場合にプロンプトへ追加する部分
+SUMMARY_CONTENT_TEMPLATE = """
+本文（抜粋）:
+{content}
+"""
+
+# 複数記事をまとめて要約する場合のプロンプト
+SUMMARY_BATCH_PROMPT_TEMPLATE = """
+以下の{count}件の技術記事それぞれについて、簡潔で分かりやすい要約を日本語で作成してください。
+要約は各記事2-3文程度で、技術者にとって有益な情報を含めてください。
+
+出力は次の形式のJSON配列のみとし、説明文やコードブロックは付けないでください。
+[{{"id": 記事番号, "summary": "要約"}}]
+
+{articles}
+"""
+SUMMARY_BATCH_ENTRY_TEMPLATE = """[記事{id}]
+タイトル: {title}
+説明: {description}
+{content}"""
+
+# ボタン押下時に表示する詳細要約のプロンプト（api/slack-interactions.js と同じ要求事項）
+DETAIL_SUMMARY_PROMPT_TEMPLATE = """
+以下の技術記事について、エンジニア向けの詳細要約を日本語で作成してください。
+
+要求事項:
+- 5-8文程度の詳細な要約
+- 技術的なポイントを具体的に説明
+- 実務への応用可能性を含める
+- 重要なキーワードを*太字*で強調
+
+記事情報:
+タイトル: {title}
+元の説明: {description}
+{content}
+詳細要約:
+"""
+
+# 要約失敗時のフォールバック文言
+SUMMARY_FALLBACK = "要約の生成に失敗しました。"
+
+# Geminiを使えず、説明文から抜き出した要約の先頭に付ける文言
+EXTRACTIVE_PREFIX = "（自動抽出）"
+
+
+def format_content(content):
+    """抽出した本文をプロンプト用に整形（本文がなければ空文字）"""
+    return SUMMARY_CONTENT_TEMPLATE.format(content=content) if content else ""
+
+
+def input_budget(name, default):
+    """1回の呼び出しでプロンプトに入れる記事情報の推定トークン数の上限"""
+    return int(os.getenv(name, str(default)))
+
+
+def extractive_summary(title, description, content=None):
+    """Geminiで要約できなかった記事の代わりの要約（説明文、なければ本文から重要な文を抜き出す）"""
+    source = strip_boilerplate(normalize_text(description or '')) or strip_boilerplate(normalize_text(content or ''))
+    sentences = select_sentences(source, input_budget('EXTRACTIVE_SUMMARY_TOKENS', 150), title)
+    if not sentences:
+        return SUMMARY_FALLBACK
+    return EXTRACTIVE_PREFIX + " ".join(sentences.split("\n"))
+
+
+def is_fallback_summary(summary):
+    """Geminiで生成できなかった要約（キャッシュせず次回に生成し直す）かどうか"""
+    return summary == SUMMARY_FALLBACK or summary.startswith(EXTRACTIVE_PREFIX)
+
+
+def generate_text(prompt):
+    """SUMMARY_MODEL から順にフォールバックしながら生成し、テキストを返す（すべて失敗したらNone）"""
+    text, _ = get_tiered_generator().generate(prompt, SUMMARY_MODEL)
+    return text
+
+
+def build_summary_prompt(title, description, content=None, record=True):
+    """入力予算に収めた要約プロンプト（Geminiに渡すテキストそのもの）を組み立てる"""
+    fitted_title, fitted_description, fitted_content = get_prompt_budget().fit(
+        title, description, content, input_budget('SUMMARY_INPUT_TOKENS', 1200), record=record
+    )
+    return SUMMARY_PROMPT_TEMPLATE.format(
+        title=fitted_title, description=fitted_description, content=format_content(fitted_content)
+    )
+
+
+def summarize_with_gemini(title, description, content=None):
+    """Gemini APIを使って記事を要約（本文があれば説明と合わせて渡す）"""
+    try:
+        prompt = build_summary_prompt(title, description, content)
+
+        summary = generate_text(prompt)
+        if summary:
+            return summary
+
+    except Exception as e:
+        print(f"Gemini要約エラー: {e}")
+
+    print(f"要約を抽出要約で代用します: {title[:50]}")
+    return extractive_summary(title, description, content)
+
+
+def generate_detail_summary(title, description, content=None):
+    """ボタン押下時に表示する詳細要約を事前に生成（失敗時はNone）"""
+    try:
+        title, description, content = get_prompt_budget().fit(
+            title, description, content, input_budget('DETAIL_INPUT_TOKENS', 2500)
+        )
+        prompt = DETAIL_SUMMARY_PROMPT_TEMPLATE.format(title=title, description=description, content=format_content(content))
+        return generate_text(prompt)
+
+    except Exception as e:
+        print(f"Gemini詳細要約エラー: {e}")
+        return None
+
+
+def summarize_batch_with_gemini(articles):
+    """複数記事を1回のGemini呼び出しでまとめて要約（欠落・不正な要素はNone）"""
+    try:
+        # 入力予算は記事数で等分する
+        budget = max(1, input_budget('SUMMARY_BATCH_INPUT_TOKENS', 4000) // max(1, len(articles)))
+        fitted = [
+            get_prompt_budget().fit(article['title'], article.get('description', ''), article.get('content'), budget)
+            for article in articles
+        ]
+        entries = "\n".join(
+            SUMMARY_BATCH_ENTRY_TEMPLATE.format(
+                id=i, title=title, description=description, content=format_content(content)
+            )
+            for i, (title, description, content) in enumerate(fitted, 1)
+        )
+        prompt = SUMMARY_BATCH_PROMPT_TEMPLATE.format(count=len(articles), articles=entries)
+
+        text = generate_text(prompt)
+        if text is None:
+            return [None] * len(articles)
+        return parse_batch_summaries(text, len(articles))
+
+    except Exception as e:
+        print(f"Geminiバッチ要約エラー: {e}")
+        return [None] * len(articles)
+
+
+def parse_batch_summaries(text, count):
+    """バッチ要約の応答（JSON配列）を記事順の要約リストに変換"""
+    summaries = [None] * count
+
+    # コードブロックや前後の説明文が付いていても配列部分だけを取り出す
+    start = text.find('[')
+    end = text.rfind(']')
+    if start == -1 or end <= start:
+        print("バッチ要約の応答にJSON配列が見つかりません")
+        return summaries
+
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError as e:
+        print(f"バッチ要約の応答を解析できません: {e}")
+        return summaries
+
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        index = item.get('id')
+        summary = item.get('summary')
+        if isinstance(index, int) and 1 <= index <= count and isinstance(summary, str) and summary.strip():
+            summaries[index - 1] = summary.strip()
+
+    return summaries
+
+
+def call_with_timeout(fn, timeout, label):
+    """関数を別スレッドで実行し、timeout秒で見切る（タイムアウト・例外時はNone）
+
+    レートリミッターの枠の空き待ちで止まっていた時間はtimeoutに含めない（待っている呼び出しは見切らない）。
+    """
+    # 応答しない呼び出しでワーカーを塞がないよう、呼び出し自体はデーモンスレッドに任せる
+    result = {}
+    limiter = get_rate_limiter()
+
+    def target():
+        try:
+            result['value'] = fn()
+        except Exception as e:
+            print(f"Gemini要約エラー: {e}")
+
+    worker = threading.Thread(target=target, daemon=True)
+    started = time.monotonic()
+    worker.start()
+    while True:
+        remaining = timeout + limiter.queued_seconds(worker.ident) - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        worker.join(remaining)
+        if not worker.is_alive():
+            break
+    limiter.forget(worker.ident)
+
+    if worker.is_alive():
+        print(f"要約タイムアウト ({timeout}秒): {label}")
+        return None
+
+    return result.get('value')
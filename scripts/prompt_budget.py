@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+プロンプトの入力予算
+Geminiに渡す前にタイトル・説明・本文の推定トークン数を1回の呼び出しごとの予算に収める。
+予算を超える本文は、表記の正規化 → 定型文の除去 → 重要な文の抽出 → 末尾の切り詰め の順に圧縮し、
+削減できたトークン数を実行ごとに集計する
+"""
+
+import os
+import re
+import html
+import math
+import threading
+import unicodedata
+from collections import Counter
+from article_extractor import truncate_to_tokens
+from rate_limiter import estimate_tokens
+from run_report import get_run_report
+
+# 本文から取り除く定型文（共有ボタン・関連記事・広告・著作権表示など）
+BOILERPLATE_PATTERNS = re.compile(
+    r'^(シェア|共有|ツイート|ブックマーク|いいね|フォロー|この記事を(シェア|読んだ人)|関連記事|あわせて読みたい|'
+    r'人気記事|おすすめ記事|続きを読む|もっと見る|広告|PR|スポンサー|ログイン|会員登録|'
+    r'(Share|Tweet|Follow|Related|Advertisement|Sponsored|Sign (in|up)|Log ?in|Subscribe|Read more)\b)'
+    r'|(©|\(c\)|Copyright|All rights reserved|Cookie|クッキー)',
+    re.IGNORECASE
+)
+
+# 文の区切り（句点・感嘆符・疑問符の後、英文はピリオドと空白の後）
+SENTENCE_END = re.compile(r'(?<=[。！？!?])|(?<=\.)\s+')
+
+# 重要度の計算に使う語（英数字の連続・カタカナ語・漢字2文字ずつ）
+WORD = re.compile(r'[A-Za-z][A-Za-z0-9+#\-]*|[ァ-ヴー]{2,}|(?=([一-龥]{2}))')
+
+ZERO_WIDTH = re.compile('[\u200b\u200c\u200d\u2060\ufeff]')
+SPACES = re.compile(r'[ \t\u3000]+')
+
+
+def normalize_text(text):
+    """HTMLエンティティ・全角英数字（NFKC）・ゼロ幅文字・連続する空白を正規化"""
+    if '&' in text:
+        text = html.unescape(text)
+    if not unicodedata.is_normalized('NFKC', text):
+        text = unicodedata.normalize('NFKC', text)
+    text = ZERO_WIDTH.sub('', text)
+    lines = (SPACES.sub(' ', line).strip() for line in text.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def strip_boilerplate(text):
+    """定型文の行と、同じ内容の繰り返し行を除く"""
+    seen = set()
+    kept = []
+    for line in text.split("\n"):
+        if len(line) < 80 and BOILERPLATE_PATTERNS.search(line):
+            continue
+        if line in seen:
+            continue
+        seen.add(line)
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def split_sentences(text):
+    return [
+        sentence.strip()
+        for line in text.split("\n")
+        for sentence in SENTENCE_END.split(line)
+        if sentence and sentence.strip()
+    ]
+
+
+def words_of(text):
+    return {match.group(1) or match.group(0) for match in WORD.finditer(text.lower())}
+
+
+def select_sentences(text, max_tokens, title=''):
+    """文ごとに重要度（タイトルと共通の語・他の文と共通する語・冒頭に近いほど高い）を付け、
+    予算に収まる分を重要度の高い順に選んで元の順序で返す（同じ文の繰り返しは1回にまとめる）
+    """
+    sentences = list(dict.fromkeys(split_sentences(text)))
+    words = [words_of(sentence) for sentence in sentences]
+    frequency = Counter(word for sentence_words in words for word in sentence_words)
+    title_words = words_of(title)
+
+    scores = []
+    for position, sentence_words in enumerate(words):
+        weight = sum(3 * (word in title_words) + math.log(frequency[word]) for word in sentence_words)
+        scores.append(weight / math.sqrt(len(sentence_words) or 1) + 1.0 / (position + 1))
+
+    chosen = set()
+    used = 0
+    for index in sorted(range(len(sentences)), key=lambda index: -scores[index]):
+        tokens = estimate_tokens(sentences[index]) + 1
+        if used + tokens > max_tokens:
+            continue
+        chosen.add(index)
+        used += tokens
+
+    return "\n".join(sentence for index, sentence in enumerate(sentences) if index in chosen)
+
+
+def compress_text(text, max_tokens, title=''):
+    """本文を max_tokens 以内に圧縮（収まった段階で以降の処理は行わない）"""
+    if not text:
+        return text
+
+    text = normalize_text(text)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    text = strip_boilerplate(text)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    return truncate_to_tokens(select_sentences(text, max_tokens, title) or text, max_tokens)
+
+
+class PromptBudget:
+    """プロンプト入力の圧縮と、削減したトークン数の集計"""
+
+    def __init__(self):
+        self.enabled = os.getenv('PROMPT_COMPRESSION', 'true').lower() == 'true'
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def fit(self, title, description, content, max_tokens, record=True):
+        """タイトル・説明・本文を合わせて max_tokens 以内に収めて返す
+
+        タイトルはそのまま残し、説明は予算の1/4まで、本文は残りの予算に収める。
+        record=False なら削減量を集計しない（キャッシュキーの計算など、実際には送らない場合）。
+        """
+        description = description or ''
+        before = estimate_tokens(title) + estimate_tokens(description) + estimate_tokens(content)
+        if not self.enabled:
+            return title, description, content
+
+        title = normalize_text(title)
+        description = compress_text(description, max(16, max_tokens // 4), title)
+        remaining = max(0, max_tokens - estimate_tokens(title) - estimate_tokens(description))
+        content = compress_text(content, remaining, title) if remaining else ''
+
+        if not record:
+            return title, description, content
+
+        after = estimate_tokens(title) + estimate_tokens(description) + estimate_tokens(content)
+        with self.lock:
+            self.calls += 1
+            self.tokens_before += before
+            self.tokens_after += after
+        get_run_report().count('prompt_tokens_saved', before - after)
+
+        return title, description, content
+
+    def report(self):
+        """削減したトークン数を出力"""
+        if not self.calls:
+            return
+        saved = self.tokens_before - self.tokens_after
+        rate = saved / self.tokens_before * 100 if self.tokens_before else 0.0
+        print(f"プロンプト圧縮: {self.calls}件 / 入力 {self.tokens_before} → {self.tokens_after}トークン "
+              f"(削減 {saved}トークン, {rate:.0f}%)")
+
+
+_default_budget = None
+_default_budget_lock = threading.Lock()
+
+
+def get_prompt_budget():
+    """プロセス共通のプロンプト予算を取得（初回呼び出し時に作成）"""
+    global _default_budget
+
+    with _default_budget_lock:
+        if _default_budget is None:
+            _default_budget = PromptBudget()
+        return _default_budget
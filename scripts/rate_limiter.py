@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Gemini呼び出しのレート制御と利用量の記録
+RPM/TPMの上限に合わせてリクエストを待たせるトークンバケットと、
+日ごとのリクエスト数・トークン数・概算コストを保存する台帳を提供する
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+DEFAULT_LEDGER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'gemini_usage.sqlite3')
+
+
+def estimate_tokens(text):
+    """トークン数をローカルで概算（ASCIIは約4文字、それ以外は約1文字で1トークン）"""
+    if not text:
+        return 0
+
+    # ASCII以外を落としたバイト数（文字ごとのループより速い）
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+class RateLimiter:
+    """RPM（リクエスト数/分）とTPM（トークン数/分）のトークンバケット"""
+
+    def __init__(self, rpm=None, tpm=None):
+        self.rpm = rpm or float(os.getenv('GEMINI_RPM', '10'))
+        self.tpm = tpm or float(os.getenv('GEMINI_TPM', '250000'))
+        self.request_tokens = self.rpm
+        self.token_tokens = self.tpm
+        self.updated_at = time.monotonic()
+        self.condition = threading.Condition()
+        # スレッドごとの待機時間（呼び出し元のタイムアウトから待機分を除くため）: {ident: [合計秒, 待機開始時刻, 待機中の数]}
+        self.queued = {}
+        # 待機時間を呼び出し元のスレッドにも数えるスレッド: {ident: 呼び出し元のident}
+        self.owners = {}
+
+    def refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.request_tokens = min(self.rpm, self.request_tokens + elapsed * self.rpm / 60)
+        self.token_tokens = min(self.tpm, self.token_tokens + elapsed * self.tpm / 60)
+
+    def acquire(self, tokens):
+        """1リクエスト分とtokens分の枠が空くまで待機し、待った秒数を返す"""
+        # 1回でバケット容量を超えるリクエストは容量いっぱいまでで扱う（永久に待たないため）
+        tokens = min(tokens, self.tpm)
+        start = time.monotonic()
+
+        with self.condition:
+            # 同時に待っているスレッドが同じ呼び出し元に数えられる場合は、重なった時間を1回分として数える
+            entries = [self.queued.setdefault(ident, [0.0, None, 0]) for ident in self.waiting_idents()]
+            for entry in entries:
+                if not entry[2]:
+                    entry[1] = start
+                entry[2] += 1
+            try:
+                while True:
+                    self.refill()
+                    if self.request_tokens >= 1 and self.token_tokens >= tokens:
+                        self.request_tokens -= 1
+                        self.token_tokens -= tokens
+                        return time.monotonic() - start
+
+                    wait = max(
+                        (1 - self.request_tokens) * 60 / self.rpm,
+                        (tokens - self.token_tokens) * 60 / self.tpm,
+                    )
+                    self.condition.wait(wait)
+            finally:
+                now = time.monotonic()
+                for entry in entries:
+                    entry[2] -= 1
+                    if not entry[2]:
+                        entry[0] += now - entry[1]
+                        entry[1] = None
+
+    def waiting_idents(self):
+        """待機時間を数えるスレッド（このスレッドと、attachした呼び出し元をたどったもの）"""
+        idents = [threading.get_ident()]
+        while idents[-1] in self.owners and self.owners[idents[-1]] not in idents:
+            idents.append(self.owners[idents[-1]])
+        return idents
+
+    def attach(self, owner):
+        """このスレッドの待機時間を、呼び出し元のスレッドownerの待機時間にも数える
+
+        呼び出し元が別スレッドに任せた呼び出し（429後の再試行を含む）の待ちを、呼び出し元の制限時間から除くため。
+        """
+        with self.condition:
+            if owner != threading.get_ident():
+                self.owners[threading.get_ident()] = owner
+
+    def try_acquire(self, tokens):
+        """枠が空いていればすぐに1リクエスト分とtokens分を確保してTrue、空いていなければ待たずにFalse"""
+        tokens = min(tokens, self.tpm)
+        with self.condition:
+            self.refill()
+            if self.request_tokens >= 1 and self.token_tokens >= tokens:
+                self.request_tokens -= 1
+                self.token_tokens -= tokens
+                return True
+            return False
+
+    def queued_seconds(self, ident):
+        """スレッドidentがこれまでに枠の空き待ちで待った秒数（待機中の分を含む）"""
+        with self.condition:
+            total, started, _ = self.queued.get(ident, (0.0, None, 0))
+            return total + (time.monotonic() - started if started is not None else 0.0)
+
+    def forget(self, ident):
+        """スレッドidentの待機時間の記録と呼び出し元の登録を消す（スレッドの処理が終わった後に呼ぶ）"""
+        with self.condition:
+            self.queued.pop(ident, None)
+            self.owners.pop(ident, None)
+
+    def penalize(self, seconds):
+        """429を受けた場合など、しばらく新しいリクエストを出さないよう枠を空にする"""
+        with self.condition:
+            self.refill()
+            self.request_tokens = min(self.request_tokens, 1 - seconds * self.rpm / 60)
+
+
+class UsageLedger:
+    """日ごと・モデルごとのGemini利用量台帳"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('GEMINI_USAGE_PATH', DEFAULT_LEDGER_PATH)
+        self.input_price = float(os.getenv('GEMINI_INPUT_PRICE_PER_1M', '0.30'))
+        self.output_price = float(os.getenv('GEMINI_OUTPUT_PRICE_PER_1M', '2.50'))
+        self.daily_requests = int(os.getenv('GEMINI_RPD', '250'))
+        self.run = {'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'retries': 0, 'wait': 0.0}
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS usage (
+                day TEXT NOT NULL,
+                model TEXT NOT NULL,
+                requests INTEGER NOT NULL,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                cost REAL NOT NULL,
+                PRIMARY KEY (day, model)
+            )
+            """
+        )
+        self.conn.commit()
+
+    def record(self, model, input_tokens, output_tokens, retries=0, wait=0.0):
+        """1リクエスト分の利用量を記録"""
+        day = datetime.now().strftime('%Y-%m-%d')
+        cost = (input_tokens * self.input_price + output_tokens * self.output_price) / 1_000_000
+
+        with self.lock:
+            self.run['requests'] += 1
+            self.run['input_tokens'] += input_tokens
+            self.run['output_tokens'] += output_tokens
+            self.run['retries'] += retries
+            self.run['wait'] += wait
+
+            self.conn.execute(
+                """
+                INSERT INTO usage (day, model, requests, input_tokens, output_tokens, cost) VALUES (?, ?, 1, ?, ?, ?)
+                ON CONFLICT (day, model) DO UPDATE SET
+                    requests = requests + 1,
+                    input_tokens = input_tokens + excluded.input_tokens,
+                    output_tokens = output_tokens + excluded.output_tokens,
+                    cost = cost + excluded.cost
+                """,
+                (day, model, input_tokens, output_tokens, cost)
+            )
+            self.conn.commit()
+
+    def today(self):
+        """今日の利用量（全モデル合計）を取得"""
+        day = datetime.now().strftime('%Y-%m-%d')
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COALESCE(SUM(requests), 0), COALESCE(SUM(input_tokens), 0), "
+                "COALESCE(SUM(output_tokens), 0), COALESCE(SUM(cost), 0) FROM usage WHERE day = ?",
+                (day,)
+            ).fetchone()
+        return {'requests': row[0], 'input_tokens': row[1], 'output_tokens': row[2], 'cost': row[3]}
+
+    def report(self):
+        """今回の実行分と今日の累計・残り枠を出力"""
+        run = self.run
+        today = self.today()
+        remaining = max(0, self.daily_requests - today['requests'])
+
+        print(
+            f"Gemini利用量(今回): {run['requests']}リクエスト / 入力 {run['input_tokens']} / "
+            f"出力 {run['output_tokens']}トークン / 再試行 {run['retries']}回 / 待機 {run['wait']:.1f}秒"
+        )
+        print(
+            f"Gemini利用量(今日): {today['requests']}リクエスト (残り {remaining}/{self.daily_requests}) / "
+            f"入力 {today['input_tokens']} / 出力 {today['output_tokens']}トークン / 概算 ${today['cost']:.4f}"
+        )
+
+    def close(self):
+        self.conn.close()
+
+
+_lock = threading.Lock()
+_rate_limiter = None
+_usage_ledger = None
+
+
+def get_rate_limiter():
+    """プロセス共通のレートリミッターを取得"""
+    global _rate_limiter
+
+    with _lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter()
+        return _rate_limiter
+
+
+def get_usage_ledger():
+    """プロセス共通の利用量台帳を取得"""
+    global _usage_ledger
+
+    with _lock:
+        if _usage_ledger is None:
+            _usage_ledger = UsageLedger()
+        return _usage_ledger
+
+
+def close_usage_ledger():
+    """プロセス共通の利用量台帳を閉じて破棄（次の呼び出しで GEMINI_USAGE_PATH から作り直す）"""
+    global _usage_ledger
+
+    with _lock:
+        if _usage_ledger is not None:
+            _usage_ledger.close()
+            _usage_ledger = None
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+実行計測とレポート出力
+記事取得・要約・ブロック構築・Slack投稿などの各ステージの所要時間と、
+バイト数・トークン数・再試行回数を記録し、実行終了時にJSON（任意でPrometheusテキスト形式）で出力する
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from contextlib import contextmanager
+
+
+class RunReport:
+    """1回の実行分のスパン（ステージごとの計測値）とカウンターを保持"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now(timezone.utc)
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        self.spans = []
+        self.counters = {}
+        self.extra = {}
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """withブロックの所要時間を記録（yieldした辞書に計測値を追加できる）"""
+        record = {'name': name, 'start': time.perf_counter() - self.origin}
+        record.update(attrs)
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = str(e)
+            raise
+        finally:
+            record['duration'] = time.perf_counter() - self.origin - record['start']
+            with self.lock:
+                self.spans.append(record)
+
+    def record(self, name, duration, **attrs):
+        """計測済みの所要時間をスパンとして記録"""
+        record = {'name': name, 'start': time.perf_counter() - self.origin - duration, 'duration': duration}
+        record.update(attrs)
+        with self.lock:
+            self.spans.append(record)
+
+    def count(self, name, value=1):
+        """カウンターを加算"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def mark(self, name):
+        """実行開始からの経過時間を一度だけ記録（time_to_first_post など、最初に到達した時点を残す）"""
+        with self.lock:
+            self.extra.setdefault(name, time.perf_counter() - self.origin)
+
+    def set(self, key, value):
+        """レポートに任意の値を追加"""
+        with self.lock:
+            self.extra[key] = value
+
+    def stages(self):
+        """スパン名ごとの件数・合計・最大所要時間"""
+        stages = {}
+        with self.lock:
+            spans = list(self.spans)
+
+        for span in spans:
+            stage = stages.setdefault(span['name'], {'count': 0, 'total': 0.0, 'max': 0.0, 'errors': 0})
+            stage['count'] += 1
+            stage['total'] += span['duration']
+            stage['max'] = max(stage['max'], span['duration'])
+            stage['errors'] += 'error' in span
+
+        return stages
+
+    def to_dict(self):
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: span['start'])
+            counters = dict(self.counters)
+            extra = dict(self.extra)
+
+        return {
+            'name': self.name,
+            'started_at': self.started_at.isoformat(),
+            'duration': time.perf_counter() - self.origin,
+            'stages': self.stages(),
+            'counters': counters,
+            'spans': spans,
+            **extra,
+        }
+
+    def to_prometheus(self):
+        """Prometheusのtextfile collector形式に変換"""
+        report = self.to_dict()
+        prefix = 'tech_news_bot'
+        lines = [
+            f"# TYPE {prefix}_run_duration_seconds gauge",
+            f'{prefix}_run_duration_seconds{{job="{self.name}"}} {report["duration"]:.6f}',
+            f"# TYPE {prefix}_run_timestamp_seconds gauge",
+            f'{prefix}_run_timestamp_seconds{{job="{self.name}"}} {self.started_at.timestamp():.0f}',
+            f"# TYPE {prefix}_stage_duration_seconds summary",
+        ]
+        for stage, stat in sorted(report['stages'].items()):
+            labels = f'job="{self.name}",stage="{stage}"'
+            lines.append(f"{prefix}_stage_duration_seconds_sum{{{labels}}} {stat['total']:.6f}")
+            lines.append(f"{prefix}_stage_duration_seconds_count{{{labels}}} {stat['count']}")
+        lines.append(f"# TYPE {prefix}_counter_total gauge")
+        for name, value in sorted(report['counters'].items()):
+            lines.append(f'{prefix}_counter_total{{job="{self.name}",name="{name}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=None, prometheus_path=None):
+        """レポートを出力（RUN_REPORT_PATH / RUN_REPORT_PROMETHEUS_PATH が未設定なら概要のみ表示）"""
+        path = path or os.getenv('RUN_REPORT_PATH')
+        prometheus_path = prometheus_path or os.getenv('RUN_REPORT_PROMETHEUS_PATH')
+
+        for stage, stat in sorted(self.stages().items(), key=lambda item: -item[1]['total']):
+            print(f"計測 {stage}: {stat['count']}回 合計 {stat['total']:.2f}秒 (最大 {stat['max']:.2f}秒)")
+
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+            print(f"実行レポートを出力しました: {path}")
+
+        if prometheus_path:
+            # 収集中に中途半端なファイルを読まれないよう、一時ファイルから置き換える
+            tmp_path = f"{prometheus_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, prometheus_path)
+
+
+_lock = threading.Lock()
+_run_report = None
+
+
+def get_run_report(name='tech-news-bot'):
+    """プロセス共通の実行レポートを取得（初回呼び出し時に作成）"""
+    global _run_report
+
+    with _lock:
+        if _run_report is None:
+            _run_report = RunReport(name)
+        return _run_report
+
+
+def reset_run_report(name='tech-news-bot'):
+    """実行レポートを新しく作り直す（常駐モードでジョブごとにレポートを区切る場合）"""
+    global _run_report
+
+    with _lock:
+        _run_report = RunReport(name)
+        return _run_report
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+要約キャッシュ
+記事URL・Geminiに渡すプロンプト入力（タイトル・説明・本文）のハッシュ・プロンプト/モデルのバージョンをキーに
+Geminiの要約結果をSQLiteに保存し、同じ記事の再要約を省く
+"""
+
+import os
+import time
+import hashlib
+import sqlite3
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'summaries.sqlite3')
+
+
+def prompt_version(model_name, prompt_template):
+    """モデル名とプロンプトテンプレートからキャッシュ用のバージョン文字列を作成"""
+    digest = hashlib.sha256(prompt_template.encode('utf-8')).hexdigest()[:12]
+    return f"{model_name}:{digest}"
+
+
+def make_cache_key(link, prompt, version):
+    """記事URL・プロンプト入力のハッシュ・バージョンからキャッシュキーを作成
+
+    promptには実際にGeminiへ渡すテキストを使う（本文や入力予算が変われば別のキーになる）。
+    """
+    content_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    return hashlib.sha256(f"{link}\n{content_hash}\n{version}".encode('utf-8')).hexdigest()
+
+
+class SummaryCache:
+    """TTLと件数上限（LRU追い出し）付きのSQLite要約キャッシュ"""
+
+    def __init__(self, path=None, ttl_days=None, max_entries=None):
+        self.path = path or os.getenv('SUMMARY_CACHE_PATH', DEFAULT_CACHE_PATH)
+        if ttl_days is None:
+            ttl_days = float(os.getenv('SUMMARY_CACHE_TTL_DAYS', '7'))
+        if max_entries is None:
+            max_entries = int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', '1000'))
+        self.ttl = ttl_days * 24 * 60 * 60
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                link TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_last_used ON summaries (last_used_at)")
+        self.conn.commit()
+
+    def get(self, key):
+        """キャッシュから要約を取得（期限切れ・未登録はNone）"""
+        now = time.time()
+        row = self.conn.execute(
+            "SELECT summary, created_at FROM summaries WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None or now - row[1] > self.ttl:
+            self.misses += 1
+            return None
+
+        self.conn.execute("UPDATE summaries SET last_used_at = ? WHERE key = ?", (now, key))
+        self.conn.commit()
+        self.hits += 1
+        return row[0]
+
+    def set(self, key, link, summary):
+        """要約を保存し、期限切れと上限超過分を削除"""
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO summaries (key, link, summary, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+            (key, link, summary, now, now)
+        )
+        self.evict(now)
+        self.conn.commit()
+
+    def evict(self, now=None):
+        """期限切れエントリと、件数上限を超えた古い順（最終利用時刻）のエントリを削除"""
+        now = now or time.time()
+        self.conn.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.ttl,))
+        self.conn.execute(
+            """
+            DELETE FROM summaries WHERE key IN (
+                SELECT key FROM summaries ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,)
+        )
+
+    def report(self):
+        """ヒット/ミス件数を出力"""
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        print(f"要約キャッシュ: ヒット {self.hits}件 / ミス {self.misses}件 (ヒット率 {rate:.0f}%)")
+
+    def close(self):
+        self.conn.close()
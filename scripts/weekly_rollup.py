@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+週間まとめ
+記事アーカイブに残っている直近1週間の投稿記事をトピックごとにまとめ、
+記事ごとの要約 → トピックごとの要約（並列）→ 週全体の要約 の順に階層的に要約してSlackに投稿する。
+各段の結果は入力のハッシュをキーにローカルへ保存し、再実行時は入力が変わった段だけを計算し直す
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+from collections import Counter
+from datetime import datetime
+from dotenv import load_dotenv
+from article_archive import ArticleArchive
+from article_extractor import truncate_to_tokens
+from block_kit import section_block
+from dry_run import dry_run_from_env
+from http_client import get_http_client
+from llm_resilience import get_tiered_generator
+from pipeline import SUMMARY_MODEL, extractive_summary, is_fallback_summary, ordered_map, summarize_stage
+from pipeline.slack import load_channel_configs, post_full_message_with_debug, render_article_blocks
+from pipeline.summarize import generate_text, input_budget
+from prompt_budget import get_prompt_budget, normalize_text
+from rate_limiter import estimate_tokens, get_usage_ledger
+from run_report import get_run_report
+from summary_cache import SummaryCache, prompt_version
+
+# .envファイル読み込み
+load_dotenv()
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'rollup.sqlite3')
+
+# トピック名の候補にする語（英数字の語・3文字以上のカタカナ語）
+TOPIC_WORD = re.compile(r'[A-Za-z][A-Za-z0-9+#\-]*[A-Za-z0-9+#]|[ァ-ヴー]{3,}')
+TOPIC_STOPWORDS = {'the', 'and', 'for', 'with', 'from', 'this', 'that', 'http', 'https', 'www', 'com'}
+
+# どのトピックにも入らなかった記事のまとめ先
+OTHER_TOPIC = "その他"
+
+# トピックごとの要約のプロンプト（記事のタイトルと日次の要約を並べて渡す）
+ROLLUP_TOPIC_PROMPT_TEMPLATE = """
+以下は今週投稿した「{label}」に関する技術記事{count}件のタイトルと要約です。
+このトピックで今週どのような動きがあったかを、日本語で3-4文程度にまとめてください。
+記事の紹介を並べるのではなく、共通する傾向や技術者が注目すべき点を中心にしてください。
+
+{entries}
+
+まとめ:
+"""
+
+# 週全体の要約のプロンプト（トピックごとの要約を並べて渡す）
+ROLLUP_WEEK_PROMPT_TEMPLATE = """
+以下は{period}に投稿した技術記事を、トピックごとにまとめた要約です。
+これをもとに、今週の技術動向の概要を日本語で3-5文程度にまとめてください。
+記事数の多いトピックを優先し、トピックをまたぐ傾向があれば触れてください。
+
+{entries}
+
+概要:
+"""
+
+
+def topic_words(article):
+    """記事のタイトルと要約に含まれるトピック名の候補（小文字化した語 → 元の表記）"""
+    words = {}
+    for word in TOPIC_WORD.findall(f"{article['title']} {article.get('summary', '')}"):
+        if word.lower() not in TOPIC_STOPWORDS:
+            words.setdefault(word.lower(), word)
+    return words
+
+
+def group_by_topic(articles, max_topics=None, min_size=2):
+    """記事を共通の語でトピックに分ける（[(トピック名, 記事リスト)]、記事の多いトピック順）
+
+    複数の記事に出てくる語を記事数の多い順に見ていき、まだどのトピックにも入っていない記事が
+    min_size件以上あればその語をトピックにする。残った記事は「その他」にまとめる。
+    """
+    if max_topics is None:
+        max_topics = int(os.getenv('WEEKLY_MAX_TOPICS', '6'))
+
+    words = [topic_words(article) for article in articles]
+    frequency = Counter(word for article_words in words for word in article_words)
+    spellings = {}
+    for article_words in words:
+        for word, spelling in article_words.items():
+            spellings.setdefault(word, Counter())[spelling] += 1
+
+    # 半数以上の記事に出てくる語は区別に役立たないので使わない
+    limit = max(min_size, len(articles) // 2)
+    candidates = sorted(
+        (word for word, count in frequency.items() if min_size <= count <= limit),
+        key=lambda word: (-frequency[word], word)
+    )
+
+    assigned = set()
+    topics = []
+    for word in candidates:
+        if len(topics) >= max_topics:
+            break
+        members = [index for index, article_words in enumerate(words) if word in article_words and index not in assigned]
+        if len(members) < min_size:
+            continue
+        assigned.update(members)
+        topics.append((spellings[word].most_common(1)[0][0], [articles[index] for index in members]))
+
+    rest = [article for index, article in enumerate(articles) if index not in assigned]
+    topics.sort(key=lambda topic: -len(topic[1]))
+    if rest:
+        topics.append((OTHER_TOPIC, rest))
+    return topics
+
+
+def reduce_budget():
+    """トピック・週全体の要約で1回の呼び出しに入れる入力の推定トークン数の上限"""
+    return input_budget('WEEKLY_REDUCE_INPUT_TOKENS', 6000)
+
+
+def stage_key(stage, template, *parts):
+    """段の名前・プロンプトのバージョン・入力予算・入力から保存用のキーを作る（どれかが変われば別のキーになる）"""
+    version = prompt_version(SUMMARY_MODEL, template)
+    payload = json.dumps([stage, version, reduce_budget(), parts], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def fit_entries(entries, max_tokens):
+    """(見出し, 本文) を「- 見出し: 本文」の行にして max_tokens 以内に収める
+
+    見出し（記事のタイトル・トピック名）はすべて残し、本文を1件あたり同じ予算に切り詰める
+    （重要な文だけを選ぶと記事ごと落ちることがあるため、どの記事も少しずつ削る）。
+    """
+    heads = sum(estimate_tokens(head) + 4 for head, _ in entries)
+    per_entry = max(16, (max_tokens - heads) // max(1, len(entries)))
+    return "\n".join(
+        f"- {head}: {truncate_to_tokens(' '.join(normalize_text(body).split()), per_entry)}" for head, body in entries
+    )
+
+
+def summarize_topic(label, articles):
+    """トピックの記事の要約をまとめて、トピック全体の要約を作る（生成できなければ抽出要約）"""
+    entries = fit_entries([(article['title'], article['summary']) for article in articles], reduce_budget())
+    prompt = ROLLUP_TOPIC_PROMPT_TEMPLATE.format(label=label, count=len(articles), entries=entries)
+    return generate_text(prompt) or extractive_summary(label, '', entries)
+
+
+def summarize_week(period, topics, topic_summaries):
+    """トピックごとの要約から、週全体の要約を作る（生成できなければ抽出要約）"""
+    entries = fit_entries(
+        [(f"{label}（{len(articles)}件）", summary) for (label, articles), summary in zip(topics, topic_summaries)],
+        reduce_budget()
+    )
+    prompt = ROLLUP_WEEK_PROMPT_TEMPLATE.format(period=period, entries=entries)
+    return generate_text(prompt) or extractive_summary(period, '', entries)
+
+
+def map_articles(articles, cache):
+    """記事ごとの要約: 日次投稿で保存した要約を使い、欠けている・生成に失敗していた記事だけ要約し直す
+
+    戻り値は保存済みの結果がなく、実際に要約した件数。
+    """
+    missing = [article for article in articles if not article['summary'] or is_fallback_summary(article['summary'])]
+    if not missing:
+        return 0
+
+    misses = cache.misses
+    print(f"記事ごとの要約: {len(missing)}件の要約を補います")
+    for _ in summarize_stage(iter(missing), cache=cache):
+        pass
+    return cache.misses - misses
+
+
+def reduce_topics(topics, cache, concurrency=None):
+    """トピックごとの要約を並列に作る（保存済みで入力が同じトピックは再利用）"""
+    concurrency = concurrency or int(os.getenv('SUMMARY_CONCURRENCY', '5'))
+    keys = [
+        stage_key('topic', ROLLUP_TOPIC_PROMPT_TEMPLATE, label,
+                  [(article['link'], article['title'], article['summary']) for article in articles])
+        for label, articles in topics
+    ]
+    # キャッシュ（SQLite）の読み書きはこのスレッドだけで行う
+    summaries = [cache.get(key) for key in keys]
+    missing = [index for index, summary in enumerate(summaries) if summary is None]
+
+    results = ordered_map(lambda index: summarize_topic(*topics[index]), missing, concurrency)
+    for index, summary in zip(missing, results):
+        summaries[index] = summary
+        if not is_fallback_summary(summary):
+            cache.set(keys[index], f"rollup:topic:{topics[index][0]}", summary)
+
+    return summaries, len(missing)
+
+
+def reduce_week(period, topics, topic_summaries, cache):
+    """週全体の要約（トピックの要約がすべて同じなら保存済みのものを再利用）"""
+    key = stage_key('week', ROLLUP_WEEK_PROMPT_TEMPLATE, period,
+                    [[label, len(articles), summary] for (label, articles), summary in zip(topics, topic_summaries)])
+    summary = cache.get(key)
+    if summary is not None:
+        return summary, 0
+
+    summary = summarize_week(period, topics, topic_summaries)
+    if not is_fallback_summary(summary):
+        cache.set(key, f"rollup:week:{period}", summary)
+    return summary, 1
+
+
+def build_rollup_post(overview, topics, topic_summaries):
+    """投稿用の記事リスト（トピックを1件として扱う）と、概要を先頭に置いたブロックのグループを作る"""
+    entries = []
+    for (label, articles), summary in zip(topics, topic_summaries):
+        entries.append({
+            'title': f"{label}（{len(articles)}件）",
+            'summary': summary,
+            'link': articles[0]['link'],
+            'related': [{'title': article['title'], 'link': article['link']} for article in articles[1:]],
+        })
+
+    groups = [[section_block(f"*🗓️ 今週の概要*\n{overview}")]]
+    groups += [render_article_blocks(number, entry) for number, entry in enumerate(entries, 1)]
+    return entries, groups
+
+
+def run_weekly_rollup(days=None, now=None, post=True):
+    """直近days日の投稿記事から週間まとめを作り、投稿する（post=Falseなら作成のみ）
+
+    各段の結果は WEEKLY_ROLLUP_CACHE_PATH に保存し、入力が変わらない段は再計算しない。
+    戻り値は投稿（post=Falseなら作成）できたかどうか（対象の記事がなければNone）。
+    """
+    report = get_run_report('weekly_rollup')
+    days = days or float(os.getenv('WEEKLY_ROLLUP_DAYS', '7'))
+    now = now or time.time()
+    period = (f"{datetime.fromtimestamp(now - days * 24 * 60 * 60).strftime('%m/%d')}〜"
+              f"{datetime.fromtimestamp(now).strftime('%m/%d')}")
+
+    archive = ArticleArchive()
+    try:
+        articles = archive.posted_since(now - days * 24 * 60 * 60, now)
+    finally:
+        archive.close()
+    if not articles:
+        print("週間まとめの対象になる投稿記事がありません")
+        return None
+
+    cache = SummaryCache(
+        path=os.getenv('WEEKLY_ROLLUP_CACHE_PATH', DEFAULT_CACHE_PATH),
+        ttl_days=float(os.getenv('WEEKLY_ROLLUP_CACHE_DAYS', '30'))
+    )
+    try:
+        with report.span('rollup_map', items=len(articles)) as span:
+            mapped = span['computed'] = map_articles(articles, cache)
+
+        with report.span('rollup_group', items=len(articles)) as span:
+            topics = group_by_topic(articles)
+            span['topics'] = len(topics)
+        print(f"週間まとめ ({period}): {len(articles)}件 → {len(topics)}トピック")
+
+        with report.span('rollup_reduce_topics', topics=len(topics)) as span:
+            topic_summaries, reduced = reduce_topics(topics, cache)
+            span['computed'] = reduced
+
+        with report.span('rollup_reduce_week') as span:
+            overview, span['computed'] = reduce_week(period, topics, topic_summaries, cache)
+            recomputed = mapped + reduced + span['computed']
+    finally:
+        cache.close()
+
+    report.count('rollup_recomputed', recomputed)
+    print(f"再計算: {recomputed}件（記事・トピック・全体の要約の合計、残りは保存済みの結果を再利用）")
+
+    entries, groups = build_rollup_post(overview, topics, topic_summaries)
+    if not post:
+        return True
+
+    # 投稿先は WEEKLY_ROLLUP_CHANNEL、未設定なら日次投稿の最初のチャンネル
+    channels = load_channel_configs()
+    channel = os.getenv('WEEKLY_ROLLUP_CHANNEL') or (channels[0]['channel'] if channels else None)
+    if not channel:
+        print("WEEKLY_ROLLUP_CHANNELまたはSLACK_CHANNELS_FILEの投稿先チャンネルが設定されていません")
+        return False
+    today = datetime.fromtimestamp(now).strftime("%Y年%m月%d日")
+    return post_full_message_with_debug(
+        entries, os.getenv('SLACK_BOT_TOKEN'), channel, today, groups, heading=f"📅 {period} 週間技術記事まとめ"
+    )
+
+
+def main():
+    """メイン処理"""
+    print("週間まとめを開始...")
+
+    # DRY_RUN_MODE=record/replay/stub でフィクスチャの記録・再生やSlack/Geminiのスタブを使う
+    dry_run = dry_run_from_env()
+
+    try:
+        if not os.getenv('GEMINI_API_KEY'):
+            print("GEMINI_API_KEYが設定されていません")
+            return
+
+        if not os.getenv('SLACK_BOT_TOKEN'):
+            print("SLACK_BOT_TOKENが設定されていません")
+            return
+
+        report = get_run_report('weekly_rollup')
+        try:
+            success = run_weekly_rollup()
+        finally:
+            get_http_client().report()
+            get_usage_ledger().report()
+            get_prompt_budget().report()
+            get_tiered_generator().report()
+            report.set('http', get_http_client().latency_stats())
+            if dry_run is not None:
+                report.set('dry_run', dry_run.mode)
+            report.write()
+    finally:
+        if dry_run is not None:
+            dry_run.finish()
+
+    if success:
+        print("週間まとめを投稿しました！")
+    elif success is not None:
+        print("週間まとめの投稿に失敗しました")
+
+
+if __name__ == "__main__":
+    main()
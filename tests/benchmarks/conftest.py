@@ -0,0 +1,167 @@
+"""
+日次パイプラインのベンチマーク（pytest-benchmark）
+チェックイン済みのフィクスチャ（はてブRSS・記事HTML）をドライランのリプレイで返し、ネットワークを使わずに計測する。
+時間はpytest-benchmarkが計測し、割当のピーク・確保中のブロック数の増減・最大RSSとケースごとの値を extra_info に残す。
+通常のテスト実行では飛ばし、--benchmark-only を付けた場合だけ実行する:
+
+  python -m pytest tests/benchmarks --benchmark-only \\
+      --benchmark-autosave --benchmark-storage=.cache/benchmarks \\
+      --benchmark-compare --benchmark-compare-fail=median:20%
+
+--benchmark-autosave で結果をコミットごとに保存し、--benchmark-compare で前回の結果と比べる
+（--benchmark-compare-fail を付けると、中央値が20%以上遅くなったケースで失敗する）。
+"""
+
+import os
+import sys
+import gzip
+import json
+import base64
+import shutil
+import resource
+import statistics
+import tracemalloc
+
+import pytest
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+HUGE_FEED_URL = "https://b.hatena.ne.jp/hotentry/huge.rss"
+
+
+def pytest_collection_modifyitems(config, items):
+    """ベンチマークは --benchmark-only を付けた場合だけ実行する"""
+    if config.getoption('benchmark_only', default=False):
+        return
+    skip = pytest.mark.skip(reason="ベンチマークは --benchmark-only を付けて実行する")
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for item in items:
+        if str(item.path).startswith(directory + os.sep):
+            item.add_marker(skip)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    """ケースごとに残した値（割当・RSS・ケース固有の値）を表示する"""
+    session = getattr(config, '_benchmarksession', None)
+    benchmarks = [bench for bench in getattr(session, 'benchmarks', []) if bench.extra_info]
+    if not benchmarks:
+        return
+    terminalreporter.section("ベンチマークの追加の値")
+    for bench in benchmarks:
+        values = " / ".join(f"{name}={value:g}" if isinstance(value, (int, float)) else f"{name}={value}"
+                            for name, value in sorted(bench.extra_info.items()))
+        terminalreporter.write_line(f"{bench.name}: {values}")
+
+
+@pytest.fixture(scope='session')
+def replay_fixture_dir(tmp_path_factory):
+    """リプレイ用のフィクスチャ（チェックイン済みの記録に、圧縮して置いている巨大なフィードを加えたもの）"""
+    directory = tmp_path_factory.mktemp('benchmark_fixtures')
+    shutil.copy(os.path.join(FIXTURE_DIR, 'gemini.json'), directory / 'gemini.json')
+    with open(os.path.join(FIXTURE_DIR, 'http.json'), encoding='utf-8') as f:
+        exchanges = json.load(f)
+    with gzip.open(os.path.join(FIXTURE_DIR, 'hotentry_huge.rss.gz')) as f:
+        exchanges.append({
+            'method': 'GET', 'url': HUGE_FEED_URL, 'status': 200,
+            'headers': {'Content-Type': 'application/rss+xml; charset=utf-8'},
+            'body': base64.b64encode(f.read()).decode('ascii'),
+        })
+    with open(directory / 'http.json', 'w', encoding='utf-8') as f:
+        json.dump(exchanges, f)
+    return str(directory)
+
+
+@pytest.fixture(autouse=True)
+def benchmark_environment(replay_fixture_dir, monkeypatch):
+    """リプレイ・レート制限なしの環境にし、環境変数から作られる共有オブジェクトをケースごとに作り直す"""
+    import feed_store
+    import http_client
+    import llm_resilience
+    import prompt_budget
+    import rate_limiter
+
+    for name, value in {
+        'DRY_RUN_MODE': 'replay',
+        'DRY_RUN_FIXTURES': replay_fixture_dir,
+        'DRY_RUN_SEED': '0',
+        'GEMINI_RPM': '1000000',
+        'GEMINI_TPM': '1000000000',
+        'SLACK_POSTS_PER_MINUTE': '1000000',
+        'FEED_SOURCES': 'hatena:it',
+        'GEMINI_API_KEY': 'benchmark',
+        'SLACK_BOT_TOKEN': 'xoxb-benchmark',
+        'SLACK_CHANNEL': '#benchmark',
+    }.items():
+        monkeypatch.setenv(name, value)
+    for name in ('SLACK_CHANNELS', 'SLACK_CHANNELS_FILE', 'RUN_REPORT_PATH', 'RUN_REPORT_PROMETHEUS_PATH'):
+        monkeypatch.delenv(name, raising=False)
+    for module, name in ((feed_store, '_default_store'), (http_client, '_default_client'),
+                         (llm_resilience, '_default_generator'), (prompt_budget, '_default_budget'),
+                         (rate_limiter, '_rate_limiter'), (rate_limiter, '_usage_ledger')):
+        monkeypatch.setattr(module, name, None)
+
+
+@pytest.fixture
+def start_replay(monkeypatch):
+    """start_replay(**env) で環境変数（スタブの遅延など）を設定してからリプレイを有効にする（終了時に片付ける）
+
+    スタブの遅延は有効化する時点で読まれるため、遅延を入れるケースはこちらを使う。
+    """
+    from dry_run import dry_run_from_env
+
+    started = []
+
+    def start(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        started.append(dry_run_from_env())
+        return started[-1]
+
+    yield start
+    for dry_run in reversed(started):
+        dry_run.finish()
+
+
+@pytest.fixture
+def replay(start_replay):
+    """ケースの間だけドライランのリプレイを有効にする（終了時に差し替えと一時ディレクトリを片付ける）"""
+    return start_replay()
+
+
+@pytest.fixture
+def measure(benchmark):
+    """measure(fn, rounds) でfnの時間を計測し、メモリとfn.metricsの値を extra_info に残す
+
+    初回（import・接続・キャッシュ作成）は計測から除く。メモリの計測はtracemallocのオーバーヘッドが
+    時間に乗らないよう、別の1回で行う。fn.metrics（1回ごとの値のリスト）があれば、計測した回の中央値を残す。
+    最大RSSはプロセス全体の値なので、ケースの前後の増分も残す。
+    """
+    def run(fn, rounds):
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        benchmark.pedantic(fn, rounds=rounds, iterations=1, warmup_rounds=1)
+
+        blocks_before = sys.getallocatedblocks()
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        blocks_after = sys.getallocatedblocks()
+        # Linuxのru_maxrssはKB単位
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        metrics = getattr(fn, 'metrics', [])[1:1 + rounds]
+        benchmark.extra_info.update({
+            name: statistics.median(values)
+            for name in sorted({name for metric in metrics for name in metric})
+            if (values := [metric[name] for metric in metrics if metric.get(name) is not None])
+        })
+        benchmark.extra_info.update({
+            'peak_alloc_bytes': peak,
+            'net_alloc_blocks': blocks_after - blocks_before,
+            'peak_rss_kb': rss_after,
+            'rss_growth_kb': rss_after - rss_before,
+        })
+        return benchmark.extra_info
+
+    return run
@@ -0,0 +1,40 @@
+"""
+ベンチマーク用の合成データ（固定シード）
+チェックイン済みのフィクスチャのフィード・記事ページも、同じシードのタイトルから作っている
+"""
+
+import random
+
+FEED_URL = "https://b.hatena.ne.jp/hotentry/{category}.rss"
+ARTICLE_URL = "https://example.com/articles/{index}"
+
+WORDS = ['Rust', 'Go', 'TypeScript', 'Python', 'Kubernetes', 'LLM', 'PostgreSQL', 'React', 'WebAssembly',
+         'セキュリティ', '設計', 'パフォーマンス', '入門', '運用', '移行', '自動化', 'テスト', '可観測性']
+
+
+def make_titles(count, seed=42):
+    rng = random.Random(seed)
+    return [f"{' '.join(rng.sample(WORDS, 4))}の話 #{index}" for index in range(count)]
+
+
+def make_articles_summary(count):
+    """要約済みの記事リスト（3件に1件は類似記事付き）"""
+    return [
+        {
+            'title': title,
+            'summary': f"{title}の要約です。" * 8,
+            'link': ARTICLE_URL.format(index=index),
+            'description': f"{title}についての解説記事です。",
+            'related': [{'title': f"{title}（関連）", 'link': ARTICLE_URL.format(index=index) + "?related"}] if index % 3 == 0 else [],
+        }
+        for index, title in enumerate(make_titles(count))
+    ]
+
+
+def make_summarize_inputs(count):
+    """要約前の記事リスト（本文の抜粋付き）"""
+    return [
+        {'title': article['title'], 'description': article['description'], 'link': article['link'],
+         'content': "本文の抜粋です。" * 50}
+        for article in make_articles_summary(count)
+    ]
@@ -0,0 +1,54 @@
+"""
+記事アーカイブの検索: 10万件（うち半数は投稿済み）のアーカイブで、全文検索と短い語句の検索を計測する
+短い語句はLIKEの走査になるため、走査する件数の上限（既定5000件）と全件走査を比べる
+"""
+
+import time
+
+import pytest
+
+from synthetic import ARTICLE_URL, make_titles
+
+ARTICLE_COUNT = 100000
+
+
+@pytest.fixture(scope='module')
+def archive_path(tmp_path_factory):
+    from article_archive import ArticleArchive
+
+    path = str(tmp_path_factory.mktemp('archive') / 'archive.sqlite3')
+    archive = ArticleArchive(path=path)
+    articles = [
+        {'title': title, 'link': ARTICLE_URL.format(index=index), 'description': f"{title}についての解説記事です。",
+         'summary': f"{title}の要約です。" * 4}
+        for index, title in enumerate(make_titles(ARTICLE_COUNT))
+    ]
+    archive.ingest(articles)
+    now = time.time()
+    for start in range(0, ARTICLE_COUNT, 2000):
+        archive.record_posts(articles[start:start + 1000], posted_at=now - (ARTICLE_COUNT - start))
+    archive.close()
+    return path
+
+
+@pytest.fixture
+def archive(archive_path):
+    from article_archive import ArticleArchive
+
+    archive = ArticleArchive(path=archive_path)
+    yield archive
+    archive.close()
+
+
+def test_archive_search_fts(measure, archive):
+    assert archive.search("PostgreSQL")
+    measure(lambda: archive.search("PostgreSQL"), rounds=20)
+
+
+@pytest.mark.benchmark(group='archive_search_short')
+@pytest.mark.parametrize('rows', [5000, ARTICLE_COUNT], ids=['capped', 'full_scan'])
+def test_archive_search_short(measure, archive, rows):
+    archive.short_search_rows = rows
+    # ほとんどの記事に一致しない語句で、走査する件数の差を見る
+    assert archive.search("Zx") == []
+    measure(lambda: archive.search("Zx"), rounds=10)
@@ -0,0 +1,17 @@
+"""
+Block Kitの組み立て: 5件・40件のダイジェスト
+"""
+
+from synthetic import make_articles_summary
+
+
+def test_blocks_5(measure):
+    from pipeline.slack import build_digest_messages
+    articles = make_articles_summary(5)
+    measure(lambda: build_digest_messages(articles, "2024年01月01日"), rounds=50)
+
+
+def test_blocks_40(measure):
+    from pipeline.slack import build_digest_messages
+    articles = make_articles_summary(40)
+    measure(lambda: build_digest_messages(articles, "2024年01月01日"), rounds=20)
@@ -0,0 +1,42 @@
+"""
+類似記事のクラスタリング: 3000件（うち300件は直前の記事の見出しを少し変えた近似重複）をまとめる
+まとめた件数（merged）も残し、近似重複の300件を取りこぼしていないかを見る
+"""
+
+import random
+
+from synthetic import ARTICLE_URL, WORDS
+
+KANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモラリルレロガギグゲゴザジズゼゾバビブベボパピプペポ"
+
+
+def make_articles():
+    rng = random.Random(13)
+
+    def word():
+        return ''.join(rng.choice(KANA) for _ in range(rng.randint(3, 6)))
+
+    articles = []
+    for index in range(2700):
+        title = f"{word()}の{rng.choice(WORDS)}で{word()}を{word()}する"
+        article = {'title': title, 'link': ARTICLE_URL.format(index=index),
+                   'description': f"{word()}と{word()}を使った{word()}の事例"}
+        articles.append(article)
+        if index % 9 == 0:
+            articles.append({'title': f"【速報】{title}", 'link': article['link'] + "?dup",
+                             'description': article['description']})
+    return articles
+
+
+def test_cluster_3000(measure):
+    from dedup import cluster_articles
+
+    articles = make_articles()
+    metrics = []
+
+    def run():
+        representatives = cluster_articles(articles, embed_fn=None)
+        metrics.append({'merged': len(articles) - len(representatives)})
+
+    run.metrics = metrics
+    measure(run, rounds=5)
@@ -0,0 +1,17 @@
+"""
+フィード解析: 小さなフィード（30件）と巨大なフィード（20000件）の上位5件・全件
+"""
+
+from feed_sources import get_hatena_tech_articles
+
+
+def test_feed_parse_small(measure, replay):
+    measure(lambda: get_hatena_tech_articles('it', limit=30), rounds=20)
+
+
+def test_feed_parse_huge_top5(measure, replay):
+    measure(lambda: get_hatena_tech_articles('huge', limit=5), rounds=20)
+
+
+def test_feed_parse_huge_all(measure, replay):
+    measure(lambda: get_hatena_tech_articles('huge', limit=20000, timeout=60), rounds=3)
@@ -0,0 +1,74 @@
+"""
+フィード解析の方式の比較: 20000件のフィード（要素ごとに改行、64KBずつ受信）の上位5件を取り出す
+ストリーミング解析・全体を読み込むElementTree・置き換える前の行単位の解析で、時間と割当のピーク（peak_alloc_bytes）を比べる
+"""
+
+import os
+import gzip
+import html
+from xml.etree import ElementTree
+
+import pytest
+
+from synthetic import ARTICLE_URL
+
+HUGE_FEED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'hotentry_huge.rss.gz')
+
+
+def legacy_line_parse(text, limit=5):
+    """比較用: ストリーミング解析に置き換える前の行単位の解析（本文全体を読み込み、1行ずつ文字列で判定）"""
+    items = []
+    current_item = {}
+    in_item = False
+    for line in text.split('\n'):
+        line = line.strip()
+        if '<item ' in line and 'rdf:about=' in line:
+            in_item = True
+            current_item = {}
+        elif '</item>' in line:
+            if current_item and len(items) < limit:
+                items.append(current_item)
+            in_item = False
+            current_item = {}
+        elif in_item:
+            if '<title>' in line:
+                current_item['title'] = html.unescape(line.replace('<title>', '').replace('</title>', '').strip())
+            elif '<link>' in line:
+                current_item['link'] = line.replace('<link>', '').replace('</link>', '').strip()
+            elif '<description>' in line:
+                current_item['description'] = html.unescape(
+                    line.replace('<description>', '').replace('</description>', '').strip()
+                )
+    return items[:limit]
+
+
+def streaming_parse(chunks):
+    from feed_parser import iter_feed_items
+    return list(iter_feed_items(iter(chunks), limit=5))
+
+
+def full_parse(chunks):
+    from feed_parser import ITEM_TAGS, element_to_article, local_name
+    root = ElementTree.fromstring(b''.join(chunks))
+    items = [element for element in root.iter() if local_name(element.tag) in ITEM_TAGS]
+    return [element_to_article(element) for element in items][:5]
+
+
+def line_parse(chunks):
+    return legacy_line_parse(b''.join(chunks).decode('utf-8'))
+
+
+@pytest.fixture(scope='module')
+def chunks():
+    with gzip.open(HUGE_FEED_PATH) as f:
+        data = f.read().replace(b'><', b'>\n<')
+    return [data[start:start + 65536] for start in range(0, len(data), 65536)]
+
+
+@pytest.mark.benchmark(group='feed_parse_compare')
+@pytest.mark.parametrize('parse', [streaming_parse, full_parse, line_parse], ids=lambda parse: parse.__name__)
+def test_feed_parse_compare(measure, chunks, parse):
+    articles = parse(chunks)
+    assert [article['link'] for article in articles] == [ARTICLE_URL.format(index=index) for index in range(5)]
+
+    measure(lambda: parse(chunks), rounds=5)
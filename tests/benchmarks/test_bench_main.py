@@ -0,0 +1,38 @@
+"""
+main全体: フィードの取得から要約・Slackスタブへの投稿まで（main() がリプレイの有効化と解除を自分で行う）
+main_progressive はSlack/Geminiスタブに遅延を入れ、一括投稿と逐次投稿それぞれの最初の投稿・完了までの時間を残す
+"""
+
+import os
+
+import pytest
+
+import daily_post
+
+
+def test_main(measure):
+    measure(daily_post.main, rounds=3)
+
+
+@pytest.mark.benchmark(group='main_progressive')
+@pytest.mark.parametrize('progressive', [False, True], ids=['batch', 'progressive'])
+def test_main_progressive(measure, monkeypatch, progressive):
+    from run_report import reset_run_report
+
+    for name, value in {
+        'PROGRESSIVE_POST': 'true' if progressive else 'false',
+        # フィクスチャの記事は似た内容でまとめられてしまうため、5件そのまま流す
+        'DEDUP_ARTICLES': 'false',
+        'DRY_RUN_GEMINI_LATENCY': os.getenv('BENCHMARK_GEMINI_LATENCY', '0.3'),
+        'DRY_RUN_SLACK_LATENCY': os.getenv('BENCHMARK_SLACK_LATENCY', '0.05'),
+    }.items():
+        monkeypatch.setenv(name, value)
+    metrics = []
+
+    def run():
+        report = reset_run_report('daily_post')
+        daily_post.main()
+        metrics.append({name: report.extra.get(name) for name in ('time_to_first_post', 'time_to_complete')})
+
+    run.metrics = metrics
+    measure(run, rounds=3)
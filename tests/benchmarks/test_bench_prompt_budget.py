@@ -0,0 +1,39 @@
+"""
+プロンプトの入力予算: 定型文混じりの長い本文を持つ2000件の記事を、1件1200トークンの入力予算に収める
+"""
+
+import random
+
+from synthetic import WORDS, make_titles
+
+BOILERPLATE = ["シェアする", "ツイート", "関連記事", "この記事を読んだ人はこんな記事も読んでいます", "© 2024 Example Inc."]
+
+
+def make_articles(count, seed=7):
+    rng = random.Random(seed)
+    articles = []
+    for title in make_titles(count):
+        lines = []
+        for number in range(rng.randint(20, 80)):
+            words = rng.sample(WORDS, 3)
+            lines.append(f"{words[0]}と{words[1]}を使った{words[2]}の手順{number}を説明します。　設定値は ＡＰＩ　の&amp;仕様に従います。")
+            if number % 10 == 0:
+                lines.extend(BOILERPLATE)
+        articles.append((title, f"{title}についての解説記事です。", "\n".join(lines)))
+    return articles
+
+
+def test_compress_2000(measure):
+    from prompt_budget import PromptBudget
+
+    articles = make_articles(2000)
+    metrics = []
+
+    def run():
+        budget = PromptBudget()
+        for title, description, content in articles:
+            budget.fit(title, description, content, 1200)
+        metrics.append({'tokens_saved_ratio': 1 - budget.tokens_after / budget.tokens_before})
+
+    run.metrics = metrics
+    measure(run, rounds=3)
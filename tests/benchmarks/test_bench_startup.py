@@ -0,0 +1,65 @@
+"""
+起動とGeminiクライアントの準備: エントリポイントのimport時間と、1回の要約ごとにかかるモデルの準備
+startup は新しいプロセスでエントリポイントをimportし、その時点でSDKを読み込んでいないことも確かめる。
+gemini_model はSDKが入っている場合だけ、呼び出しごとに configure と GenerativeModel を作る方式（以前の方式）と
+共有のモデルを使い回す get_model を比べる
+"""
+
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'scripts')
+ENTRY = "import sys, daily_post, tech_news_bot, weekly_rollup, daemon; print('google.generativeai' in sys.modules)"
+
+
+def test_startup(measure):
+    metrics = []
+
+    def timed(code):
+        started = time.perf_counter()
+        process = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=SCRIPTS_DIR)
+        return time.perf_counter() - started, process
+
+    def run():
+        import_time, process = timed(ENTRY)
+        assert process.returncode == 0, process.stderr
+        assert process.stdout.strip().splitlines()[-1] == 'False', "import時点でgoogle.generativeaiが読み込まれています"
+        baseline, _ = timed("pass")
+        genai_time, genai = timed("import google.generativeai")
+        metrics.append({
+            'startup_import': import_time - baseline,
+            # SDKが入っていない環境では計測しない
+            'genai_import': genai_time - baseline if genai.returncode == 0 else None,
+        })
+
+    run.metrics = metrics
+    measure(run, rounds=5)
+
+
+@pytest.fixture
+def genai(monkeypatch):
+    genai = pytest.importorskip('google.generativeai')
+    import llm_client
+
+    monkeypatch.setattr(llm_client, '_models', {})
+    return genai
+
+
+def configure_per_call(genai):
+    genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+    return genai.GenerativeModel('gemini-2.5-flash')
+
+
+def shared_model(genai):
+    from llm_client import get_model
+    return get_model('gemini-2.5-flash')
+
+
+@pytest.mark.benchmark(group='gemini_model')
+@pytest.mark.parametrize('prepare', [configure_per_call, shared_model], ids=lambda prepare: prepare.__name__)
+def test_gemini_model_per_call(measure, genai, prepare):
+    measure(lambda: prepare(genai), rounds=200)
@@ -0,0 +1,78 @@
+"""
+要約の並列処理: Geminiスタブで30件を並列数5で要約する
+summarize_speedup は遅延ありのスタブで5・20・100件を逐次・並列に要約し、それぞれの所要時間と速度比を残す
+summarize_batch_compare は遅延ありのスタブで20件を1件ずつ・5件ずつまとめて要約し、それぞれの利用量と所要時間を残す
+（スタブの遅延はプロンプトの長さによらず一定なので、時間の差はリクエスト数の差を表す）
+"""
+
+import os
+import time
+
+import pytest
+
+from synthetic import ARTICLE_URL, make_summarize_inputs, make_titles
+
+
+def test_summarize_30(measure, replay):
+    from pipeline import summarize_articles
+    articles = make_summarize_inputs(30)
+    measure(lambda: summarize_articles(articles, concurrency=5), rounds=5)
+
+
+@pytest.mark.benchmark(group='summarize_speedup')
+@pytest.mark.parametrize('count', [5, 20, 100])
+def test_summarize_speedup(measure, start_replay, count):
+    from pipeline import summarize_articles
+
+    start_replay(DRY_RUN_GEMINI_LATENCY=os.getenv('BENCHMARK_SUMMARY_LATENCY', '0.05'))
+    concurrency = int(os.getenv('SUMMARY_CONCURRENCY', '5'))
+    articles = make_summarize_inputs(count)
+    metrics = []
+
+    def run():
+        started = time.perf_counter()
+        summarize_articles(articles, concurrency=1)
+        sequential = time.perf_counter() - started
+        started = time.perf_counter()
+        summarize_articles(articles, concurrency=concurrency)
+        concurrent = time.perf_counter() - started
+        metrics.append({'sequential': sequential, 'concurrent': concurrent, 'speedup': sequential / concurrent})
+
+    run.metrics = metrics
+    measure(run, rounds=3)
+
+
+def test_summarize_batch_compare(measure, start_replay):
+    from pipeline import summarize_articles
+    from rate_limiter import get_usage_ledger
+
+    start_replay(DRY_RUN_GEMINI_LATENCY=os.getenv('BENCHMARK_SUMMARY_LATENCY', '0.05'))
+    articles = [
+        {'title': title, 'description': f"{title}についての解説記事です。", 'link': ARTICLE_URL.format(index=index),
+         'content': "".join(f"段落{number}: {title}の設定例と計測結果を交えて、導入時の注意点を説明します。"
+                            for number in range(12))}
+        for index, title in enumerate(make_titles(20))
+    ]
+    ledger = get_usage_ledger()
+    metrics = []
+
+    def summarize(batch_size):
+        before = dict(ledger.run)
+        started = time.perf_counter()
+        summaries = summarize_articles(articles, concurrency=5, batch_size=batch_size)
+        elapsed = time.perf_counter() - started
+        assert all(summary.startswith("（ドライラン要約）") for summary in summaries)
+        return elapsed, {name: ledger.run[name] - before[name] for name in ('requests', 'input_tokens', 'output_tokens')}
+
+    def run():
+        single_time, single = summarize(1)
+        batch_time, batch = summarize(5)
+        metrics.append({
+            'single_time': single_time, 'single_requests': single['requests'],
+            'single_tokens': single['input_tokens'] + single['output_tokens'],
+            'batch_time': batch_time, 'batch_requests': batch['requests'],
+            'batch_tokens': batch['input_tokens'] + batch['output_tokens'],
+        })
+
+    run.metrics = metrics
+    measure(run, rounds=3)
@@ -0,0 +1,53 @@
+"""
+段付き・ヘッジ付きの生成: 遅延の裾（10%が1秒）とエラー（5%）を注入した偽のバックエンドに100件送る
+"""
+
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+
+def test_tiers_spiky(measure, monkeypatch):
+    from llm_resilience import TieredGenerator
+
+    for name, value in {'GEMINI_HEDGE_MIN_SAMPLES': '10', 'GEMINI_HEDGE_PERCENTILE': '0.8',
+                        'GEMINI_HEDGE_MIN_DELAY': '0.05', 'GEMINI_TIER_TIMEOUT': '2'}.items():
+        monkeypatch.setenv(name, value)
+    rng = random.Random(3)
+    lock = threading.Lock()
+
+    def backend(model_name, prompt, generation_config=None, queued=None, cancel=None):
+        with lock:
+            spike, error = rng.random() < 0.1, rng.random() < 0.05
+        time.sleep(1.0 if spike else 0.02)
+        if error:
+            raise RuntimeError("503 Service Unavailable (fake backend)")
+        return Response(f"{model_name}: {prompt}")
+
+    metrics = []
+
+    def run():
+        generator = TieredGenerator(['fallback'], generate_fn=backend)
+
+        def call(index):
+            started = time.perf_counter()
+            generator.generate(f"記事{index}", 'primary')
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            latencies = sorted(executor.map(call, range(100)))
+        tiers = generator.snapshot()
+        metrics.append({
+            'call_p99': latencies[98],
+            'hedges': tiers['primary']['hedges'],
+            'fallback_calls': tiers.get('fallback', {}).get('calls', 0),
+        })
+
+    run.metrics = metrics
+    measure(run, rounds=3)
@@ -0,0 +1,57 @@
+"""
+週間まとめ: 7日分・35件の投稿記事から、Geminiスタブ（遅延あり）で週間まとめを作る（投稿はしない）
+cold は毎回空の中間結果から、warm は前回の中間結果を再利用して作り、再計算した段の数も残す
+"""
+
+import os
+import time
+
+import pytest
+
+from synthetic import make_articles_summary
+
+
+@pytest.fixture
+def rollup(start_replay, tmp_path, monkeypatch):
+    """記事アーカイブに7日分の投稿を入れ、rollup(cold) で計測する関数を返す"""
+    import weekly_rollup
+    from article_archive import ArticleArchive
+    from run_report import reset_run_report
+
+    start_replay(DRY_RUN_GEMINI_LATENCY=os.getenv('BENCHMARK_GEMINI_LATENCY', '0.3'))
+    now = time.time()
+    articles = make_articles_summary(35)
+    # 日次投稿で要約が残らなかった記事（5件に1件）は週間まとめの側で要約し直す
+    for index, article in enumerate(articles):
+        if index % 5 == 4:
+            article['summary'] = ''
+
+    archive = ArticleArchive()
+    archive.ingest(articles)
+    for day in range(7):
+        archive.record_posts(articles[day * 5:(day + 1) * 5], posted_at=now - (7 - day) * 24 * 60 * 60 + 60)
+    archive.close()
+
+    def prepare(cold):
+        metrics = []
+        caches = iter(range(1000))
+
+        def run():
+            if cold:
+                monkeypatch.setenv('WEEKLY_ROLLUP_CACHE_PATH', str(tmp_path / f"rollup_cache_{next(caches)}.sqlite3"))
+            report = reset_run_report('weekly_rollup')
+            weekly_rollup.run_weekly_rollup(now=now, post=False)
+            metrics.append({'recomputed': report.counters.get('rollup_recomputed', 0)})
+
+        run.metrics = metrics
+        return run
+
+    return prepare
+
+
+def test_weekly_rollup_cold(measure, rollup):
+    measure(rollup(cold=True), rounds=3)
+
+
+def test_weekly_rollup_warm(measure, rollup):
+    measure(rollup(cold=False), rounds=3)
@@ -0,0 +1,86 @@
+"""
+テスト共通の設定
+scripts/ のモジュールを直接importできるようにし、状態ファイルは一時ディレクトリに向ける。
+stub_server はローカルのHTTPスタブ（http.server）を起動し、受けたリクエストを記録する
+"""
+
+import os
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """SQLiteやJSONの状態ファイルを一時ディレクトリに置き、実行レポートをテストごとに作り直す"""
+    from dry_run import STATE_PATH_VARS
+    from run_report import reset_run_report
+
+    for name, filename in STATE_PATH_VARS.items():
+        monkeypatch.setenv(name, str(tmp_path / filename))
+    monkeypatch.delenv('DRY_RUN_MODE', raising=False)
+    reset_run_report()
+    yield
+
+
+class StubServer:
+    """handler(request) -> (status, headers, body) で応答するローカルHTTPサーバー"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                request = {'method': self.command, 'path': self.path, 'headers': dict(self.headers), 'body': body}
+                stub.requests.append(request)
+
+                status, headers, payload = stub.handler(request)
+                if isinstance(payload, (dict, list)):
+                    payload = json.dumps(payload).encode('utf-8')
+                    headers = {'Content-Type': 'application/json', **headers}
+                payload = payload or b''
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = respond
+            do_POST = respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    """stub_server(handler) でスタブを起動する（テスト終了時に停止）"""
+    servers = []
+
+    def start(handler):
+        server = StubServer(handler)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
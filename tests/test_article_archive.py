@@ -0,0 +1,152 @@
+"""
+記事アーカイブ: 短い語句の検索と、類似記事としてまとめた記事の登録・投稿済みの記録を確かめる
+投稿は履歴として追記し、旧形式（articles に投稿日時を上書きしていた）のアーカイブは初回に移行する
+"""
+
+import sqlite3
+import time
+
+import pytest
+
+from article_archive import ArticleArchive
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = ArticleArchive(path=str(tmp_path / 'archive.sqlite3'))
+    yield archive
+    archive.close()
+
+
+ARTICLES = [
+    {'title': "生成AIで変わるコードレビュー", 'link': "https://example.com/ai", 'description': "LLMの活用例"},
+    {'title': "Go 1.22の新機能", 'link': "https://example.com/go", 'description': "ループ変数の変更"},
+    {'title': "Rustで書くWebサーバー", 'link': "https://example.com/rust", 'description': "axum入門"},
+    {'title': "100%_の罠", 'link': "https://example.com/percent", 'description': "LIKEの特殊文字"},
+]
+
+
+def test_short_queries_fall_back_to_like(archive):
+    archive.ingest(ARTICLES)
+
+    assert [row['link'] for row in archive.search("AI")] == ["https://example.com/ai"]
+    # ASCIIは大文字・小文字を区別しない
+    assert [row['link'] for row in archive.search("go")] == ["https://example.com/go"]
+    assert [row['link'] for row in archive.search("%_")] == ["https://example.com/percent"]
+    assert archive.search("%") == [{'link': "https://example.com/percent", 'title': "100%_の罠",
+                                    'summary': None, 'posted_at': None}]
+    assert archive.search(" ") == []
+
+
+def test_three_or_more_characters_use_full_text_index(archive):
+    archive.ingest(ARTICLES)
+
+    assert [row['link'] for row in archive.search("Rust")] == ["https://example.com/rust"]
+    assert [row['link'] for row in archive.search("コードレビュー")] == ["https://example.com/ai"]
+
+
+def test_related_articles_are_archived_and_marked_posted(archive):
+    cluster = {
+        'title': "Go 1.22リリース", 'link': "https://example.com/go-release", 'description': "まとめ",
+        'source': 'hatena:it', 'summary': "Go 1.22の要約",
+        'related': [
+            {'title': "Go 1.22 is released", 'link': "https://go.dev/blog/go1.22"},
+            {'title': "Go 1.22の変更点", 'link': "https://example.com/go-changes"},
+        ],
+    }
+
+    # まとめられた類似記事も登録する
+    assert archive.ingest([cluster]) == 3
+    assert [row['link'] for row in archive.search("released")] == ["https://go.dev/blog/go1.22"]
+
+    posted_at = time.time()
+    archive.record_posts([cluster], posted_at=posted_at)
+
+    # 類似記事も投稿済みとして扱い、後の実行で代表記事として再び投稿しない
+    later = [{'title': "Go 1.22の変更点", 'link': "https://example.com/go-changes?utm_source=x"}]
+    assert archive.filter_recently_posted(later, days=7) == []
+
+    # 週間まとめには要約付きで投稿した代表記事だけを含める
+    assert [row['link'] for row in archive.posted_since(posted_at - 1)] == ["https://example.com/go-release"]
+
+
+def test_posts_are_appended_not_overwritten(archive):
+    archive.ingest(ARTICLES[:2])
+    archive.record_posts([dict(ARTICLES[0], summary="1回目の要約")], posted_at=1000.0)
+    archive.record_posts([dict(ARTICLES[0], summary="2回目の要約")], posted_at=2000.0)
+
+    # 投稿のたびに1行追記し、記事の行は書き換えない
+    assert archive.conn.execute("SELECT article_id, posted_at, summary FROM posts ORDER BY id").fetchall() == [
+        (1, 1000.0, "1回目の要約"), (1, 2000.0, "2回目の要約")]
+    assert [(row['summary'], row['posted_at']) for row in archive.posted_since(0)] == [
+        ("1回目の要約", 1000.0), ("2回目の要約", 2000.0)]
+    # 検索結果は最後に投稿した要約と日時
+    assert archive.search("コードレビュー") == [{'link': "https://example.com/ai", 'title': ARTICLES[0]['title'],
+                                            'summary': "2回目の要約", 'posted_at': 2000.0}]
+    assert [row['link'] for row in archive.search("2回目")] == ["https://example.com/ai"]
+    # 登録していない記事の投稿は記録しない
+    archive.record_posts([dict(ARTICLES[3], summary="未登録")])
+    assert archive.conn.execute("SELECT COUNT(*) FROM posts").fetchone() == (2,)
+
+
+def test_short_query_scans_only_newest_rows(archive):
+    archive.short_search_rows = 3
+    archive.ingest([{'title': f"AI記事{index}", 'link': f"https://example.com/{index}"} for index in range(10)])
+
+    # 新しく登録した3件だけを走査し、新しい順に返す
+    assert [row['link'] for row in archive.search("AI")] == [
+        "https://example.com/9", "https://example.com/8", "https://example.com/7"]
+    # 投稿済みの記事は投稿日時で並べる
+    archive.record_posts([{'title': "AI記事7", 'link': "https://example.com/7", 'summary': "要約"}],
+                         posted_at=time.time() + 60)
+    assert [row['link'] for row in archive.search("AI", limit=1)] == ["https://example.com/7"]
+
+
+LEGACY_SCHEMA = """
+CREATE TABLE articles (
+    id INTEGER PRIMARY KEY, canonical_url TEXT NOT NULL UNIQUE, link TEXT NOT NULL, title TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '', summary TEXT, source TEXT, fetched_at REAL NOT NULL, posted_at REAL
+);
+CREATE INDEX idx_articles_posted_at ON articles (posted_at);
+CREATE VIRTUAL TABLE articles_fts USING fts5(
+    title, description, summary, content='articles', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, title, description, summary)
+    VALUES (new.id, new.title, new.description, COALESCE(new.summary, ''));
+END;
+"""
+
+
+def test_legacy_archive_is_migrated_to_post_history(tmp_path, capsys):
+    path = str(tmp_path / 'archive.sqlite3')
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    now = time.time()
+    conn.executemany(
+        "INSERT INTO articles (canonical_url, link, title, description, summary, fetched_at, posted_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [("//example.com/rust", "https://example.com/rust", "Rustで書くWebサーバー", "axum入門", "Rustの要約", now, now - 60),
+         ("//example.com/go", "https://example.com/go", "Go 1.22の新機能", "", None, now, now - 60),
+         ("//example.com/ai", "https://example.com/ai", "生成AIで変わるコードレビュー", "", None, now, None)]
+    )
+    conn.commit()
+    conn.close()
+
+    archive = ArticleArchive(path=path)
+    try:
+        assert "投稿履歴の形式に移行しました (2件)" in capsys.readouterr().out
+        assert archive.recently_posted(["https://example.com/rust", "https://example.com/go",
+                                        "https://example.com/ai"], days=1) == {"//example.com/rust", "//example.com/go"}
+        assert [row['link'] for row in archive.posted_since(now - 3600)] == ["https://example.com/rust"]
+        assert archive.search("Rust")[0]['summary'] == "Rustの要約"
+        assert [row['link'] for row in archive.search("AI")] == ["https://example.com/ai"]
+        # 移行後の登録も検索できる
+        archive.ingest([{'title': "Zigで書くWebサーバー", 'link': "https://example.com/zig"}])
+        assert [row['link'] for row in archive.search("Zig")] == ["https://example.com/zig"]
+    finally:
+        archive.close()
+
+    # 2回目以降は移行しない
+    ArticleArchive(path=path).close()
+    assert "移行しました" not in capsys.readouterr().out
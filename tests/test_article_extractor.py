@@ -0,0 +1,100 @@
+"""
+記事本文の抽出: 段落の分解と本文の選び方、トークン予算での切り詰め、ローカルのHTTPスタブでサイズ上限と文字コードを確かめる
+"""
+
+from article_extractor import (
+    ContentParser, ContentStore, extract_article, extract_main_text, fetch_article_html, truncate_to_tokens,
+)
+from rate_limiter import estimate_tokens
+
+PARAGRAPH = "所有権と借用の規則を、実際のコードを動かしながら順番に確認していきます。"
+
+
+def test_content_parser_splits_blocks_and_skips_chrome():
+    parser = ContentParser()
+    parser.feed(
+        "<html><head><style>p { color: red }</style><script>var p = 1;</script></head><body>"
+        "<nav><p>ナビゲーション</p></nav>"
+        "<article><h1>Rust入門</h1><p>本文の<a href='/a'>リンク</a>と &amp; 文字参照</p></article>"
+        "<p>記事の外の\n  段落</p>"
+        "<footer>フッター</footer></body></html>"
+    )
+    parser.close()
+    parser.flush()
+
+    assert parser.blocks == [
+        {'text': "Rust入門", 'link_chars': 0, 'in_content': True},
+        {'text': "本文のリンクと & 文字参照", 'link_chars': 3, 'in_content': True},
+        {'text': "記事の外の 段落", 'link_chars': 0, 'in_content': False},
+    ]
+
+
+def test_main_text_prefers_article_and_drops_link_lists():
+    html_text = (
+        f"<div><p>サイドバーの{PARAGRAPH}</p></div>"
+        f"<main><p>{PARAGRAPH}</p><p>短い段落</p>"
+        f"<ul><li><a href='/1'>{PARAGRAPH}</a></li></ul><p>二段落目の{PARAGRAPH}</p></main>"
+    )
+
+    assert extract_main_text(html_text) == f"{PARAGRAPH}\n二段落目の{PARAGRAPH}"
+    # article/mainがなければページ全体から選ぶ
+    assert extract_main_text(f"<div><p>{PARAGRAPH}</p></div>") == PARAGRAPH
+
+
+def test_truncate_to_tokens_keeps_whole_paragraphs_within_budget():
+    text = "\n".join(f"{index}段落目の{PARAGRAPH}" for index in range(10))
+
+    assert truncate_to_tokens(text, estimate_tokens(text)) == text
+
+    truncated = truncate_to_tokens(text, 100)
+    assert estimate_tokens(truncated) <= 100 + 1
+    paragraphs = truncated.split("\n")
+    # 収まる段落はそのまま残し、最後の段落だけを文字単位で削って「…」を付ける
+    assert paragraphs[:-1] == text.split("\n")[:len(paragraphs) - 1]
+    assert paragraphs[-1].endswith("…") and paragraphs[-1] not in text.split("\n")
+
+
+def test_truncate_to_tokens_cuts_single_long_paragraph():
+    truncated = truncate_to_tokens("あ" * 1000, 50)
+
+    assert truncated.endswith("…")
+    assert 0 < len(truncated) - 1 <= 50
+
+
+def test_fetch_stops_reading_at_byte_cap(stub_server):
+    body = ("<html><body><article>" + f"<p>{PARAGRAPH}</p>" * 20000 + "</article></body></html>").encode('utf-8')
+    server = stub_server(lambda request: (200, {'Content-Type': 'text/html; charset=utf-8'}, body))
+
+    html_text, size = fetch_article_html(f"{server.url}/article", max_bytes=64 * 1024, timeout=5)
+
+    assert len(body) > 1024 * 1024
+    # 上限を超えたチャンクで読み込みをやめ、上限を超えた分は捨てる
+    assert 64 * 1024 <= size < 64 * 1024 + 16384
+    # 上限で切れた文字は置換文字になる
+    assert len(html_text) <= 64 * 1024
+    assert body.decode('utf-8').startswith(html_text.rstrip("\ufffd"))
+
+
+def test_fetch_decodes_meta_charset_and_rejects_non_html(stub_server):
+    html_text = f'<html><head><meta charset="shift_jis"></head><body><p>{PARAGRAPH}</p></body></html>'
+    responses = {
+        '/sjis': (200, {'Content-Type': 'text/html'}, html_text.encode('shift_jis')),
+        '/pdf': (200, {'Content-Type': 'application/pdf'}, b'%PDF-1.4'),
+    }
+    server = stub_server(lambda request: responses[request['path']])
+
+    # Content-Typeにcharsetがなければmetaタグの文字コードを使う
+    assert PARAGRAPH in fetch_article_html(f"{server.url}/sjis")[0]
+    assert extract_article(f"{server.url}/pdf") == ''
+
+
+def test_extract_article_reuses_stored_content(stub_server, tmp_path):
+    server = stub_server(lambda request: (200, {'Content-Type': 'text/html; charset=utf-8'},
+                                          f"<article><p>{PARAGRAPH}</p></article>".encode('utf-8')))
+    store = ContentStore(path=str(tmp_path / 'articles.sqlite3'))
+    url = f"{server.url}/article"
+
+    assert extract_article(url, store) == PARAGRAPH
+    assert extract_article(url, store) == PARAGRAPH
+    assert len(server.requests) == 1
+    store.close()
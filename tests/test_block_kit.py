@@ -0,0 +1,133 @@
+"""
+Block Kitの構築: 書記素単位の切り詰め、ボタンのvalue、上限での分割、送信前の検証を確かめる
+"""
+
+import pytest
+
+from block_kit import (
+    MAX_BUTTON_VALUE, MAX_HEADER_TEXT, BlockKitBuilder, actions_block, button_element, context_block,
+    divider_block, header_block, section_block, truncate_text, validate_blocks,
+)
+from pipeline.slack import build_digest_messages, render_article_blocks
+
+FAMILY = "\U0001F468\u200d\U0001F469\u200d\U0001F467"  # 家族の絵文字（ZWJで結合）
+THUMBS_UP_DARK = "\U0001F44D\U0001F3FF"  # 👍🏿（肌色修飾子）
+FLAG_JP = "\U0001F1EF\U0001F1F5"  # 🇯🇵（地域指示子のペア）
+E_ACUTE = "e\u0301"  # é（結合文字）
+HEART = "\u2764\ufe0f"  # ❤️（異体字セレクタ）
+
+
+@pytest.mark.parametrize('grapheme', [FAMILY, THUMBS_UP_DARK, FLAG_JP, E_ACUTE, HEART])
+def test_truncate_never_splits_grapheme(grapheme):
+    text = "あ" * 5 + grapheme + "い" * 5
+
+    # 書記素の途中にあたる長さすべてで、書記素ごと落とすか丸ごと残す
+    for limit in range(6, 6 + len(grapheme) + 1):
+        truncated = truncate_text(text, limit)
+        assert len(truncated) <= limit
+        body = truncated[:-1]
+        assert body in ("あ" * 5, "あ" * 5 + grapheme), (limit, truncated)
+        assert truncated.endswith("…")
+
+
+def test_truncate_keeps_flag_pairs_in_a_run_of_flags():
+    flags = FLAG_JP * 3
+
+    assert truncate_text(flags, 4) == FLAG_JP + "…"
+    assert truncate_text(flags, 5) == FLAG_JP * 2 + "…"
+
+
+def test_truncate_leaves_short_text_unchanged():
+    assert truncate_text("Rust入門", 6) == "Rust入門"
+    assert truncate_text("Rust入門", 5) == "Rust…"
+
+
+def test_button_value_over_limit_is_dropped_not_sliced():
+    url = "https://example.com/" + "a" * MAX_BUTTON_VALUE
+
+    assert button_element("詳細", "detail_summary", f"detail:{url[:100]}")['value'] == f"detail:{url[:100]}"
+    # 途中で切ったURLは別のページを指すので、valueごと省く
+    assert 'value' not in button_element("詳細", "detail_summary", f"detail:{url}")
+
+
+def test_article_with_long_url_has_no_buttons():
+    article = {'title': "長いURLの記事", 'summary': "要約", 'link': "https://example.com/?q=" + "a" * MAX_BUTTON_VALUE}
+
+    blocks = render_article_blocks(1, article, verbose=False)
+
+    assert [block['type'] for block in blocks] == ['section']
+    assert 'accessory' not in blocks[0]
+    assert validate_blocks(blocks) == []
+
+
+def test_article_buttons_carry_full_url():
+    article = {'title': "Rust入門", 'summary': "要約", 'link': "https://example.com/rust?id=1:2"}
+
+    section, actions = render_article_blocks(1, article, verbose=False)
+
+    assert section['accessory']['value'] == "detail:https://example.com/rust?id=1:2"
+    assert actions['elements'][0]['value'] == "question:https://example.com/rust?id=1:2"
+
+
+def test_builder_splits_groups_without_breaking_them():
+    builder = BlockKitBuilder(max_blocks=5)
+    builder.set_footer([context_block(["フッター"])])
+    for number in range(3):
+        builder.add_group([section_block(f"記事{number}"), actions_block([button_element("質問", "ask", "q")])],
+                          separator=divider_block())
+
+    messages = builder.build()
+
+    # フッターの分を空けて1通4ブロックまで。区切り線が入らなければ区切り線なしで同じメッセージに入れ、
+    # 入らない記事は途中で切らずに次のメッセージへ送る（フッターは最後のメッセージに付ける）
+    assert [[block['type'] for block in message.blocks] for message in messages] == [
+        ['section', 'actions', 'section', 'actions'],
+        ['section', 'actions', 'context'],
+    ]
+    assert all(validate_blocks(message.blocks, max_blocks=5) == [] for message in messages)
+
+
+def test_digest_messages_pass_validation():
+    articles = [{'title': f"記事{index}", 'summary': "要約" * 2000, 'link': f"https://example.com/{index}",
+                 'related': [{'title': "関連" * 50, 'link': f"https://example.com/{index}/related"}]}
+                for index in range(40)]
+
+    messages = build_digest_messages(articles, "2024年01月01日")
+
+    assert len(messages) > 1
+    assert all(validate_blocks(message.blocks) == [] for message in messages)
+
+
+def test_validate_reports_each_problem():
+    long_value = button_element("詳細", "detail_summary")
+    long_value['value'] = "v" * (MAX_BUTTON_VALUE + 1)
+    blocks = [
+        header_block("見出し"),
+        {"type": "header", "text": {"type": "plain_text", "text": "あ" * (MAX_HEADER_TEXT + 1)}},
+        {"type": "section", "text": {"type": "mrkdwn", "text": ""}},
+        {"type": "table"},
+        dict(divider_block(), block_id="dup"),
+        dict(divider_block(), block_id="dup"),
+        actions_block([]),
+        section_block("本文", accessory=long_value),
+        actions_block([button_element("", "ask", "q", style="secondary")]),
+    ]
+
+    errors = validate_blocks(blocks)
+
+    assert errors == [
+        f"ブロック2 (header): テキストは1〜{MAX_HEADER_TEXT}文字にしてください ({MAX_HEADER_TEXT + 1})",
+        "ブロック3 (section): テキストは1〜3000文字にしてください (0)",
+        "ブロック4 (table): 未対応のブロック種別です",
+        "ブロック6 (divider): block_idが重複しています (dup)",
+        "ブロック7 (actions): 要素は1〜25個にしてください",
+        f"ブロック8 (section): ボタンのvalueが{MAX_BUTTON_VALUE}文字を超えています",
+        "ブロック9 (actions): ボタンのテキストは1〜75文字にしてください",
+        "ブロック9 (actions): ボタンのstyleが不正です (secondary)",
+    ]
+
+
+def test_validate_checks_message_limits():
+    assert validate_blocks([]) == ["ブロックが空です"]
+    assert validate_blocks([divider_block()] * 51)[0] == "ブロック数が上限を超えています (51 > 50)"
+    assert validate_blocks([section_block("あ" * 3000)], max_bytes=1000)[0].startswith("ブロックのサイズが上限を超えています")
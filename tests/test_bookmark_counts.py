@@ -0,0 +1,112 @@
+"""
+ブックマーク数の一括取得: ローカルのカウントAPIスタブで50件ずつのまとめ方・キャッシュの再利用と、
+件数が一部取れなかった場合の順位付けを確かめる
+"""
+
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import bookmark_counts
+from article_ranking import rank_articles
+from bookmark_counts import BookmarkCountStore, fetch_bookmark_counts
+from http_client import get_http_client
+
+
+def url_of(index):
+    return f"https://example.com/articles/{index}"
+
+
+class CountApi:
+    """クエリの url= ごとに件数（記事番号）を返し、failing に含むURLがあれば500を返すスタブの応答"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+
+    def __call__(self, request):
+        urls = parse_qs(urlsplit(request['path']).query).get('url', [])
+        if self.failing & set(urls):
+            return 500, {}, b''
+        return 200, {}, {url: int(url.rsplit('/', 1)[1]) for url in urls if not url.endswith('/0')}
+
+
+@pytest.fixture
+def count_api(stub_server, monkeypatch):
+    def start(handler):
+        server = stub_server(handler)
+        monkeypatch.setattr(bookmark_counts, 'HATENA_COUNT_API_URL', f"{server.url}/count/entries")
+        # 失敗させたリクエストを再試行で待たない
+        monkeypatch.setattr(get_http_client(), 'max_retries', 0)
+        return server
+
+    return start
+
+
+def requested_urls(request):
+    return parse_qs(urlsplit(request['path']).query)['url']
+
+
+def test_batches_at_most_50_urls_and_reuses_cache(count_api, tmp_path):
+    server = count_api(CountApi())
+    store = BookmarkCountStore(path=str(tmp_path / 'counts.sqlite3'), ttl=600)
+    urls = [url_of(index) for index in range(120)]
+
+    counts = fetch_bookmark_counts(urls + urls[:10], store=store)
+
+    # 重複を除いた120件を50・50・20件の3リクエストで取得する
+    assert sorted(len(requested_urls(request)) for request in server.requests) == [20, 50, 50]
+    assert {url for request in server.requests for url in requested_urls(request)} == set(urls)
+    assert counts[url_of(7)]['count'] == 7
+    # カウントAPIの応答に含まれないURLは0件
+    assert counts[url_of(0)]['count'] == 0
+    assert counts[url_of(7)]['prev_count'] is None
+
+    # TTL内なら問い合わせずにキャッシュを使う
+    again = fetch_bookmark_counts(urls[:60], store=store)
+    assert len(server.requests) == 3
+    assert again[url_of(7)]['count'] == 7
+    store.close()
+
+
+def test_expired_counts_keep_previous_value(count_api, tmp_path):
+    count_api(CountApi())
+    store = BookmarkCountStore(path=str(tmp_path / 'counts.sqlite3'), ttl=0)
+
+    fetch_bookmark_counts([url_of(5)], store=store)
+    counts = fetch_bookmark_counts([url_of(5)], store=store)
+
+    # 期限切れなら取得し直し、それまでの件数を prev_count に残す（増加速度の計算用）
+    assert counts[url_of(5)]['count'] == 5
+    assert counts[url_of(5)]['prev_count'] == 5
+    assert counts[url_of(5)]['prev_at'] is not None
+    store.close()
+
+
+def test_failed_batch_is_left_out_and_ranking_uses_feed_counts(count_api, tmp_path):
+    # 2つ目のまとまり（50〜99番）だけ失敗させる
+    server = count_api(CountApi(failing={url_of(75)}))
+    store = BookmarkCountStore(path=str(tmp_path / 'counts.sqlite3'), ttl=600)
+    articles = [{'title': f"記事{index}", 'link': url_of(index), 'bookmarks': 1000 if index == 75 else 0}
+                for index in range(100)]
+
+    counts = fetch_bookmark_counts([article['link'] for article in articles], store=store)
+
+    assert len(server.requests) == 2
+    assert url_of(49) in counts
+    assert url_of(75) not in counts and url_of(99) not in counts
+
+    # 件数が取れなかった記事はフィードに載っていた件数（なければ0件）で順位付けする
+    ranked = rank_articles(articles, [('bookmarks', 1.0)], counts, now=0)
+    assert ranked[0]['link'] == url_of(75)
+    assert ranked[0]['bookmarks'] == 1000
+    assert [article['link'] for article in ranked[1:4]] == [url_of(49), url_of(48), url_of(47)]
+    assert {article['bookmarks'] for article in ranked if article['link'] in {url_of(60), url_of(99)}} == {0}
+    store.close()
+
+
+def test_request_failure_without_cache_returns_empty(count_api, tmp_path):
+    count_api(CountApi(failing={url_of(1)}))
+    store = BookmarkCountStore(path=str(tmp_path / 'counts.sqlite3'), ttl=600)
+
+    assert fetch_bookmark_counts([url_of(1), url_of(2)], store=store) == {}
+    store.close()
@@ -0,0 +1,163 @@
+"""
+常駐モード: cronの次回時刻（日・週・年の境界）、状態ファイルの引き継ぎ、GET /health の応答を確かめる
+"""
+
+import json
+import socket
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from daemon import BotDaemon, CronSchedule, DaemonState
+from feed_sources import canonicalize_url
+
+TOKYO = ZoneInfo('Asia/Tokyo')
+
+
+def at(*args):
+    return datetime(*args, tzinfo=TOKYO)
+
+
+@pytest.mark.parametrize('expression, moment, expected', [
+    # 当日の時刻を過ぎていれば翌日
+    ('0 12 * * *', at(2024, 1, 1, 13, 0), at(2024, 1, 2, 12, 0)),
+    # ちょうどその時刻なら次の回（同じ時刻は返さない）
+    ('0 12 * * *', at(2024, 1, 1, 12, 0), at(2024, 1, 2, 12, 0)),
+    ('*/15 * * * *', at(2024, 1, 1, 23, 50), at(2024, 1, 2, 0, 0)),
+    # 月末・年末をまたぐ
+    ('30 0 1 * *', at(2024, 12, 31, 23, 59), at(2025, 1, 1, 0, 30)),
+    ('0 9 29 2 *', at(2024, 3, 1, 0, 0), at(2028, 2, 29, 9, 0)),
+])
+def test_next_after_crosses_day_and_year_boundaries(expression, moment, expected):
+    assert CronSchedule(expression).next_after(moment) == expected
+
+
+def test_next_after_crosses_week_boundary():
+    # 2024-01-07 は日曜、2024-01-08 は月曜
+    monday = CronSchedule('0 9 * * 1')
+    assert monday.next_after(at(2024, 1, 7, 23, 0)) == at(2024, 1, 8, 9, 0)
+    assert monday.next_after(at(2024, 1, 8, 9, 0)) == at(2024, 1, 15, 9, 0)
+
+    # 曜日は0と7のどちらも日曜
+    assert CronSchedule('0 9 * * 7').next_after(at(2024, 1, 8, 0, 0)) == at(2024, 1, 14, 9, 0)
+    weekdays = CronSchedule('0 12 * * 1-5')
+    assert weekdays.next_after(at(2024, 1, 5, 12, 0)) == at(2024, 1, 8, 12, 0)
+
+
+def test_day_and_weekday_match_either_like_cron():
+    # 日と曜日の両方を指定した場合はどちらかに一致すれば実行する（1日 または 月曜）
+    schedule = CronSchedule('0 9 1 * 1')
+    assert schedule.next_after(at(2024, 1, 1, 10, 0)) == at(2024, 1, 8, 9, 0)
+    assert schedule.next_after(at(2024, 1, 29, 10, 0)) == at(2024, 2, 1, 9, 0)
+
+
+@pytest.mark.parametrize('expression', ['0 12 * *', '60 12 * * *', '0 12 32 * *', '0 12 * * 8', '*/0 * * * *'])
+def test_invalid_expression_is_rejected(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_state_round_trips_through_file(tmp_path):
+    path = str(tmp_path / 'state' / 'daemon_state.json')
+    state = DaemonState(path)
+    state.set('last_digest_at', at(2024, 1, 1, 12, 0).isoformat())
+    state.mark_breaking(["https://www.example.com/post/?utm_source=hatena"])
+    state.save()
+
+    restored = DaemonState(path)
+    assert restored.get('last_digest_at') == "2024-01-01T12:00:00+09:00"
+    # 正規化したURLで記録するので、トラッキングパラメータ違いも投稿済みとみなす
+    assert restored.is_breaking_posted("https://example.com/post")
+    assert not restored.is_breaking_posted("https://example.com/other")
+
+
+def test_state_prunes_old_breaking_posts(tmp_path):
+    state = DaemonState(str(tmp_path / 'daemon_state.json'))
+    old, recent, new = (canonicalize_url(f"https://example.com/{name}") for name in ('old', 'recent', 'new'))
+    state.data['breaking'] = {old: time.time() - 8 * 24 * 60 * 60, recent: time.time() - 60}
+
+    state.mark_breaking(["https://example.com/new"])
+
+    assert set(state.data['breaking']) == {recent, new}
+
+
+def test_broken_state_file_falls_back_to_defaults(tmp_path, capsys):
+    path = tmp_path / 'daemon_state.json'
+    path.write_text("{broken", encoding='utf-8')
+
+    state = DaemonState(str(path))
+
+    assert state.get('last_digest_at') is None and state.get('breaking') == {}
+    assert "状態の読み込みエラー" in capsys.readouterr().out
+
+
+def test_first_digest_catches_up_missed_run_after_restart(tmp_path, monkeypatch):
+    state = DaemonState(str(tmp_path / 'daemon_state.json'))
+    state.set('last_digest_at', at(2024, 1, 1, 12, 0).isoformat())
+    monkeypatch.setattr(BotDaemon, 'now', lambda self: at(2024, 1, 2, 12, 30))
+
+    # 停止中に過ぎた 01/02 12:00 は catchup（60分）以内なので起動直後に投稿する
+    assert BotDaemon(schedule='0 12 * * *', state=state).next_digest == at(2024, 1, 2, 12, 0)
+
+    # catchup を過ぎていれば次の時刻を待つ
+    monkeypatch.setattr(BotDaemon, 'now', lambda self: at(2024, 1, 2, 14, 0))
+    assert BotDaemon(schedule='0 12 * * *', state=state).next_digest == at(2024, 1, 3, 12, 0)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def get_health(server):
+    host, port = server.server_address
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}/health", timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_health_endpoint_reports_starting_until_first_job(tmp_path, monkeypatch):
+    monkeypatch.delenv('DAEMON_HEALTH_HOST', raising=False)
+    monkeypatch.setenv('DAEMON_HEALTH_PORT', str(free_port()))
+    bot = BotDaemon(poll_interval=60, state=DaemonState(str(tmp_path / 'daemon_state.json')))
+    server = bot.start_health_server()
+    try:
+        # 既定ではローカルからの接続だけを受け付ける
+        assert server.server_address[0] == '127.0.0.1'
+
+        status, body = get_health(server)
+        assert (status, body['status'], body['jobs']) == (503, 'starting', 0)
+
+        assert bot.run_job('breaking', lambda: True) is True
+        bot.last_poll_at = time.time()
+        status, body = get_health(server)
+        assert (status, body['status'], body['jobs']) == (200, 'ok', 1)
+        assert body['last_poll_at'] is not None and 'gemini' in body
+
+        # フィード確認が間隔の3倍以上滞っていれば stale
+        bot.last_poll_at = time.time() - 181
+        status, body = get_health(server)
+        assert (status, body['status']) == (503, 'stale')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_health_server_rejects_other_paths(tmp_path, monkeypatch):
+    monkeypatch.setenv('DAEMON_HEALTH_PORT', str(free_port()))
+    server = BotDaemon(state=DaemonState(str(tmp_path / 'daemon_state.json'))).start_health_server()
+    try:
+        host, port = server.server_address
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"http://{host}:{port}/", timeout=5)
+        assert error.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
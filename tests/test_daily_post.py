@@ -0,0 +1,25 @@
+"""
+日次投稿の後片付け: パイプラインが例外で終わってもアーカイブ・キャッシュを閉じることを確かめる
+"""
+
+import pytest
+
+import daily_post
+from article_archive import ArticleArchive
+
+
+def test_archive_is_closed_when_pipeline_fails(monkeypatch):
+    closed = []
+    close = ArticleArchive.close
+    monkeypatch.setattr(ArticleArchive, 'close', lambda self: closed.append(self) or close(self))
+    monkeypatch.setenv('ARTICLE_CONTENT', 'false')
+
+    def broken_pipeline(*args, **kwargs):
+        raise RuntimeError("Slack投稿中に失敗")
+
+    monkeypatch.setattr(daily_post, 'run_pipeline', broken_pipeline)
+
+    with pytest.raises(RuntimeError):
+        daily_post.run_daily_post()
+
+    assert len(closed) == 1
@@ -0,0 +1,112 @@
+"""
+類似記事のクラスタリング: 近似重複をまとめ、別の記事は分けたまま、閾値付近のペアも候補に拾うことを確かめる
+"""
+
+import random
+
+import pytest
+
+from dedup import cluster_articles, jaccard, lsh_parameters, minhash_signature, shingles
+
+KANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモラリルレロガギグゲゴザジズゼゾバビブベボ"
+
+
+def article(title, link, description=''):
+    return {'title': title, 'link': link, 'description': description}
+
+
+def random_text(rng, length):
+    return ''.join(rng.choice(KANA) for _ in range(length))
+
+
+def test_near_duplicates_merge_into_highest_ranked_article():
+    articles = [
+        article("Rust 1.80 がリリース、LazyCell と LazyLock が安定化", "https://example.com/a"),
+        article("PostgreSQL 17 の新機能まとめ", "https://example.com/b"),
+        article("【速報】Rust 1.80 がリリース、LazyCell と LazyLock が安定化", "https://example.com/c"),
+    ]
+
+    result = cluster_articles(articles, threshold=0.5)
+
+    assert [item['link'] for item in result] == ["https://example.com/a", "https://example.com/b"]
+    assert result[0]['related'] == [{'title': articles[2]['title'], 'link': "https://example.com/c"}]
+    assert 'related' not in result[1]
+    # 元の記事は書き換えない
+    assert 'related' not in articles[0]
+
+
+def test_distinct_articles_stay_separate():
+    rng = random.Random(1)
+    articles = [article(f"{random_text(rng, 12)}の{random_text(rng, 6)}", f"https://example.com/{index}",
+                        random_text(rng, 30)) for index in range(200)]
+
+    assert cluster_articles(articles, threshold=0.5) == articles
+
+
+def test_clusters_are_transitive_and_keep_existing_related():
+    base = "Kubernetes 1.31 で Pod のリソース制限をインプレースで変更できるようになった"
+    articles = [
+        dict(article(base, "https://example.com/a"), related=[{'title': "既存", 'link': "https://example.com/x"}]),
+        article(base + "（解説）", "https://example.com/b"),
+        article(base + "（解説）【追記あり】", "https://example.com/c"),
+    ]
+
+    representative, = cluster_articles(articles, threshold=0.5)
+
+    assert [item['link'] for item in representative['related']] == [
+        "https://example.com/x", "https://example.com/b", "https://example.com/c"]
+
+
+def test_pairs_at_threshold_are_found_by_lsh():
+    # 類似度が閾値をわずかに超えるペアを多数作り、LSHで候補に拾ってまとめられる割合を確かめる
+    rng = random.Random(7)
+    pairs = merged = 0
+    for index in range(300):
+        shared = random_text(rng, 32)
+        left = article(shared + random_text(rng, 14), f"https://example.com/{index}/a")
+        right = article(shared + random_text(rng, 14), f"https://example.com/{index}/b")
+        similarity = jaccard(shingles(left['title']), shingles(right['title']))
+        if not 0.5 <= similarity < 0.55:
+            continue
+        pairs += 1
+        merged += len(cluster_articles([left, right], threshold=0.5)) == 1
+
+    # 16バンド×4行では7割ほどしか拾えなかった
+    assert pairs >= 250
+    assert merged / pairs >= 0.9
+
+
+@pytest.mark.parametrize('threshold, bands, rows', [(0.5, 21, 3), (0.7, 16, 4), (0.8, 10, 6), (0.3, 32, 2)])
+def test_lsh_parameters_reach_target_recall_at_threshold(threshold, bands, rows):
+    assert lsh_parameters(threshold) == (bands, rows)
+    assert bands * rows <= 64
+    assert 1 - (1 - threshold ** rows) ** bands >= 0.9
+    # 行数を1つ増やすと閾値での取りこぼしが目標を超える
+    wider = rows + 1
+    assert 1 - (1 - threshold ** wider) ** (64 // wider) < 0.9
+
+
+def test_embeddings_decide_candidates_below_ngram_threshold():
+    articles = [
+        article("Go 1.23 のイテレータ入門", "https://example.com/a", "range over func の使い方"),
+        article("Go 1.23 のイテレータ入門（後編）", "https://example.com/b", "iter パッケージの使い方"),
+    ]
+    calls = []
+
+    def embed_fn(texts):
+        calls.append(texts)
+        return [[1.0, 0.0], [1.0, 0.0]]
+
+    # LSHの候補になったペアは、n-gramの類似度が閾値に届かなくても埋め込みが近ければまとめる
+    assert len(cluster_articles(articles, threshold=0.95, bands=32, rows=2)) == 2
+    assert len(cluster_articles(articles, threshold=0.95, bands=32, rows=2, embed_fn=embed_fn)) == 1
+    assert len(calls) == 1
+
+
+def test_shingles_and_signature_normalize_text():
+    assert shingles("ＲＵＳＴ　 入門") == shingles("rust 入門")
+    assert shingles("ab") == {"ab"} and shingles("") == set()
+
+    a, b = shingles("Rust 1.80 がリリース"), shingles("Rust 1.80 がリリース！")
+    same = sum(x == y for x, y in zip(minhash_signature(a), minhash_signature(b)))
+    assert abs(same / 64 - jaccard(a, b)) < 0.2
@@ -0,0 +1,103 @@
+"""
+ドライランのフィクスチャ: 保存したHTTPの記録を読み込み、記録順に再生する（本文のデコードは記録ごとに1回）
+終了処理: 途中で終わっても一時ディレクトリを消す
+"""
+
+import os
+import base64
+
+import dry_run
+from dry_run import FixtureStore
+
+
+def exchange(url, body, status=200):
+    return {'method': 'GET', 'url': url, 'status': status, 'headers': {'Content-Type': 'text/plain'},
+            'body': base64.b64encode(body).decode('ascii')}
+
+
+def test_replay_returns_decoded_bodies_in_recorded_order(tmp_path, monkeypatch):
+    store = FixtureStore(str(tmp_path))
+    store.exchanges = [
+        exchange("https://example.com/a", b"first"),
+        exchange("https://example.com/b", b"other"),
+        exchange("https://example.com/a", b"second", status=304),
+    ]
+    store.save()
+
+    replay = FixtureStore(str(tmp_path))
+    replay.load()
+
+    decoded = []
+    b64decode = dry_run.base64.b64decode
+    monkeypatch.setattr(dry_run.base64, 'b64decode', lambda data: decoded.append(data) or b64decode(data))
+
+    assert replay.next_exchange('GET', "https://example.com/a")['content'] == b"first"
+    second = replay.next_exchange('GET', "https://example.com/a")
+    assert (second['status'], second['content']) == (304, b"second")
+    # 記録より多く呼ばれたら最後の記録を返し続ける（デコード済みの本文を使い回す）
+    assert replay.next_exchange('GET', "https://example.com/a")['content'] == b"second"
+    assert len(decoded) == 2
+    # 再生していない記録はデコードしない
+    assert replay.next_exchange('GET', "https://example.com/b")['content'] == b"other"
+    assert len(decoded) == 3
+    assert replay.next_exchange('POST', "https://example.com/a") is None
+    # 保存用の記録はbase64のまま残す
+    assert replay.exchanges[0]['body'] == base64.b64encode(b"first").decode('ascii')
+
+
+def test_finish_removes_state_dir_even_when_main_returns_early(monkeypatch, capsys):
+    import daily_post
+    from http_client import get_http_client
+
+    monkeypatch.setenv('DRY_RUN_MODE', 'stub')
+    monkeypatch.setenv('GEMINI_API_KEY', 'dry-run')
+    # 空文字のトークンはドライランでも上書きされないので、環境変数チェックで終わる
+    monkeypatch.setenv('SLACK_BOT_TOKEN', '')
+    started = []
+    monkeypatch.setattr(daily_post, 'dry_run_from_env',
+                        lambda: started.append(dry_run.dry_run_from_env()) or started[-1])
+
+    daily_post.main()
+
+    state_dir = os.path.dirname(os.environ['SUMMARY_CACHE_PATH'])
+    assert "SLACK_BOT_TOKENが設定されていません" in capsys.readouterr().out
+    assert started[0].state_dir is None and not os.path.exists(state_dir)
+    assert get_http_client().interceptor is None
+
+
+def test_state_dir_is_removed_after_run(monkeypatch):
+    from rate_limiter import UsageLedger
+
+    monkeypatch.setenv('GEMINI_API_KEY', 'dry-run')
+    monkeypatch.setenv('SLACK_BOT_TOKEN', 'xoxb-dry-run')
+    stub = dry_run.DryRun('stub')
+    stub.install()
+    state_dir = stub.state_dir.name
+    # 実行中は状態ファイルを一時ディレクトリに作る
+    ledger = UsageLedger()
+    assert os.path.dirname(ledger.path) == state_dir and os.path.exists(ledger.path)
+
+    stub.finish()
+
+    assert not os.path.exists(state_dir)
+
+
+def test_shared_stores_are_reopened_in_next_run(monkeypatch):
+    from feed_store import get_feed_store
+    from rate_limiter import get_usage_ledger
+
+    monkeypatch.setenv('GEMINI_API_KEY', 'dry-run')
+    monkeypatch.setenv('SLACK_BOT_TOKEN', 'xoxb-dry-run')
+    paths = []
+    for _ in range(2):
+        stub = dry_run.DryRun('stub')
+        stub.install()
+        ledger = get_usage_ledger()
+        # 前回の一時ディレクトリ（削除済み）のファイルに書き込まない
+        ledger.record('gemini-2.5-flash', 10, 5)
+        get_feed_store().set("https://example.com/feed.rss", None, None, 5, [])
+        paths.append((ledger.path, get_feed_store().path))
+        stub.finish()
+
+    assert paths[0] != paths[1]
+    assert all(os.path.dirname(path) == os.path.dirname(paths[1][0]) for path in paths[1])
@@ -0,0 +1,122 @@
+"""
+ストリーミングパーサー: CDATA・複数行の要素・各フィード形式、limit件での読み込み停止、壊れたXMLを確かめる
+"""
+
+from feed_parser import iter_feed_items, parse_feed
+
+RSS2 = """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>feed</title>
+<item>
+  <title><![CDATA[Rust & Go <入門>]]></title>
+  <link>https://example.com/rust</link>
+  <description><![CDATA[<p>所有権と<b>借用</b>の解説</p>]]></description>
+  <pubDate>Mon, 01 Jan 2024 00:00:00 GMT</pubDate>
+</item>
+<item>
+  <title>
+    複数行の
+    タイトル
+  </title>
+  <link>
+    https://example.com/multiline
+  </link>
+  <description>1行目
+2行目 &amp; 3行目</description>
+</item>
+</channel></rss>
+""".encode('utf-8')
+
+
+def make_rdf(count):
+    items = ''.join(
+        f'<item rdf:about="https://example.com/{index}"><title>記事{index}</title>'
+        f'<hatena:bookmarkcount>{100 - index}</hatena:bookmarkcount></item>'
+        for index in range(count)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<rdf:RDF xmlns="http://purl.org/rss/1.0/" xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" '
+        'xmlns:hatena="http://www.hatena.ne.jp/info/xmlns#">' + items + '</rdf:RDF>'
+    ).encode('utf-8')
+
+
+def test_cdata_and_multiline_elements():
+    rust, multiline = parse_feed(RSS2)
+
+    # CDATAの中身はそのまま（エスケープもマークアップの解釈もしない）
+    assert rust == {'title': "Rust & Go <入門>", 'link': "https://example.com/rust",
+                    'description': "<p>所有権と<b>借用</b>の解説</p>", 'published': "Mon, 01 Jan 2024 00:00:00 GMT"}
+    # 複数行にまたがる要素は前後の空白だけを落とす
+    assert multiline['title'] == "複数行の\n    タイトル"
+    assert multiline['link'] == "https://example.com/multiline"
+    assert multiline['description'] == "1行目\n2行目 & 3行目"
+
+
+def test_rdf_about_and_bookmark_count():
+    articles = parse_feed(make_rdf(2))
+
+    # linkがなければ rdf:about を使う
+    assert articles == [
+        {'title': "記事0", 'link': "https://example.com/0", 'bookmarks': 100},
+        {'title': "記事1", 'link': "https://example.com/1", 'bookmarks': 99},
+    ]
+
+
+def test_atom_alternate_link():
+    data = (
+        '<feed xmlns="http://www.w3.org/2005/Atom"><entry><title>Atom記事</title>'
+        '<link rel="self" href="https://example.com/self"/>'
+        '<link rel="alternate" href="https://example.com/atom"/>'
+        '<summary>要約</summary><updated>2024-01-01T00:00:00Z</updated></entry></feed>'
+    ).encode('utf-8')
+
+    article, = parse_feed(data)
+
+    # 最初のlinkが alternate 以外なら使わず、次の alternate を使う
+    assert article == {'title': "Atom記事", 'link': "https://example.com/atom", 'description': "要約",
+                       'published': "2024-01-01T00:00:00Z"}
+
+
+def test_items_without_title_or_link_are_skipped():
+    data = b'<rss><channel><item><title>only title</title></item><item><link>https://example.com/</link></item></channel></rss>'
+
+    assert parse_feed(data) == []
+
+
+def test_limit_stops_reading_remaining_chunks():
+    data = make_rdf(100)
+    consumed = []
+
+    def chunks():
+        for start in range(0, len(data), 256):
+            consumed.append(start)
+            yield data[start:start + 256]
+
+    articles = list(iter_feed_items(chunks(), limit=3))
+
+    assert [article['title'] for article in articles] == ["記事0", "記事1", "記事2"]
+    # 3件目が揃ったチャンクで読み込みを止める
+    assert len(consumed) < len(range(0, len(data), 256)) / 4
+    assert consumed[-1] < data.index('記事4'.encode('utf-8'))
+
+
+def test_malformed_xml_keeps_items_parsed_before_error(capsys):
+    data = make_rdf(3).replace('<title>記事2</title>'.encode('utf-8'), b'<title>broken</titel>')
+
+    articles = list(iter_feed_items([data[:200], data[200:]]))
+
+    assert [article['title'] for article in articles] == ["記事0", "記事1"]
+    assert "フィード解析エラー" in capsys.readouterr().out
+
+
+def test_truncated_feed_returns_complete_items(capsys):
+    data = make_rdf(3)
+    truncated = data[:data.index(b'<item', data.index(b'</item>')) + 20]
+
+    assert [article['title'] for article in parse_feed(truncated)] == ["記事0"]
+    assert "フィード解析エラー" in capsys.readouterr().out
+
+
+def test_non_xml_body_returns_nothing(capsys):
+    assert parse_feed(b'<html><body>503 Service Unavailable<br></body></html>') == []
+    assert "フィード解析エラー" in capsys.readouterr().out
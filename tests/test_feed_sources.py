@@ -0,0 +1,140 @@
+"""
+フィードの条件付き取得: ローカルのHTTPスタブで 200 → 304 → 更新後の200 を確かめる
+複数ソースの集約: スタブの複数フィードを並列取得し、正規化したURLで重複を除いてランキングする
+"""
+
+import feed_sources
+from feed_sources import aggregate_articles, canonicalize_url, fetch_feed_articles, resolve_sources
+from feed_store import FeedStore
+
+
+def make_feed(titles, links=None):
+    links = links or [f"https://example.com/{index}" for index in range(len(titles))]
+    items = ''.join(
+        f'<item rdf:about="{link}"><title>{title}</title>'
+        f'<link>{link}</link><description>{title}の説明</description></item>'
+        for title, link in zip(titles, links)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<rdf:RDF xmlns="http://purl.org/rss/1.0/" xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+        '<channel rdf:about="https://example.com/"><title>feed</title></channel>' + items + '</rdf:RDF>'
+    ).encode('utf-8')
+
+
+class Feed:
+    """ETag・Last-Modifiedを付けてフィードを返し、条件が一致すれば304を返すスタブの応答"""
+
+    def __init__(self, titles, version=1):
+        self.titles = titles
+        self.version = version
+
+    @property
+    def etag(self):
+        return f'"v{self.version}"'
+
+    @property
+    def last_modified(self):
+        return f"Mon, 0{self.version} Jan 2024 00:00:00 GMT"
+
+    def __call__(self, request):
+        if request['headers'].get('If-None-Match') == self.etag:
+            return 304, {'ETag': self.etag}, b''
+        headers = {'Content-Type': 'application/rss+xml', 'ETag': self.etag, 'Last-Modified': self.last_modified}
+        return 200, headers, make_feed(self.titles)
+
+
+def test_conditional_fetch_reuses_cached_items_on_304(stub_server, tmp_path):
+    feed = Feed(["Rust入門", "Go入門", "Python入門"])
+    server = stub_server(feed)
+    store = FeedStore(path=str(tmp_path / 'feeds.sqlite3'))
+    url = f"{server.url}/feed.rss"
+
+    # 1回目: 通常取得し、ETag/Last-Modifiedと記事を保存
+    first = fetch_feed_articles(url, limit=3, store=store)
+    assert [article['title'] for article in first] == ["Rust入門", "Go入門", "Python入門"]
+    assert 'If-None-Match' not in server.requests[0]['headers']
+
+    # 2回目: 保存したETag/Last-Modifiedを送り、304なら保存済みの記事を返す
+    second = fetch_feed_articles(url, limit=2, store=store)
+    assert server.requests[1]['headers']['If-None-Match'] == '"v1"'
+    assert server.requests[1]['headers']['If-Modified-Since'] == "Mon, 01 Jan 2024 00:00:00 GMT"
+    assert second == first[:2]
+
+    # 3回目: フィードが更新されていれば200で新しい記事を取得し、保存内容も更新する
+    feed.titles = ["TypeScript入門", "Rust入門"]
+    feed.version = 2
+    third = fetch_feed_articles(url, limit=2, store=store)
+    assert server.requests[2]['headers']['If-None-Match'] == '"v1"'
+    assert [article['title'] for article in third] == ["TypeScript入門", "Rust入門"]
+    assert store.get(url)['etag'] == '"v2"'
+
+    fourth = fetch_feed_articles(url, limit=2, store=store)
+    assert server.requests[3]['headers']['If-None-Match'] == '"v2"'
+    assert fourth == third
+    store.close()
+
+
+def test_larger_limit_than_cached_skips_conditional_request(stub_server, tmp_path):
+    server = stub_server(Feed(["Rust入門", "Go入門", "Python入門"]))
+    store = FeedStore(path=str(tmp_path / 'feeds.sqlite3'))
+    url = f"{server.url}/feed.rss"
+
+    fetch_feed_articles(url, limit=1, store=store)
+    articles = fetch_feed_articles(url, limit=3, store=store)
+
+    # 保存済みの1件では足りないので、条件なしで取得し直す
+    assert 'If-None-Match' not in server.requests[1]['headers']
+    assert len(articles) == 3
+    store.close()
+
+
+def test_unconditional_fetch_for_breaking_counts(stub_server, tmp_path, monkeypatch):
+    feed = Feed(["Rust入門", "Go入門"])
+    server = stub_server(feed)
+    store = FeedStore(path=str(tmp_path / 'feeds.sqlite3'))
+    monkeypatch.setattr(feed_sources, 'get_feed_store', lambda: store)
+    url = f"{server.url}/feed.rss"
+    fetch_feed_articles(url, limit=2, store=store)
+
+    # 速報の確認（conditional=False）は保存済みのETagがあっても条件なしで取得する
+    (_, fetch), = feed_sources.resolve_sources(url, conditional=False)
+    articles = fetch(2, 10)
+    assert 'If-None-Match' not in server.requests[1]['headers']
+    assert [article['title'] for article in articles] == ["Rust入門", "Go入門"]
+    store.close()
+
+
+def test_canonicalize_url_strips_only_tracking_params():
+    assert canonicalize_url("https://www.example.com/post/?utm_source=x&fbclid=1&gclid=2&mc_cid=3&id=7") == \
+        canonicalize_url("http://example.com/post?id=7")
+    # ref・source は記事を指し分けるサイトがあるので残す
+    assert canonicalize_url("https://example.com/post?ref=a") != canonicalize_url("https://example.com/post?ref=b")
+    assert canonicalize_url("https://example.com/post?source=rss") != canonicalize_url("https://example.com/post")
+
+
+def test_aggregate_articles_merges_sources_by_canonical_url(stub_server):
+    feeds = {
+        '/a.rss': make_feed(["Rust入門", "Go入門", "Python入門"],
+                            ["https://example.com/rust", "https://example.com/go", "https://example.com/python?ref=a"]),
+        '/b.rss': make_feed(["Go入門（再掲）", "Zig入門", "Python入門（別記事）"],
+                            ["https://www.example.com/go/?utm_source=feed", "https://example.com/zig",
+                             "https://example.com/python?ref=b"]),
+    }
+
+    def handler(request):
+        if request['path'] in feeds:
+            return 200, {'Content-Type': 'application/rss+xml'}, feeds[request['path']]
+        return 404, {}, b''
+
+    server = stub_server(handler)
+    sources = resolve_sources(f"{server.url}/a.rss,{server.url}/b.rss,{server.url}/broken.rss")
+
+    articles = aggregate_articles(sources, limit=4, timeout=5)
+
+    # Go入門は両方のソースに載っているので 1/2 + 1/1 で首位、同点は設定順・ソース内順位
+    assert [article['title'] for article in articles] == ["Go入門", "Rust入門", "Zig入門", "Python入門"]
+    assert articles[0]['source'] == f"{server.url}/a.rss"
+    assert articles[2]['source'] == f"{server.url}/b.rss"
+    # 取得に失敗したソースは飛ばす
+    assert {request['path'] for request in server.requests} == {'/a.rss', '/b.rss', '/broken.rss'}
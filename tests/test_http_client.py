@@ -0,0 +1,120 @@
+"""
+共有HTTPクライアント: ローカルのHTTPスタブで再試行回数・Retry-Afterの扱い・ホスト別統計を確かめる
+"""
+
+import time
+
+from http_client import HttpClient
+
+
+def sequence(*responses):
+    """呼ばれるたびに responses を順に返すスタブの応答（最後の応答は繰り返す）"""
+    responses = list(responses)
+
+    def handler(request):
+        return responses.pop(0) if len(responses) > 1 else responses[0]
+
+    return handler
+
+
+def make_client(**kwargs):
+    return HttpClient(backoff_base=0.01, backoff_max=0.05, max_retries=3, **kwargs)
+
+
+def test_get_retries_5xx_until_success(stub_server):
+    server = stub_server(sequence((500, {}, b''), (503, {}, b''), (200, {}, b'ok')))
+    client = make_client()
+
+    response = client.get(f"{server.url}/feed")
+
+    assert response.status_code == 200
+    assert response.text == 'ok'
+    assert len(server.requests) == 3
+    client.close()
+
+
+def test_get_gives_up_after_max_retries(stub_server):
+    server = stub_server(sequence((500, {}, b'')))
+    client = make_client()
+
+    response = client.get(f"{server.url}/feed")
+
+    assert response.status_code == 500
+    # 最初の1回 + 再試行3回
+    assert len(server.requests) == 4
+    client.close()
+
+
+def test_post_is_not_retried_on_5xx_but_is_on_429(stub_server):
+    server = stub_server(sequence((500, {}, b''), (429, {}, b''), (200, {}, b'ok')))
+    client = make_client()
+
+    # 5xxのPOSTは二重投稿を避けるため再送しない
+    assert client.post(f"{server.url}/api").status_code == 500
+    assert len(server.requests) == 1
+
+    # 429は処理されていないので再送する
+    assert client.post(f"{server.url}/api").status_code == 200
+    assert len(server.requests) == 3
+    client.close()
+
+
+def test_retry_after_is_honored_beyond_backoff_max(stub_server):
+    server = stub_server(sequence((429, {'Retry-After': '1'}, b''), (200, {}, b'ok')))
+    client = make_client()
+
+    started = time.monotonic()
+    response = client.get(f"{server.url}/feed")
+
+    # backoff_max（0.05秒）で切り詰めず、サーバーが指定した1秒を待ってから送り直す
+    assert response.status_code == 200
+    assert time.monotonic() - started >= 1.0
+    assert len(server.requests) == 2
+    client.close()
+
+
+def test_retry_after_longer_than_limit_gives_up(stub_server):
+    server = stub_server(sequence((429, {'Retry-After': '120'}, b''), (200, {}, b'ok')))
+    client = make_client(retry_after_max=60)
+
+    started = time.monotonic()
+    response = client.get(f"{server.url}/feed")
+
+    # 指定より早く送り直すことはせず、429をそのまま返す
+    assert response.status_code == 429
+    assert len(server.requests) == 1
+    assert time.monotonic() - started < 1.0
+    client.close()
+
+
+def test_retry_after_http_date(stub_server):
+    client = make_client()
+
+    class Response:
+        headers = {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+
+    # 過去の日付はすぐに送り直す
+    assert client.retry_after(Response()) == 0.0
+    Response.headers = {'Retry-After': 'soon'}
+    assert client.retry_after(Response()) is None
+    client.close()
+
+
+def test_per_host_stats(stub_server):
+    first = stub_server(sequence((500, {}, b''), (200, {}, b'ok')))
+    second = stub_server(sequence((200, {}, b'ok')))
+    client = make_client()
+
+    client.get(f"{first.url}/a")
+    client.get(f"{second.url}/b")
+    client.get(f"{second.url}/c")
+
+    stats = client.latency_stats()
+    first_host = first.url.split('//')[1]
+    second_host = second.url.split('//')[1]
+    assert stats[first_host]['count'] == 2
+    assert stats[first_host]['retries'] == 1
+    assert stats[second_host]['count'] == 2
+    assert stats[second_host]['retries'] == 0
+    assert 0 <= stats[second_host]['min'] <= stats[second_host]['avg'] <= stats[second_host]['max']
+    client.close()
@@ -0,0 +1,72 @@
+"""
+インタラクションストア: JSONファイルへの保存と読み込み、保持期間、公開用のファイルに残す項目を確かめる
+"""
+
+import json
+import time
+
+from interaction_store import PUBLIC_FIELDS, STORE_VERSION, InteractionStore, JsonFileBackend
+
+
+def test_entries_round_trip_through_json_file(tmp_path):
+    backend = JsonFileBackend(str(tmp_path / 'store' / 'interaction_store.json'))
+    store = InteractionStore(backend)
+    store.put("https://example.com/rust", "Rust入門", description="所有権の解説", summary="一覧用の要約",
+              detail_summary="詳細な要約", context="本文の抜粋")
+    store.put("https://example.com/go", "Go入門")
+    store.save()
+
+    restored = InteractionStore(JsonFileBackend(backend.path))
+    rust = restored.get("https://example.com/rust")
+    assert (rust['title'], rust['description'], rust['summary'], rust['detail_summary'], rust['context']) == \
+        ("Rust入門", "所有権の解説", "一覧用の要約", "詳細な要約", "本文の抜粋")
+    # 詳細要約がなければ項目ごと省き、ボタン押下時に生成させる
+    assert 'detail_summary' not in restored.get("https://example.com/go")
+    assert restored.get("https://example.com/python") is None
+    # 一時ファイルから置き換えるので途中のファイルは残らない
+    assert [path.name for path in (tmp_path / 'store').iterdir()] == ['interaction_store.json']
+
+
+def test_save_drops_entries_past_retention(tmp_path):
+    store = InteractionStore(JsonFileBackend(str(tmp_path / 'interaction_store.json')), retention_days=7)
+    store.put("https://example.com/old", "古い記事")
+    store.put("https://example.com/new", "新しい記事")
+    store.articles["https://example.com/old"]['updated_at'] = time.time() - 8 * 24 * 60 * 60
+
+    store.save()
+
+    assert set(InteractionStore(store.backend).articles) == {"https://example.com/new"}
+
+
+def test_unknown_version_or_broken_file_loads_empty(tmp_path, capsys):
+    path = tmp_path / 'interaction_store.json'
+    path.write_text(json.dumps({'version': STORE_VERSION + 1, 'articles': {"https://example.com/": {}}}), encoding='utf-8')
+    assert JsonFileBackend(str(path)).load() == {}
+
+    path.write_text("{broken", encoding='utf-8')
+    assert JsonFileBackend(str(path)).load() == {}
+    assert "インタラクションストアの読み込みエラー" in capsys.readouterr().out
+
+    assert JsonFileBackend(str(tmp_path / 'missing.json')).load() == {}
+
+
+def test_public_file_keeps_only_fields_used_by_button_handler(tmp_path, monkeypatch):
+    public_path = tmp_path / 'interaction_store.public.json'
+    monkeypatch.setenv('INTERACTION_STORE_PUBLIC_PATH', str(public_path))
+    store = InteractionStore(JsonFileBackend(str(tmp_path / 'interaction_store.json')))
+    store.put("https://example.com/rust", "Rust入門", description="所有権の解説", summary="一覧用の要約",
+              detail_summary="詳細な要約", context="記事本文の抜粋")
+    store.put("https://example.com/go", "Go入門", context="記事本文の抜粋")
+    store.save()
+
+    with open(public_path, encoding='utf-8') as f:
+        data = json.load(f)
+    assert data['version'] == STORE_VERSION
+    assert data['articles'] == {
+        "https://example.com/rust": {'title': "Rust入門", 'description': "所有権の解説", 'detail_summary': "詳細な要約"},
+        "https://example.com/go": {'title': "Go入門", 'description': ""},
+    }
+    assert "記事本文の抜粋" not in public_path.read_text(encoding='utf-8')
+    assert set(PUBLIC_FIELDS) == {'title', 'description', 'detail_summary'}
+    # 手元のストアには本文の抜粋も残す
+    assert store.backend.load()["https://example.com/go"]['context'] == "記事本文の抜粋"
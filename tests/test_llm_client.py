@@ -0,0 +1,173 @@
+"""
+Gemini呼び出しのレート制御: RPMを超える連続呼び出しは失敗せず、枠が空くまで待って順に送られる。
+429を受けた呼び出しはリミッターの枠を空にして待ち、再試行する（待ちは呼び出し元の制限時間に含めない）
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import llm_client
+import rate_limiter
+from llm_resilience import TieredGenerator
+from pipeline.summarize import call_with_timeout
+from rate_limiter import get_usage_ledger
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeModel:
+    """即座に応答する偽のモデル（呼び出し回数を数える）"""
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def generate_content(self, prompt):
+        with self.calls['lock']:
+            self.calls['count'] += 1
+        return FakeResponse(f"要約: {prompt}")
+
+
+@pytest.fixture
+def slow_limiter(monkeypatch):
+    """1秒に4リクエストまで、枠が空の状態から始まるリミッター"""
+    limiter = rate_limiter.RateLimiter(rpm=240, tpm=1_000_000)
+    limiter.request_tokens = 0
+    monkeypatch.setattr(rate_limiter, '_rate_limiter', limiter)
+    return limiter
+
+
+@pytest.fixture
+def fake_model():
+    calls = {'count': 0, 'lock': threading.Lock()}
+    llm_client.set_model_factory(lambda model_name, generation_config: FakeModel(calls))
+    yield calls
+    llm_client.set_model_factory(None)
+
+
+def test_acquire_waits_instead_of_failing(slow_limiter):
+    waits = [slow_limiter.acquire(1) for _ in range(3)]
+    assert waits[-1] > 0
+    assert slow_limiter.queued_seconds(threading.get_ident()) == pytest.approx(sum(waits), abs=0.01)
+
+
+def test_try_acquire_does_not_wait(slow_limiter):
+    assert slow_limiter.try_acquire(1) is False
+    slow_limiter.request_tokens = 1
+    assert slow_limiter.try_acquire(1) is True
+
+
+def test_burst_past_rpm_queues_without_failing(slow_limiter, fake_model):
+    # 呼び出し元の制限時間（0.3秒）より枠の空き待ち（最大約3秒）の方が長くても、待った分は制限時間に含めない
+    def summarize(index):
+        return call_with_timeout(
+            lambda: llm_client.generate_content('gemini-2.5-flash', f"記事{index}").text, 0.3, f"記事{index}"
+        )
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(summarize, range(12)))
+
+    assert results == [f"要約: 記事{index}" for index in range(12)]
+    assert fake_model['count'] == 12
+
+
+def test_generate_content_skips_acquire_when_queued(slow_limiter, fake_model):
+    # 呼び出し元が枠を確保済み（queuedを渡す）なら、もう1回分は待たない
+    response = llm_client.generate_content('gemini-2.5-flash', "記事", queued=0.0)
+    assert response.text == "要約: 記事"
+    assert slow_limiter.queued_seconds(threading.get_ident()) == 0
+
+
+class RateLimitedModel:
+    """最初の failures 回は429を返し、その後は応答する偽のモデル"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        with self.lock:
+            self.calls += 1
+            number = self.calls
+        if number <= self.failures:
+            raise RuntimeError("429 ResourceExhausted (fake backend)")
+        return FakeResponse(f"要約: {prompt}")
+
+
+@pytest.fixture
+def rate_limited(monkeypatch):
+    """429後の待ちを0.4秒・0.8秒…に縮め、偽のモデルに差し替える"""
+    limiter = rate_limiter.RateLimiter(rpm=1_000_000, tpm=1_000_000_000)
+    monkeypatch.setattr(rate_limiter, '_rate_limiter', limiter)
+    monkeypatch.setattr(llm_client.random, 'uniform', lambda low, high: 0.1)
+
+    def install(failures):
+        model = RateLimitedModel(failures)
+        llm_client.set_model_factory(lambda model_name, generation_config: model)
+        return model
+
+    yield install
+    llm_client.set_model_factory(None)
+
+
+def test_rate_limit_penalizes_limiter_and_retries(rate_limited):
+    model = rate_limited(failures=2)
+    limiter = rate_limiter.get_rate_limiter()
+    before = dict(get_usage_ledger().run)
+
+    started = time.monotonic()
+    response = llm_client.generate_content('gemini-2.5-flash', "記事")
+
+    assert response.text == "要約: 記事"
+    assert model.calls == 3
+    # 待ちはリミッターの枠の空き待ちとして行う（0.4秒 + 0.8秒）
+    assert time.monotonic() - started >= 1.2
+    assert limiter.queued_seconds(threading.get_ident()) >= 1.2
+    run = get_usage_ledger().run
+    assert run['requests'] - before['requests'] == 1
+    assert run['retries'] - before['retries'] == 2
+    assert run['wait'] - before['wait'] >= 1.2
+
+
+def test_rate_limit_wait_holds_back_other_threads(rate_limited):
+    # 枠を空にするので、429を受けていない他のスレッドの呼び出しも待たされる
+    rate_limited(failures=0)
+    limiter = rate_limiter.get_rate_limiter()
+    limiter.penalize(0.4)
+
+    started = time.monotonic()
+    llm_client.generate_content('gemini-2.5-flash', "別の記事")
+    assert time.monotonic() - started >= 0.35
+
+
+def test_rate_limit_gives_up_after_max_retries(rate_limited, monkeypatch):
+    monkeypatch.setenv('GEMINI_MAX_RETRIES', '1')
+    model = rate_limited(failures=100)
+    requests_before = get_usage_ledger().run['requests']
+
+    with pytest.raises(RuntimeError, match="429"):
+        llm_client.generate_content('gemini-2.5-flash', "記事")
+    assert model.calls == 2
+    # 応答を得られなかった呼び出しは利用量に記録しない
+    assert get_usage_ledger().run['requests'] == requests_before
+
+
+def test_rate_limit_backoff_is_outside_caller_and_tier_deadlines(rate_limited, monkeypatch):
+    # 要約の制限時間（0.3秒）・段の制限時間（0.3秒）より429後の待ち（1.2秒）が長くても見切らない
+    monkeypatch.setenv('GEMINI_TIER_TIMEOUT', '0.3')
+    model = rate_limited(failures=2)
+    generator = TieredGenerator(['gemini-2.5-flash-lite'])
+
+    text = call_with_timeout(lambda: generator.generate("記事", 'gemini-2.5-flash')[0], 0.3, "記事")
+
+    assert text == "要約: 記事"
+    assert model.calls == 3
+    assert generator.snapshot()['gemini-2.5-flash']['failures'] == 0
+    assert 'gemini-2.5-flash-lite' not in generator.snapshot()
@@ -0,0 +1,280 @@
+"""
+段付き・ヘッジ付きのGemini呼び出し: 偽のバックエンドでヘッジ・サーキットブレーカー・段のフォールバックと、
+レートリミッターの空き待ち（429後の再試行の待ちを含む）を制限時間・遅延の記録・ブレーカーの失敗に含めないことを確かめる
+"""
+
+import time
+import threading
+
+import pytest
+
+import llm_client
+import llm_resilience
+import rate_limiter
+from llm_resilience import CircuitBreaker, TieredGenerator
+from rate_limiter import RateLimiter
+
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeBackend:
+    """モデルごとに遅延・失敗を指定できる偽のバックエンド（呼び出しを記録する）"""
+
+    def __init__(self, delays=None, failing=()):
+        self.delays = delays or {}
+        self.failing = set(failing)
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def __call__(self, model_name, prompt, generation_config=None, queued=None, cancel=None):
+        with self.lock:
+            number = len([call for call in self.calls if call[0] == model_name])
+            self.calls.append((model_name, queued))
+        delays = self.delays.get(model_name, [0.0])
+        time.sleep(delays[min(number, len(delays) - 1)])
+        if model_name in self.failing:
+            raise RuntimeError("503 Service Unavailable (fake backend)")
+        return Response(f"{model_name}: {prompt}")
+
+
+@pytest.fixture
+def env(monkeypatch):
+    monkeypatch.setenv('GEMINI_HEDGE_MIN_SAMPLES', '5')
+    monkeypatch.setenv('GEMINI_HEDGE_PERCENTILE', '0.9')
+    monkeypatch.setenv('GEMINI_HEDGE_MIN_DELAY', '0.05')
+    monkeypatch.setenv('GEMINI_TIER_TIMEOUT', '2')
+    monkeypatch.setenv('GEMINI_CIRCUIT_FAILURES', '2')
+    monkeypatch.setenv('GEMINI_CIRCUIT_COOLDOWN', '60')
+
+
+def unlimited():
+    return RateLimiter(rpm=1_000_000, tpm=1_000_000_000)
+
+
+def test_slow_call_is_hedged_and_hedge_wins(env):
+    # 1本目だけ遅く、ヘッジした2本目が先に返る
+    backend = FakeBackend(delays={'primary': [0.01] * 5 + [1.0, 0.01]})
+    generator = TieredGenerator([], generate_fn=backend, limiter=unlimited())
+    for index in range(5):
+        generator.generate(f"記事{index}", 'primary')
+
+    started = time.perf_counter()
+    text, name = generator.generate("遅い記事", 'primary')
+
+    assert (text, name) == ("primary: 遅い記事", 'primary')
+    assert time.perf_counter() - started < 0.5
+    tier = generator.snapshot()['primary']
+    assert tier['hedges'] == 1
+    assert tier['hedge_wins'] == 1
+    assert tier['failures'] == 0
+
+
+def test_no_hedge_before_enough_samples(env):
+    backend = FakeBackend(delays={'primary': [0.2]})
+    generator = TieredGenerator([], generate_fn=backend, limiter=unlimited())
+
+    assert generator.generate("記事", 'primary') == ("primary: 記事", 'primary')
+    assert generator.snapshot()['primary']['hedges'] == 0
+
+
+def test_failing_tier_falls_back_and_opens_circuit(env):
+    backend = FakeBackend(failing={'primary'})
+    generator = TieredGenerator(['fallback'], generate_fn=backend, limiter=unlimited())
+
+    results = [generator.generate(f"記事{index}", 'primary') for index in range(4)]
+
+    assert [name for _, name in results] == ['fallback'] * 4
+    primary = generator.snapshot()['primary']
+    # 2回失敗した時点で開き、残りの2回は呼び出さずに次の段へ進む
+    assert primary['failures'] == 2
+    assert primary['skipped'] == 2
+    assert primary['circuit'] == 'open'
+    assert [model for model, _ in backend.calls].count('primary') == 2
+
+
+def test_all_tiers_failing_returns_none(env):
+    backend = FakeBackend(failing={'primary', 'fallback'})
+    generator = TieredGenerator(['fallback'], generate_fn=backend, limiter=unlimited())
+
+    assert generator.generate("記事", 'primary') == (None, None)
+
+
+def test_tier_timeout_moves_to_next_tier(env, monkeypatch):
+    monkeypatch.setenv('GEMINI_TIER_TIMEOUT', '0.1')
+    backend = FakeBackend(delays={'primary': [1.0]})
+    generator = TieredGenerator(['fallback'], generate_fn=backend, limiter=unlimited())
+
+    assert generator.generate("記事", 'primary') == ("fallback: 記事", 'fallback')
+    assert generator.snapshot()['primary']['failures'] == 1
+
+
+def test_circuit_breaker_half_open_cycle():
+    breaker = CircuitBreaker('primary', failure_threshold=2, cooldown=0.1)
+    breaker.failure()
+    assert breaker.state == 'closed'
+    breaker.failure()
+    assert breaker.state == 'open'
+    assert breaker.allow() is False
+
+    time.sleep(0.15)
+    # 冷却後は1回だけ試しに通し、その結果が出るまで他は通さない
+    assert breaker.state == 'half_open'
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+
+    # 試しの1回が失敗すれば再び開き、成功すれば閉じる
+    breaker.failure()
+    assert breaker.state == 'open'
+    time.sleep(0.15)
+    assert breaker.allow() is True
+    breaker.success()
+    assert breaker.state == 'closed'
+    assert breaker.allow() is True
+
+
+def test_limiter_wait_is_not_a_timeout_or_latency(env, monkeypatch):
+    # 1秒に4リクエストの枠が空の状態から8件送る: 枠の空き待ち（最大約2秒）は段の制限時間（0.2秒）に含めない
+    monkeypatch.setenv('GEMINI_TIER_TIMEOUT', '0.2')
+    limiter = RateLimiter(rpm=240, tpm=1_000_000)
+    limiter.request_tokens = 0
+    backend = FakeBackend(delays={'primary': [0.01]})
+    generator = TieredGenerator(['fallback'], generate_fn=backend, limiter=limiter)
+
+    results = [generator.generate(f"記事{index}", 'primary') for index in range(8)]
+
+    assert [name for _, name in results] == ['primary'] * 8
+    primary = generator.snapshot()['primary']
+    assert primary['failures'] == 0
+    assert primary['hedges'] == 0
+    # 記録した遅延はモデルの往復時間だけ（枠の空き待ち約0.25秒を含まない）
+    assert primary['latency']['p99'] < 0.1
+    assert all(queued > 0 for _, queued in backend.calls[1:])
+
+
+def test_hedge_is_skipped_when_limiter_has_no_slot(env):
+    backend = FakeBackend(delays={'primary': [0.01] * 5 + [0.5]})
+    limiter = RateLimiter(rpm=6, tpm=1_000_000)
+    generator = TieredGenerator([], generate_fn=backend, limiter=limiter)
+    for index in range(5):
+        generator.generate(f"記事{index}", 'primary')
+
+    # 残りの枠は1件だけ: 本体の呼び出しで使い切り、ヘッジは送らない
+    limiter.request_tokens = 1
+    assert generator.generate("遅い記事", 'primary') == ("primary: 遅い記事", 'primary')
+    assert generator.snapshot()['primary']['hedges'] == 0
+    assert len(backend.calls) == 6
+
+
+def test_queued_burst_through_default_client(env, monkeypatch):
+    # 既定の generate_content を通しても、待たされた呼び出しを失敗として次の段に回さない
+    monkeypatch.setenv('GEMINI_TIER_TIMEOUT', '0.2')
+    limiter = RateLimiter(rpm=240, tpm=1_000_000)
+    limiter.request_tokens = 0
+    monkeypatch.setattr(rate_limiter, '_rate_limiter', limiter)
+    calls = []
+
+    class Model:
+        def generate_content(self, prompt):
+            calls.append(prompt)
+            response = Response(f"要約: {prompt}")
+            response.usage_metadata = None
+            return response
+
+    llm_client.set_model_factory(lambda model_name, generation_config: Model())
+    try:
+        generator = TieredGenerator(['fallback'])
+        results = [generator.generate(f"記事{index}", 'primary') for index in range(6)]
+    finally:
+        llm_client.set_model_factory(None)
+
+    assert [name for _, name in results] == ['primary'] * 6
+    assert len(calls) == 6
+    assert llm_resilience.get_run_report().counters['gemini_rate_limit_wait_seconds'] > 0
+
+
+class RateLimitedModel:
+    """最初の failures 回は429を返し、その後は応答する偽のモデル"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def generate_content(self, prompt):
+        with self.lock:
+            self.calls.append(time.monotonic())
+            number = len(self.calls)
+        if number <= self.failures:
+            raise RuntimeError("429 ResourceExhausted (fake backend)")
+        response = Response(f"要約: {prompt}")
+        response.usage_metadata = None
+        return response
+
+
+@pytest.fixture
+def rate_limited(env, monkeypatch):
+    """429後の待ちを0.4秒・0.8秒…に縮め、偽のモデルを既定の generate_content から呼ぶ"""
+    monkeypatch.setattr(rate_limiter, '_rate_limiter', unlimited())
+    monkeypatch.setattr(llm_client.random, 'uniform', lambda low, high: 0.1)
+
+    def install(failures):
+        models = {}
+
+        def factory(model_name, generation_config):
+            return models.setdefault(model_name, RateLimitedModel(failures if model_name == 'primary' else 0))
+
+        llm_client.set_model_factory(factory)
+        return models
+
+    yield install
+    llm_client.set_model_factory(None)
+
+
+def test_rate_limit_backoff_queues_instead_of_timing_out(rate_limited, monkeypatch):
+    # 429の後の待ち（0.4秒 + 0.8秒）は段の制限時間（0.3秒）に含めず、同じ段で再試行して成功する
+    monkeypatch.setenv('GEMINI_TIER_TIMEOUT', '0.3')
+    models = rate_limited(failures=2)
+    generator = TieredGenerator(['fallback'])
+
+    started = time.monotonic()
+    assert generator.generate("記事", 'primary') == ("要約: 記事", 'primary')
+
+    assert time.monotonic() - started >= 1.2
+    assert len(models['primary'].calls) == 3
+    assert 'fallback' not in models
+    primary = generator.snapshot()['primary']
+    assert primary['failures'] == 0
+    assert primary['circuit'] == 'closed'
+    # 記録した遅延に再試行の待ちを含めない
+    assert primary['latency']['p99'] < 0.1
+    assert llm_resilience.get_run_report().counters['gemini_retries'] == 2
+
+
+def test_exhausted_rate_limit_falls_back_without_opening_circuit(rate_limited, monkeypatch):
+    monkeypatch.setenv('GEMINI_MAX_RETRIES', '1')
+    models = rate_limited(failures=100)
+    generator = TieredGenerator(['fallback'])
+
+    results = [generator.generate(f"記事{index}", 'primary') for index in range(3)]
+
+    # 再試行しきれなければ次の段に回すが、クォータ超過はブレーカーの失敗に数えない（毎回primaryから試す）
+    assert [name for _, name in results] == ['fallback'] * 3
+    assert len(models['primary'].calls) == 6
+    primary = generator.snapshot()['primary']
+    assert primary['failures'] == 0
+    assert primary['rate_limited'] == 3
+    assert primary['circuit'] == 'closed'
+
+
+def test_abandoned_call_stops_retrying(rate_limited, monkeypatch):
+    # 呼び出し元が見切った（ヘッジが先に返った等で cancel された）呼び出しは、それ以上429を再試行しない
+    models = rate_limited(failures=100)
+    cancel = threading.Event()
+    cancel.set()
+
+    with pytest.raises(RuntimeError, match="429"):
+        llm_client.generate_content('primary', "記事", cancel=cancel)
+    assert len(models['primary'].calls) == 1
@@ -0,0 +1,130 @@
+"""
+逐次投稿: ローカルのSlackスタブで骨組みを先に投稿し、要約ができた記事から chat.update で差し替えることを確かめる
+"""
+
+import json
+import threading
+import time
+from functools import partial
+
+import pytest
+
+from pipeline import ProgressiveSink, run_pipeline, slack, summarize_stage
+from pipeline.sinks import SUMMARY_PENDING
+from run_report import get_run_report
+
+ARTICLES = [{'title': f"記事{index}", 'description': f"記事{index}の説明", 'link': f"https://example.com/{index}"}
+            for index in range(5)]
+
+
+class SlackStub:
+    """chat.postMessage・chat.update を受け、メッセージごとの最新のブロックを保持するスタブの応答"""
+
+    def __init__(self, fail_posts=0):
+        self.fail_posts = fail_posts
+        self.lock = threading.Lock()
+        self.calls = []
+        self.messages = {}
+
+    def __call__(self, request):
+        payload = json.loads(request['body'])
+        method = request['path'].rsplit('/', 1)[-1]
+        with self.lock:
+            self.calls.append({'method': method, 'at': time.perf_counter(), **payload})
+            if method == 'chat.postMessage' and self.fail_posts:
+                self.fail_posts -= 1
+                return 200, {}, {'ok': False, 'error': 'channel_not_found'}
+            ts = payload.get('ts') or f"1700000000.{len(self.calls):06d}"
+            self.messages[(payload['channel'], ts)] = json.dumps(payload['blocks'], ensure_ascii=False)
+        return 200, {}, {'ok': True, 'channel': payload['channel'], 'ts': ts}
+
+    def methods(self):
+        return [call['method'] for call in self.calls]
+
+
+@pytest.fixture
+def slack_stub(stub_server, monkeypatch):
+    def start(**kwargs):
+        stub = SlackStub(**kwargs)
+        monkeypatch.setattr(slack, 'SLACK_API_URL', stub_server(stub).url)
+        monkeypatch.setenv('SLACK_BOT_TOKEN', 'xoxb-test')
+        monkeypatch.setenv('SLACK_CHANNEL', '#dev')
+        for name in ('SLACK_CHANNELS', 'SLACK_CHANNELS_FILE', 'DEBUG_BLOCKS'):
+            monkeypatch.delenv(name, raising=False)
+        return stub
+
+    return start
+
+
+def run_progressive(interval, delay=0.05):
+    sink = ProgressiveSink(interval=interval)
+    summarized = []
+
+    def summarize_fn(title, description, content=None):
+        time.sleep(delay)
+        summarized.append(time.perf_counter())
+        return f"{title}の要約"
+
+    stages = [sink.skeleton_stage,
+              partial(summarize_stage, concurrency=2, summarize_fn=summarize_fn, batch_size=1, on_summary=sink.update)]
+    success = run_pipeline(iter([dict(article) for article in ARTICLES]), sink, stages)
+    return sink, success, summarized
+
+
+def test_skeleton_is_posted_first_and_summaries_are_filled_in(slack_stub):
+    stub = slack_stub()
+
+    sink, success, summarized = run_progressive(interval=0.02)
+
+    assert success
+    first = stub.calls[0]
+    assert first['method'] == 'chat.postMessage' and SUMMARY_PENDING in json.dumps(first['blocks'], ensure_ascii=False)
+    # 骨組みは要約を待たずに投稿する
+    assert first['at'] < min(summarized)
+    assert set(stub.methods()[1:]) == {'chat.update'}
+    assert all(call['ts'] == "1700000000.000001" for call in stub.calls[1:])
+
+    final, = stub.messages.values()
+    assert SUMMARY_PENDING not in final
+    assert all(f"記事{index}の要約" in final for index in range(5))
+    assert [entry['summary'] for entry in sink.posted] == [f"記事{index}の要約" for index in range(5)]
+
+    report = get_run_report()
+    assert report.extra['time_to_first_post'] < report.extra['time_to_complete']
+    assert report.extra['slack_updates'] == sink.updates == len(stub.calls) - 1
+
+
+def test_updates_are_coalesced_within_interval(slack_stub):
+    stub = slack_stub()
+
+    sink, success, _ = run_progressive(interval=10, delay=0.01)
+
+    # 5件の要約を、最初の変更で1回と最後の反映で1回の高々2回の更新にまとめる
+    assert success
+    assert stub.methods()[0] == 'chat.postMessage'
+    assert set(stub.methods()[1:]) == {'chat.update'} and len(stub.calls) - 1 <= 2
+    final, = stub.messages.values()
+    assert all(f"記事{index}の要約" in final for index in range(5))
+
+
+def test_failed_skeleton_falls_back_to_one_shot_post(slack_stub):
+    stub = slack_stub(fail_posts=1)
+
+    sink, success, _ = run_progressive(interval=0.02)
+
+    assert success
+    assert stub.methods() == ['chat.postMessage', 'chat.postMessage']
+    assert sink.updates == 0
+    final, = stub.messages.values()
+    assert SUMMARY_PENDING not in final and "記事4の要約" in final
+
+
+def test_fan_out_skips_skeleton(slack_stub, monkeypatch):
+    stub = slack_stub()
+    monkeypatch.setenv('SLACK_CHANNELS', '#dev,#ops')
+
+    _, success, _ = run_progressive(interval=0.02)
+
+    assert success
+    assert stub.methods() == ['chat.postMessage', 'chat.postMessage']
+    assert all(SUMMARY_PENDING not in blocks for blocks in stub.messages.values())
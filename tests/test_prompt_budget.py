@@ -0,0 +1,93 @@
+"""
+プロンプトの入力予算: 正規化・定型文の除去・重要な文の抽出・切り詰めの各段階と、予算に収まることを確かめる
+"""
+
+import random
+
+import pytest
+
+from prompt_budget import PromptBudget, compress_text, normalize_text, select_sentences, strip_boilerplate
+from rate_limiter import estimate_tokens
+from run_report import get_run_report
+
+WORDS = ['Rust', 'Go', 'Kubernetes', 'PostgreSQL', 'セキュリティ', '設計', 'パフォーマンス', '運用', 'テスト']
+
+
+def make_content(lines, seed=7):
+    rng = random.Random(seed)
+    body = []
+    for number in range(lines):
+        first, second, third = rng.sample(WORDS, 3)
+        body.append(f"{first}と{second}を使った{third}の手順{number}を説明します。　設定値は ＡＰＩ　の&amp;仕様に従います。")
+        if number % 10 == 0:
+            body.extend(["シェアする", "ツイート", "関連記事", "© 2024 Example Inc."])
+    return "\n".join(body)
+
+
+def test_normalize_text():
+    text = "Ｒｕｓｔ　１．８０ &amp; Go\u200b\n\n  \t 複数   の空白  \n\ufeff"
+
+    assert normalize_text(text) == "Rust 1.80 & Go\n複数 の空白"
+    # 正規化済みの文字列はそのまま
+    assert normalize_text("Rust 1.80 & Go") == "Rust 1.80 & Go"
+
+
+def test_strip_boilerplate_drops_short_chrome_lines_and_repeats():
+    long_line = "この記事では Copyright 表記の扱いも含めて、ライセンスの選び方を具体的な例とともに説明します。" * 2
+    text = "\n".join(["本文1行目", "シェアする", "Tweet", "関連記事", "本文1行目", "© 2024 Example Inc.", long_line, "本文2行目"])
+
+    # 長い行は定型文の語を含んでいても本文として残す
+    assert strip_boilerplate(text) == "\n".join(["本文1行目", long_line, "本文2行目"])
+
+
+def test_select_sentences_prefers_title_words_and_keeps_order():
+    text = ("今日は天気の話から始めます。PostgreSQLのインデックス設計を見直しました。"
+            "昼食はカレーでした。PostgreSQLのインデックス設計を見直しました。パーティションでPostgreSQLの設計が変わります。")
+
+    selected = select_sentences(text, 45, title="PostgreSQLのインデックス設計")
+
+    # タイトルと共通の語を含む文を優先し、繰り返しは1回にまとめ、元の順序で返す
+    assert selected == "PostgreSQLのインデックス設計を見直しました。\nパーティションでPostgreSQLの設計が変わります。"
+    assert estimate_tokens(selected) <= 45
+
+
+def test_compress_stops_at_first_step_that_fits():
+    text = "本文です。\nシェアする\n本文です。\n続きの説明です。"
+
+    # 正規化だけで収まれば定型文も残す
+    assert compress_text(text, 100) == text
+    # 定型文と繰り返しを除いて収まれば文は選ばない
+    assert compress_text(text, 14) == "本文です。\n続きの説明です。"
+    assert compress_text('', 10) == '' and compress_text(None, 10) is None
+
+
+@pytest.mark.parametrize('max_tokens', [50, 300, 1200])
+def test_fit_keeps_title_and_stays_within_budget(max_tokens):
+    title = "Ｒｕｓｔ と Go の設計の話"
+    description = "RustとGoの設計の違いを解説します。" * 30
+    content = make_content(80)
+
+    fitted_title, fitted_description, fitted_content = PromptBudget().fit(title, description, content, max_tokens)
+
+    assert fitted_title == "Rust と Go の設計の話"
+    assert estimate_tokens(fitted_description) <= max(16, max_tokens // 4) + 1
+    # 切り詰めた末尾に付ける「…」の1トークン分だけ超えうる
+    total = sum(estimate_tokens(text) for text in (fitted_title, fitted_description, fitted_content))
+    assert total <= max_tokens + 2
+    assert "シェアする" not in fitted_content and "&amp;" not in fitted_content
+
+
+def test_fit_records_saved_tokens_unless_disabled(monkeypatch):
+    content = make_content(40)
+    budget = PromptBudget()
+
+    budget.fit("Rustの話", "説明", content, 200, record=False)
+    assert budget.calls == 0
+
+    budget.fit("Rustの話", "説明", content, 200)
+    saved = budget.tokens_before - budget.tokens_after
+    assert budget.calls == 1 and saved > 0
+    assert get_run_report().counters['prompt_tokens_saved'] == saved
+
+    monkeypatch.setenv('PROMPT_COMPRESSION', 'false')
+    assert PromptBudget().fit("Rustの話", None, content, 200) == ("Rustの話", '', content)
@@ -0,0 +1,116 @@
+"""
+実行レポート: スパン・カウンター・到達時刻の記録と、JSON・Prometheusテキスト形式での出力を確かめる
+"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from article_extractor import extract_article
+from run_report import RunReport, get_run_report, reset_run_report
+
+
+def test_spans_record_duration_attrs_and_errors():
+    report = RunReport('daily_post')
+
+    with report.span('fetch_articles', sources=2) as span:
+        time.sleep(0.01)
+        span['items'] = 5
+    with pytest.raises(ValueError):
+        with report.span('fetch_articles', sources=1):
+            raise ValueError("接続できません")
+    report.record('build_blocks', 0.5, blocks=12)
+
+    first, failed, built = report.spans
+    assert (first['sources'], first['items']) == (2, 5) and first['duration'] >= 0.01
+    assert failed['error'] == "接続できません"
+    assert (built['duration'], built['blocks']) == (0.5, 12)
+    # 記録済みの所要時間は、記録した時点で終わったものとして開始時刻をさかのぼる
+    assert built['start'] + built['duration'] == pytest.approx(time.perf_counter() - report.origin, abs=0.05)
+
+    stages = report.stages()
+    assert stages['fetch_articles']['count'] == 2 and stages['fetch_articles']['errors'] == 1
+    assert stages['fetch_articles']['max'] == max(first['duration'], failed['duration'])
+    assert stages['build_blocks'] == {'count': 1, 'total': 0.5, 'max': 0.5, 'errors': 0}
+
+
+def test_counters_are_thread_safe_and_mark_keeps_first_time():
+    report = RunReport('daily_post')
+
+    def work():
+        for _ in range(1000):
+            report.count('gemini_requests')
+        report.count('gemini_input_tokens', 250)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report.mark('time_to_first_post')
+    first = report.extra['time_to_first_post']
+    time.sleep(0.01)
+    report.mark('time_to_first_post')
+    report.set('dry_run', 'replay')
+
+    assert report.counters == {'gemini_requests': 8000, 'gemini_input_tokens': 2000}
+    assert report.extra == {'time_to_first_post': first, 'dry_run': 'replay'}
+
+
+def test_write_outputs_json_and_prometheus(tmp_path, capsys):
+    report = RunReport('daily_post')
+    with report.span('slack_post', channel='#dev'):
+        pass
+    report.count('summary_cache_hits', 3)
+    report.set('http', {'requests': 4})
+    json_path, prometheus_path = tmp_path / 'report.json', tmp_path / 'report.prom'
+
+    report.write(str(json_path), str(prometheus_path))
+
+    data = json.loads(json_path.read_text(encoding='utf-8'))
+    assert data['name'] == 'daily_post' and data['http'] == {'requests': 4}
+    assert data['counters'] == {'summary_cache_hits': 3}
+    assert data['stages']['slack_post']['count'] == 1
+    assert data['spans'][0]['channel'] == '#dev'
+
+    lines = prometheus_path.read_text(encoding='utf-8').splitlines()
+    assert 'tech_news_bot_stage_duration_seconds_count{job="daily_post",stage="slack_post"} 1' in lines
+    assert 'tech_news_bot_counter_total{job="daily_post",name="summary_cache_hits"} 3' in lines
+    assert not (tmp_path / 'report.prom.tmp').exists()
+    assert "計測 slack_post: 1回" in capsys.readouterr().out
+
+
+def test_write_without_paths_prints_summary_only(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('RUN_REPORT_PATH', raising=False)
+    monkeypatch.delenv('RUN_REPORT_PROMETHEUS_PATH', raising=False)
+    report = RunReport('daily_post')
+    report.record('pipeline', 1.25)
+
+    report.write()
+
+    assert "計測 pipeline: 1回 合計 1.25秒 (最大 1.25秒)" in capsys.readouterr().out
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_shared_report_and_reset():
+    report = get_run_report('daily_post')
+    assert get_run_report() is report
+
+    fresh = reset_run_report('weekly_rollup')
+    assert get_run_report() is fresh and fresh is not report and fresh.name == 'weekly_rollup'
+
+
+def test_article_extract_records_span(stub_server):
+    server = stub_server(lambda request: (200, {'Content-Type': 'text/html; charset=utf-8'},
+                                          "<article><p>本文の段落です。本文の段落です。本文の段落です。</p></article>".encode('utf-8'))
+                         if request['path'] == '/ok' else (404, {}, b''))
+
+    extract_article(f"{server.url}/ok")
+    extract_article(f"{server.url}/missing")
+
+    ok, missing = get_run_report().spans
+    assert ok['name'] == 'article_extract' and ok['bytes'] > 0 and ok['chars'] == 24
+    assert missing['url'].endswith('/missing') and '404' in missing['error']
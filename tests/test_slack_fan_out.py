@@ -0,0 +1,137 @@
+"""
+複数チャンネルへの並列投稿: ローカルのSlackスタブでチャンネル別の結果・失敗の切り分け・投稿間隔を確かめる
+"""
+
+import json
+import time
+import threading
+
+import pytest
+
+import rate_limiter
+from pipeline import slack
+
+
+ARTICLES = [
+    {'title': f"{topic}の記事", 'summary': f"{topic}の要約です。", 'link': f"https://example.com/{index}"}
+    for index, topic in enumerate(["Rust", "Go", "Python"])
+]
+
+
+class SlackStub:
+    """chat.postMessageを受け、指定したチャンネルだけ失敗させるスタブの応答"""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.lock = threading.Lock()
+        self.posts = []
+
+    def __call__(self, request):
+        payload = json.loads(request['body'])
+        channel = payload['channel']
+        with self.lock:
+            self.posts.append({'channel': channel, 'token': request['headers']['Authorization'],
+                               'at': time.monotonic(), 'text': payload['text'], 'thread_ts': payload.get('thread_ts')})
+            number = len(self.posts)
+        error = self.errors.get(channel)
+        if error == 500:
+            return 500, {}, b''
+        if error:
+            return 200, {}, {'ok': False, 'error': error}
+        return 200, {}, {'ok': True, 'channel': channel, 'ts': f"1700000000.{number:06d}"}
+
+
+@pytest.fixture
+def slack_env(monkeypatch, stub_server):
+    def start(handler):
+        server = stub_server(handler)
+        monkeypatch.setattr(slack, 'SLACK_API_URL', server.url)
+        monkeypatch.setenv('SLACK_BOT_TOKEN', 'xoxb-main')
+        monkeypatch.setenv('SLACK_BOT_TOKEN_OTHER', 'xoxb-other')
+        return server
+
+    return start
+
+
+def test_fan_out_reports_each_channel_and_isolates_failures(slack_env):
+    stub = SlackStub(errors={'#broken': 'channel_not_found', '#down': 500})
+    slack_env(stub)
+    channels = [
+        {'channel': '#dev'},
+        {'channel': '#broken'},
+        {'channel': '#down'},
+        {'channel': '#rust', 'topics': ['rust']},
+        {'channel': '#none', 'topics': ['haskell']},
+        {'channel': '#other', 'token_env': 'SLACK_BOT_TOKEN_OTHER', 'count': 1},
+        {'channel': '#missing', 'token_env': 'SLACK_BOT_TOKEN_MISSING'},
+    ]
+
+    results = {result['channel']: result for result in slack.fan_out_digest(ARTICLES, channels, "2024年01月01日")}
+
+    # 失敗したチャンネルがあっても残りのチャンネルには投稿する
+    assert results['#dev']['ok'] and results['#dev']['articles'] == 3
+    assert results['#rust']['ok'] and results['#rust']['articles'] == 1
+    assert results['#other']['ok'] and results['#other']['articles'] == 1
+    assert results['#broken'] == {'channel': '#broken', 'ok': False, 'error': 'channel_not_found',
+                                  'ts': None, 'articles': 3}
+    assert results['#down']['ok'] is False
+    assert results['#none'] == {'channel': '#none', 'ok': True, 'skipped': True, 'articles': 0}
+    assert results['#missing']['error'] == 'token_not_set'
+
+    posted = {post['channel']: post['token'] for post in stub.posts}
+    assert sorted(posted) == ['#broken', '#dev', '#down', '#other', '#rust']
+    assert posted['#other'] == 'Bearer xoxb-other'
+    assert posted['#dev'] == 'Bearer xoxb-main'
+
+
+@pytest.fixture
+def empty_limiters(monkeypatch):
+    """1分あたり600件（0.1秒に1件）、枠が空の状態から始める"""
+    monkeypatch.setenv('SLACK_POSTS_PER_MINUTE', '600')
+
+    def empty_limiter(rpm, tpm):
+        limiter = rate_limiter.RateLimiter(rpm=rpm, tpm=tpm)
+        limiter.request_tokens = 0
+        return limiter
+
+    monkeypatch.setattr(slack, 'RateLimiter', empty_limiter)
+
+
+def test_fan_out_paces_posts_per_token(slack_env, empty_limiters):
+    # トークンごとの投稿間隔を確かめる
+    stub = SlackStub()
+    slack_env(stub)
+    channels = [{'channel': f"#main{index}"} for index in range(4)] + [
+        {'channel': f"#other{index}", 'token_env': 'SLACK_BOT_TOKEN_OTHER'} for index in range(4)
+    ]
+
+    results = slack.fan_out_digest(ARTICLES, channels, "2024年01月01日", concurrency=8)
+
+    assert all(result['ok'] for result in results)
+    for token in ('Bearer xoxb-main', 'Bearer xoxb-other'):
+        times = sorted(post['at'] for post in stub.posts if post['token'] == token)
+        assert len(times) == 4
+        # 同じトークンの投稿は約0.1秒ずつ空く（4件で0.3秒以上）
+        assert times[-1] - times[0] >= 0.25
+    # トークンごとに別の枠なので、2つのワークスペースへの投稿は並行して進む
+    first_other = min(post['at'] for post in stub.posts if post['token'] == 'Bearer xoxb-other')
+    last_main = max(post['at'] for post in stub.posts if post['token'] == 'Bearer xoxb-main')
+    assert first_other < last_main
+
+
+def test_fan_out_paces_thread_replies(slack_env, empty_limiters):
+    # 1メッセージに収まらず、スレッド返信が続くダイジェスト
+    articles = [{'title': f"記事{index}", 'summary': "要約" * 1400, 'link': f"https://example.com/{index}"}
+                for index in range(12)]
+    stub = SlackStub()
+    slack_env(stub)
+
+    results = slack.fan_out_digest(articles, [{'channel': '#dev'}, {'channel': '#ops'}], "2024年01月01日",
+                                   concurrency=2)
+
+    assert all(result['ok'] for result in results)
+    replies = [post for post in stub.posts if post['thread_ts']]
+    assert len(replies) >= 2 and len(stub.posts) >= 4
+    # スレッド返信も1通ずつ投稿枠を使うので、同じトークンの投稿はすべて約0.1秒ずつ空く
+    times = sorted(post['at'] for post in stub.posts)
+    assert min(later - earlier for earlier, later in zip(times, times[1:])) >= 0.08
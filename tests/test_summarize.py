@@ -0,0 +1,154 @@
+"""
+要約の並列処理: 同時実行数の上限、入力順の維持、タイムアウト・例外時の抽出要約への切り替えを確かめる
+バッチ要約: 複数記事を1リクエストにまとめ、応答から欠けた記事だけ1件ずつ要約し直すことを確かめる
+"""
+
+import threading
+import time
+
+from pipeline import summarize, summarize_articles
+from pipeline.summarize import EXTRACTIVE_PREFIX, is_fallback_summary, parse_batch_summaries
+
+
+def make_articles(count):
+    return [{'title': f"記事{index}", 'description': f"記事{index}についての解説記事です。",
+             'link': f"https://example.com/{index}"} for index in range(count)]
+
+
+class FakeBackend:
+    """呼び出しごとに待ち時間を変え、同時に実行中の呼び出し数の最大値を記録する要約関数"""
+
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.calls = []
+
+    def __call__(self, title, description, content=None):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.calls.append(title)
+        try:
+            time.sleep(self.delays.get(title, 0.02))
+            return f"{title}の要約"
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def test_results_keep_input_order_and_concurrency_is_bounded():
+    articles = make_articles(12)
+    # 先の記事ほど遅く終わるようにして、完了順と入力順をずらす
+    backend = FakeBackend({article['title']: 0.06 - index * 0.004 for index, article in enumerate(articles)})
+
+    summaries = summarize_articles(articles, concurrency=3, summarize_fn=backend, batch_size=1)
+
+    assert summaries == [f"記事{index}の要約" for index in range(12)]
+    assert backend.max_active == 3
+    assert sorted(backend.calls) == sorted(article['title'] for article in articles)
+    # 元の記事は書き換えない
+    assert all('summary' not in article and '_summary' not in article for article in articles)
+
+
+def test_concurrent_run_is_faster_than_sequential():
+    articles = make_articles(10)
+    backend = FakeBackend({article['title']: 0.05 for article in articles})
+
+    started = time.perf_counter()
+    summarize_articles(articles, concurrency=1, summarize_fn=backend, batch_size=1)
+    sequential = time.perf_counter() - started
+    started = time.perf_counter()
+    summarize_articles(articles, concurrency=5, summarize_fn=backend, batch_size=1)
+    concurrent = time.perf_counter() - started
+
+    assert sequential >= 0.5
+    assert concurrent < sequential / 2.5
+
+
+def test_timeout_and_errors_fall_back_to_extractive_summary(capsys):
+    articles = make_articles(3)
+    backend = FakeBackend({"記事1": 5})
+
+    def summarize_fn(title, description, content=None):
+        if title == "記事2":
+            raise RuntimeError("接続が切れました")
+        return backend(title, description, content)
+
+    started = time.perf_counter()
+    summaries = summarize_articles(articles, concurrency=3, timeout=0.2, summarize_fn=summarize_fn, batch_size=1)
+
+    # 応答しない呼び出しはtimeoutで見切り、他の記事の要約は待たせない
+    assert time.perf_counter() - started < 1
+    assert summaries[0] == "記事0の要約"
+    assert summaries[1] == EXTRACTIVE_PREFIX + "記事1についての解説記事です。"
+    assert summaries[2] == EXTRACTIVE_PREFIX + "記事2についての解説記事です。"
+    assert all(is_fallback_summary(summary) for summary in summaries[1:])
+    output = capsys.readouterr().out
+    assert "要約タイムアウト (0.2秒): 記事1" in output and "接続が切れました" in output
+
+
+def test_batches_summarize_chunks_and_retry_missing_entries_individually():
+    articles = make_articles(7)
+    batches = []
+    backend = FakeBackend()
+
+    def summarize_batch_fn(chunk):
+        batches.append([article['title'] for article in chunk])
+        # 記事1の要約は応答から欠け、記事6だけのチャンクは1件なのでバッチにしない
+        return [None if article['title'] == "記事1" else f"{article['title']}のバッチ要約" for article in chunk]
+
+    summaries = summarize_articles(articles, concurrency=2, summarize_fn=backend, batch_size=3,
+                                   summarize_batch_fn=summarize_batch_fn)
+
+    # チャンクは並列に要約するので呼ばれる順は問わない
+    assert sorted(batches) == [["記事0", "記事1", "記事2"], ["記事3", "記事4", "記事5"]]
+    assert sorted(backend.calls) == ["記事1", "記事6"]
+    assert summaries == ["記事0のバッチ要約", "記事1の要約", "記事2のバッチ要約", "記事3のバッチ要約",
+                         "記事4のバッチ要約", "記事5のバッチ要約", "記事6の要約"]
+
+
+def test_batch_with_wrong_length_falls_back_to_single_calls():
+    articles = make_articles(3)
+    backend = FakeBackend()
+
+    summaries = summarize_articles(articles, summarize_fn=backend, batch_size=3,
+                                   summarize_batch_fn=lambda chunk: ["1件分だけ"])
+
+    assert summaries == ["記事0の要約", "記事1の要約", "記事2の要約"]
+    assert sorted(backend.calls) == ["記事0", "記事1", "記事2"]
+
+
+def test_parse_batch_summaries_tolerates_wrapping_and_skips_bad_entries(capsys):
+    text = """以下が要約です。
+```json
+[{"id": 2, "summary": " 2件目の要約 "}, {"id": 1, "summary": "1件目の要約"},
+ {"id": 4, "summary": "範囲外"}, {"id": "3", "summary": "文字列のid"}, {"id": 3, "summary": ""}, "不正な要素"]
+```"""
+
+    assert parse_batch_summaries(text, 3) == ["1件目の要約", "2件目の要約", None]
+    assert parse_batch_summaries("要約できませんでした", 2) == [None, None]
+    assert parse_batch_summaries("[{\"id\": 1, \"summary\": }]", 1) == [None]
+    output = capsys.readouterr().out
+    assert "JSON配列が見つかりません" in output and "解析できません" in output
+
+
+def test_batch_prompt_numbers_articles_and_parses_response(monkeypatch):
+    prompts = []
+
+    def generate_text(prompt):
+        prompts.append(prompt)
+        return '[{"id": 1, "summary": "Rustの要約"}, {"id": 2, "summary": "Goの要約"}]'
+
+    monkeypatch.setattr(summarize, 'generate_text', generate_text)
+    articles = [{'title': "Rust入門", 'description': "所有権"}, {'title': "Go入門", 'description': "並行処理", 'content': "本文"}]
+
+    assert summarize.summarize_batch_with_gemini(articles) == ["Rustの要約", "Goの要約"]
+    prompt, = prompts
+    assert "2件の技術記事" in prompt
+    assert prompt.index("[記事1]\nタイトル: Rust入門") < prompt.index("[記事2]\nタイトル: Go入門") < prompt.index("本文")
+
+    # 呼び出しに失敗したら全件Noneを返し、要約ステージが1件ずつ要約し直す
+    monkeypatch.setattr(summarize, 'generate_text', lambda prompt: None)
+    assert summarize.summarize_batch_with_gemini(articles) == [None, None]
@@ -0,0 +1,60 @@
+"""
+要約キャッシュ: キーは実際に送るプロンプト入力から作り、本文が変われば要約し直す
+"""
+
+import pytest
+
+from pipeline import summarize_stage
+from prompt_budget import get_prompt_budget
+from summary_cache import SummaryCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SummaryCache(path=str(tmp_path / 'summaries.sqlite3'))
+    yield cache
+    cache.close()
+
+
+def summarize(articles, cache, calls):
+    def summarize_fn(title, description, content=None):
+        calls.append(content)
+        return f"{title}の要約 ({content})"
+
+    return [article['summary'] for article in summarize_stage(
+        iter([dict(article) for article in articles]), cache=cache, summarize_fn=summarize_fn, batch_size=1
+    )]
+
+
+def test_same_prompt_input_hits_cache(cache):
+    calls = []
+    article = {'title': "Rust入門", 'description': "説明", 'link': "https://example.com/rust", 'content': "本文v1"}
+
+    first = summarize([article], cache, calls)
+    second = summarize([article], cache, calls)
+
+    assert first == second == ["Rust入門の要約 (本文v1)"]
+    assert calls == ["本文v1"]
+    assert cache.hits == 1
+
+
+def test_changed_body_is_summarized_again(cache):
+    calls = []
+    article = {'title': "Rust入門", 'description': "説明", 'link': "https://example.com/rust", 'content': "本文v1"}
+    summarize([article], cache, calls)
+
+    # タイトル・説明が同じでも、本文が変われば古い要約を返さない
+    updated = dict(article, content="本文v2")
+    assert summarize([updated], cache, calls) == ["Rust入門の要約 (本文v2)"]
+    assert calls == ["本文v1", "本文v2"]
+
+
+def test_cache_key_does_not_count_toward_prompt_budget(cache):
+    budget = get_prompt_budget()
+    calls_before = budget.calls
+    article = {'title': "Go入門", 'description': "説明", 'link': "https://example.com/go", 'content': "本文"}
+
+    summarize([article], cache, [])
+
+    # キー計算のための予算適用は、送った入力として集計しない（要約関数は差し替えているので0件）
+    assert budget.calls == calls_before
@@ -0,0 +1,93 @@
+"""
+週間まとめ: トピック・週全体の要約のプロンプト（入力予算・キャッシュのキー）と、投稿先が未設定の場合を確かめる
+"""
+
+import time
+
+import pytest
+
+import weekly_rollup
+from article_archive import ArticleArchive
+from pipeline import is_fallback_summary
+from rate_limiter import estimate_tokens
+
+
+def make_articles(count, summary_length=400):
+    return [
+        {'title': f"Rust記事{index}", 'link': f"https://example.com/rust/{index}",
+         'summary': f"記事{index}の要約。" + "所有権と借用の説明が続く。" * (summary_length // 12)}
+        for index in range(count)
+    ]
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    """generate_text を差し替え、送ったプロンプトを記録する"""
+    sent = []
+
+    def generate_text(prompt):
+        sent.append(prompt)
+        return f"まとめ{len(sent)}"
+
+    monkeypatch.setattr(weekly_rollup, 'generate_text', generate_text)
+    return sent
+
+
+def test_topic_prompt_keeps_every_article_within_budget(prompts, monkeypatch):
+    monkeypatch.setenv('WEEKLY_REDUCE_INPUT_TOKENS', '1500')
+    articles = make_articles(30)
+
+    assert weekly_rollup.summarize_topic("Rust", articles) == "まとめ1"
+
+    prompt, = prompts
+    assert prompt.startswith(weekly_rollup.ROLLUP_TOPIC_PROMPT_TEMPLATE.split('{label}')[0])
+    assert "「Rust」に関する技術記事30件" in prompt
+    # 要約を均等に切り詰め、どの記事のタイトルも落とさない
+    assert all(f"- {article['title']}: 記事{index}の要約" in prompt for index, article in enumerate(articles))
+    entries = prompt.split("\n\n")[2]
+    assert estimate_tokens(entries) <= 1500 * 1.1
+
+
+def test_week_prompt_lists_topics_with_counts(prompts):
+    topics = [("Rust", make_articles(3)), ("Go", make_articles(1))]
+
+    weekly_rollup.summarize_week("01/01〜01/07", topics, ["Rustのまとめ", "Goのまとめ"])
+
+    prompt, = prompts
+    assert "01/01〜01/07に投稿した技術記事" in prompt
+    assert "- Rust（3件）: Rustのまとめ" in prompt
+    assert "- Go（1件）: Goのまとめ" in prompt
+
+
+def test_failed_generation_falls_back_to_extractive_summary(monkeypatch):
+    monkeypatch.setattr(weekly_rollup, 'generate_text', lambda prompt: None)
+
+    summary = weekly_rollup.summarize_topic("Rust", make_articles(2))
+
+    # 抽出要約は生成できなかった要約として扱い、キャッシュしない
+    assert is_fallback_summary(summary)
+
+
+def test_stage_key_changes_with_prompt_and_budget(monkeypatch):
+    key = weekly_rollup.stage_key('topic', weekly_rollup.ROLLUP_TOPIC_PROMPT_TEMPLATE, "Rust", [])
+
+    assert weekly_rollup.stage_key('topic', weekly_rollup.ROLLUP_TOPIC_PROMPT_TEMPLATE, "Rust", []) == key
+    assert weekly_rollup.stage_key('topic', weekly_rollup.ROLLUP_TOPIC_PROMPT_TEMPLATE + "\n", "Rust", []) != key
+    monkeypatch.setenv('WEEKLY_REDUCE_INPUT_TOKENS', '3000')
+    assert weekly_rollup.stage_key('topic', weekly_rollup.ROLLUP_TOPIC_PROMPT_TEMPLATE, "Rust", []) != key
+
+
+def test_missing_channel_is_reported_instead_of_raising(prompts, monkeypatch, tmp_path, capsys):
+    now = time.time()
+    archive = ArticleArchive()
+    archive.ingest(make_articles(3))
+    archive.record_posts(make_articles(3), posted_at=now - 60)
+    archive.close()
+
+    channels_file = tmp_path / 'channels.json'
+    channels_file.write_text("[]", encoding='utf-8')
+    monkeypatch.setenv('SLACK_CHANNELS_FILE', str(channels_file))
+    monkeypatch.delenv('WEEKLY_ROLLUP_CHANNEL', raising=False)
+
+    assert weekly_rollup.run_weekly_rollup(now=now) is False
+    assert "投稿先チャンネルが設定されていません" in capsys.readouterr().out